@@ -0,0 +1,125 @@
+# anti_entropy.py
+import time
+import threading
+
+import requests
+
+from digest import ENTRY_HASH_HEX
+
+
+class AntiEntropy:
+    """
+    Background divergence detection and repair between the master and its secondaries.
+
+    Master and secondaries keep the same Merkle tree (digest.BucketTree) over the full buckets of
+    their contiguous prefix. Every `interval` seconds the master compares roots with each secondary
+    over the buckets both have, walks down only the subtrees whose hashes differ (one POST /merkle
+    per level), fetches per-entry hashes of the differing buckets and pushes the master's version
+    of the differing entries (POST /repair). Traffic is proportional to the differences times the
+    tree depth, not to the log size.
+    """
+
+    def __init__(self, tree, contiguous, targets, interval=30.0, timeout=5.0, observer=None, logger=None):
+        self.tree = tree
+        self.contiguous = contiguous  # callable -> master's highest contiguous id
+        self.targets = targets  # callable -> {sid: SecondaryClient}
+        self.interval = interval
+        self.timeout = timeout
+        self.observer = observer  # callable(sid, result)
+        self.logger = logger
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._run, name="anti-entropy", daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._last)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        for sid, client in self.targets().items():
+            try:
+                result = self.sync(client)
+            except (requests.RequestException, ValueError, KeyError, LookupError) as e:
+                result = {"status": "error", "error": str(e)}
+            result["at"] = time.time()
+            with self._lock:
+                self._last[sid] = result
+            if self.observer is not None:
+                self.observer(sid, result)
+            if result["status"] == "repaired" and self.logger:
+                self.logger.warning(
+                    f"Anti-entropy: {sid} diverged in {len(result['buckets'])} bucket(s), "
+                    f"repaired {len(result['repaired'])} entries"
+                )
+            elif result["status"] == "error" and self.logger:
+                self.logger.info(f"Anti-entropy with {sid} failed: {result.get('error')}")
+
+    def sync(self, client):
+        """
+        One anti-entropy round with one secondary. Returns a result dict.
+        """
+        info = self._get(client, "/merkle")
+        if info["bucket"] != self.tree.bucket or info["fanout"] != self.tree.fanout:
+            return {"status": "error", "error": f"tree shape differs: {info}"}
+        n = min(self.tree.sync(self.contiguous()), info["leaves"])
+        requests_sent = 1
+        if n == 0:
+            return {"status": "in_sync", "leaves": 0, "requests": requests_sent}
+
+        # Walk down from the root, level by level, only into nodes whose hashes differ
+        level = self.tree.depth(n)
+        candidates = [0]
+        while True:
+            theirs = self._post(client, "/merkle", {"leaves": n, "level": level, "indices": candidates})["hashes"]
+            requests_sent += 1
+            ours = self.tree.hashes(level, candidates, n)
+            differing = [i for i, a, b in zip(candidates, ours, theirs) if a != b]
+            if not differing or level == 0:
+                break
+            width = -(-n // self.tree.fanout ** (level - 1))  # nodes on the level below
+            candidates = [
+                child for parent in differing
+                for child in range(parent * self.tree.fanout, min((parent + 1) * self.tree.fanout, width))
+            ]
+            level -= 1
+        if not differing:
+            return {"status": "in_sync", "leaves": n, "requests": requests_sent}
+
+        # Differing buckets: compare per-entry hashes, push only the entries that differ
+        theirs = self._post(client, "/merkle", {"buckets": differing})["entries"]
+        requests_sent += 1
+        repair = []
+        for k in differing:
+            ours = self.tree.entry_hashes(k)
+            remote = theirs.get(str(k), "")
+            repair.extend(
+                e for i, e in enumerate(self.tree.bucket_entries(k))
+                if ours[i * ENTRY_HASH_HEX:(i + 1) * ENTRY_HASH_HEX] != remote[i * ENTRY_HASH_HEX:(i + 1) * ENTRY_HASH_HEX]
+            )
+        result = self._post(client, "/repair", {"entries": repair})
+        requests_sent += 1
+        return {
+            "status": "repaired",
+            "leaves": n,
+            "buckets": differing,
+            "repaired": result["repaired"],
+            "skipped": result["skipped"],
+            "requests": requests_sent,
+        }
+
+    def _get(self, client, path):
+        r = client.get(path, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _post(self, client, path, body):
+        r = client.post(path, json=body, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
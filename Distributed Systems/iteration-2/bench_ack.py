@@ -0,0 +1,92 @@
+# bench_ack.py
+"""
+Secondary ACK mode benchmark (ACK_MODE = applied | durable | received).
+
+A real secondary.py (with a WAL in --wal-dir, and SECONDARY_DELAY=--delay) is fed pre-encoded
+binary /replicate_batch requests by --senders threads; reports the ACK latency the master would
+see (p50/p99), ACK throughput, and the time until every entry is applied.
+
+    python bench_ack.py --entries 50000 --batch 128 --senders 4 --delay 0.05
+"""
+import argparse
+import itertools
+import statistics
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench_load import start_master
+from bench_wire import encode, make_batches
+from wire import CONTENT_TYPE
+
+MODES = ("applied", "durable", "received")
+
+
+def run_mode(mode, batches, total, senders, port, delay, wal_dir):
+    bodies = iter([encode("binary", b) for b in batches])
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    proc, url = start_master(port, env={
+        "SECONDARY_PORT": str(port), "SECONDARY_ID": f"bench-{mode}",
+        "ACK_MODE": mode, "SECONDARY_DELAY": str(delay), "SECONDARY_WAL_DIR": wal_dir,
+        # No master: registration keeps failing in the background, replication requests still apply
+        "MASTER_URL": "http://127.0.0.1:9", "CATCHUP_INTERVAL_SEC": "3600",
+    }, script="secondary.py")
+    try:
+        def sender():
+            session = requests.Session()
+            while True:
+                with lock:
+                    body = next(bodies, None)
+                if body is None:
+                    return
+                start = time.perf_counter()
+                r = session.post(f"{url}/replicate_batch", data=body, headers={"Content-Type": CONTENT_TYPE}, timeout=60)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if r.status_code != 200:
+                        errors[0] += 1
+
+        threads = [threading.Thread(target=sender) for _ in range(senders)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        acked = time.perf_counter() - start
+        while requests.get(f"{url}/health", timeout=5).json()["max_contiguous_id"] < total:
+            time.sleep(0.01)
+        applied = time.perf_counter() - start
+        latencies.sort()
+        print(
+            f"{mode:8s}: ack p50 {statistics.median(latencies) * 1000:7.1f}ms "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f}ms, "
+            f"acked {total / acked:7.0f} entries/sec, all applied after {applied:.2f}s (errors={errors[0]})"
+        )
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=128)
+    parser.add_argument("--size", type=int, default=32, help="message size in bytes")
+    parser.add_argument("--senders", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.05, help="SECONDARY_DELAY of the secondary")
+    parser.add_argument("--port", type=int, default=5960)
+    args = parser.parse_args()
+
+    batches = make_batches(args.entries, args.batch, args.size)
+    for mode, port in zip(MODES, itertools.count(args.port)):
+        with tempfile.TemporaryDirectory() as wal_dir:
+            run_mode(mode, batches, args.entries, args.senders, port, args.delay, wal_dir)
+
+
+if __name__ == "__main__":
+    main()
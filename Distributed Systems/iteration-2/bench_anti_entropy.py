@@ -0,0 +1,102 @@
+# bench_anti_entropy.py
+"""
+Anti-entropy cost benchmark: bytes exchanged to find and repair d diverged entries in a log of n,
+next to the bytes of shipping the full replica log (what comparing full logs costs).
+
+Runs in one process: the master side is the real AntiEntropy, the "secondary" is a BucketTree
+over a second copy of the log, reached through a client that serializes every request and
+response to JSON and counts the bytes.
+
+    python bench_anti_entropy.py --n 1000000 --diffs 0 1 10 100 1000
+"""
+import argparse
+import json
+import random
+import time
+
+from anti_entropy import AntiEntropy
+from digest import BucketTree
+
+
+class _Response:
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+class LocalSecondary:
+    """
+    In-process stand-in for a secondary's /merkle and /repair endpoints, counting JSON bytes both ways.
+    """
+
+    def __init__(self, log, bucket, fanout):
+        self.log = log
+        self.tree = BucketTree(lambda from_id, limit: log[from_id - 1:from_id - 1 + limit], bucket, fanout)
+        self.bytes = 0
+
+    def _reply(self, body):
+        data = json.dumps(body)
+        self.bytes += len(data)
+        return _Response(json.loads(data))
+
+    def get(self, path, **kwargs):
+        return self._reply({"bucket": self.tree.bucket, "fanout": self.tree.fanout, "leaves": self.tree.sync(len(self.log))})
+
+    def post(self, path, **kwargs):
+        body = kwargs["json"]
+        self.bytes += len(json.dumps(body))
+        if path == "/repair":
+            for e in body["entries"]:
+                self.log[e["id"] - 1] = e
+                self.tree.invalidate(e["id"])
+            return self._reply({"repaired": [e["id"] for e in body["entries"]], "skipped": []})
+        if "buckets" in body:
+            return self._reply({"entries": {k: self.tree.entry_hashes(k) for k in body["buckets"]}})
+        return self._reply({"hashes": self.tree.hashes(body["level"], body["indices"], body["leaves"])})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--diffs", type=int, nargs="+", default=[0, 1, 10, 100, 1000])
+    parser.add_argument("--bucket", type=int, default=256)
+    parser.add_argument("--fanout", type=int, default=16)
+    parser.add_argument("--size", type=int, default=16, help="message size in bytes")
+    args = parser.parse_args()
+
+    now = time.time()
+    pad = "x" * max(0, args.size - 8)
+    master_log = [{"id": i, "message": f"{i:08d}{pad}", "timestamp": now + i} for i in range(1, args.n + 1)]
+    full_bytes = len(json.dumps({"messages": master_log}))
+    master_tree = BucketTree(lambda from_id, limit: master_log[from_id - 1:from_id - 1 + limit], args.bucket, args.fanout)
+    start = time.perf_counter()
+    master_tree.sync(args.n)
+    print(f"n={args.n}: master tree built in {time.perf_counter() - start:.2f}s, "
+          f"full replica log = {full_bytes / 1e6:.1f} MB")
+
+    for d in args.diffs:
+        secondary = LocalSecondary(list(master_log), args.bucket, args.fanout)
+        secondary.tree.sync(args.n)
+        for msg_id in random.sample(range(1, args.n + 1), d):
+            secondary.log[msg_id - 1] = {"id": msg_id, "message": "diverged", "timestamp": now}
+            secondary.tree.invalidate(msg_id)
+        ae = AntiEntropy(master_tree, lambda: args.n, lambda: {})
+        start = time.perf_counter()
+        result = ae.sync(secondary)
+        elapsed = time.perf_counter() - start
+        check = ae.sync(secondary)
+        print(
+            f"diffs={d:5d}: {result['status']:8s} repaired={len(result.get('repaired', [])):5d} "
+            f"requests={result['requests']} bytes={secondary.bytes / 1e3:9.1f} KB "
+            f"({secondary.bytes / full_bytes * 100:.3f}% of the full log) in {elapsed * 1000:.0f}ms, "
+            f"after: {check['status']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
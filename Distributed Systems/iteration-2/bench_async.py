@@ -0,0 +1,48 @@
+# bench_async.py
+"""
+Compare the threaded master (master.py) with the asyncio master (master_async.py)
+under the same load against local stand-in secondaries.
+
+    python bench_async.py --secondaries 3 --clients 32 --requests 3000 --w 2 --delay 0.05
+"""
+import argparse
+
+from bench_load import StandInSecondary, register, report, run_writes, start_master
+
+
+def bench_mode(script, args, w):
+    standins = [StandInSecondary(f"standin-{i}", delay=args.delay) for i in range(args.secondaries)]
+    # A slow replica makes the early-return path leave work behind (threads vs tracked futures)
+    if args.slow_delay > 0 and standins:
+        standins[-1].delay = args.slow_delay
+    proc, master_url = start_master(args.port, script=script)
+    try:
+        for s in standins:
+            register(master_url, s.sid, s.url)
+        run_writes(master_url, args.clients, min(200, args.requests), w)  # warm-up
+        latencies, errors, elapsed = run_writes(master_url, args.clients, args.requests, w)
+        report(f"{script:16s} w={w}", latencies, errors, elapsed)
+    finally:
+        proc.terminate()
+        proc.wait()
+        for s in standins:
+            s.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--secondaries", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--w", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.0, help="stand-in secondary ACK delay (s)")
+    parser.add_argument("--slow-delay", type=float, default=0.0, help="ACK delay of the last (slow) stand-in (s)")
+    parser.add_argument("--port", type=int, default=5900)
+    args = parser.parse_args()
+
+    for script in ("master.py", "master_async.py"):
+        bench_mode(script, args, args.w)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench_catchup.py
+"""
+Catch-up benchmark: how long a secondary that is N entries behind takes to resync.
+
+The master is started from a pre-built WAL holding --entries messages; a fresh
+secondary.py (optionally already holding the first --have entries in its own WAL)
+registers, pulls the missing range and is polled until it holds the last id.
+
+    python bench_catchup.py --entries 1000000
+    python bench_catchup.py --entries 1000000 --have 900000
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from bench_load import HERE, start_master
+from wal import WriteAheadLog
+
+
+def build_wal(directory, first_id, last_id, chunk=10000):
+    wal = WriteAheadLog(directory, fsync=False)
+    now = time.time()
+    for start in range(first_id, last_id + 1, chunk):
+        end = min(last_id, start + chunk - 1)
+        wal.append_many([{"id": i, "message": f"message-{i}", "timestamp": now} for i in range(start, end + 1)])
+    wal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--have", type=int, default=0, help="entries the secondary already holds")
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--secondary-port", type=int, default=5901)
+    args = parser.parse_args()
+
+    master_wal = tempfile.mkdtemp(prefix="catchup-master-")
+    secondary_wal = tempfile.mkdtemp(prefix="catchup-secondary-")
+    build_wal(master_wal, 1, args.entries)
+    if args.have:
+        build_wal(secondary_wal, 1, args.have)
+
+    proc, master_url = start_master(args.port, env={"MASTER_WAL_DIR": master_wal, "WAL_FSYNC": "0"}, timeout=300)
+    secondary = None
+    try:
+        env = dict(os.environ)
+        env.update({
+            "MASTER_URL": master_url,
+            "SECONDARY_ID": "catchup",
+            "SECONDARY_PORT": str(args.secondary_port),
+            "SECONDARY_WAL_DIR": secondary_wal,
+            "WAL_FSYNC": "0",
+        })
+        start = time.perf_counter()
+        secondary = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "secondary.py")],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{args.secondary_port}/"
+        while True:
+            try:
+                page = requests.get(url, params={"from_id": args.entries, "limit": 1}, timeout=5).json()
+                if page["messages"]:
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - start
+        behind = args.entries - args.have
+        print(
+            f"resynced {behind} entries ({args.have} already present) in {elapsed:.2f}s "
+            f"-> {behind / elapsed:,.0f} entries/sec (includes secondary startup)"
+        )
+    finally:
+        if secondary is not None:
+            secondary.terminate()
+            secondary.wait()
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(master_wal)
+        shutil.rmtree(secondary_wal)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench_client.py
+"""
+Client SDK throughput benchmark: one POST per message vs client.py batching into POST /batch.
+
+Starts master.py with --secondaries in-process stand-ins (ACK delay --delay) and appends
+--messages messages three ways, each with write concern --w:
+
+    single  --clients threads, one POST / per message (the pre-SDK client)
+    sync    ReplicatedLogClient.submit() from one thread, batched by the SDK
+    async   AsyncReplicatedLogClient.submit() from one event loop, batched by the SDK
+
+Reports messages/sec and checks that each run got --messages distinct ids.
+
+    python bench_client.py --messages 20000 --clients 16 --secondaries 2 --delay 0.005 --w 3
+"""
+import argparse
+import asyncio
+import time
+
+from bench_load import StandInSecondary, register, run_writes, start_master
+from client import AsyncReplicatedLogClient, ReplicatedLogClient
+
+
+def run_single(url, args):
+    latencies, errors, elapsed = run_writes(url, args.clients, args.messages, args.w)
+    return len(latencies) - errors, errors, elapsed
+
+
+def run_sync(url, args):
+    start = time.perf_counter()
+    with ReplicatedLogClient(url, w=args.w, batch_max=args.batch, linger_ms=args.linger_ms,
+                             max_inflight=args.inflight) as c:
+        futures = [c.submit(f"sync-{i}") for i in range(args.messages)]
+        c.flush()
+        ids = set()
+        errors = 0
+        for f in futures:
+            try:
+                ids.add(f.result())
+            except Exception:
+                errors += 1
+    return len(ids), errors, time.perf_counter() - start
+
+
+async def _run_async(url, args):
+    start = time.perf_counter()
+    async with AsyncReplicatedLogClient(url, w=args.w, batch_max=args.batch, linger_ms=args.linger_ms,
+                                        max_inflight=args.inflight) as c:
+        futures = [c.submit(f"async-{i}") for i in range(args.messages)]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+    ids = {r for r in results if not isinstance(r, Exception)}
+    return len(ids), len(results) - len(ids), time.perf_counter() - start
+
+
+def run_async(url, args):
+    return asyncio.run(_run_async(url, args))
+
+
+MODES = {"single": run_single, "sync": run_sync, "async": run_async}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=16, help="threads of the single-message client")
+    parser.add_argument("--secondaries", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.005, help="stand-in ACK delay in seconds")
+    parser.add_argument("--w", type=int, default=None, help="write concern (default: all nodes)")
+    parser.add_argument("--batch", type=int, default=1000, help="SDK batch_max")
+    parser.add_argument("--linger-ms", type=float, default=5.0)
+    parser.add_argument("--inflight", type=int, default=2, help="SDK max_inflight")
+    parser.add_argument("--port", type=int, default=5990)
+    args = parser.parse_args()
+    if args.w is None:
+        args.w = args.secondaries + 1
+
+    standins = [StandInSecondary(f"standin-{i}", args.delay) for i in range(args.secondaries)]
+    proc, url = start_master(args.port, env={"ANTI_ENTROPY_INTERVAL_SEC": "0", "LOG_LEVEL": "WARNING"})
+    try:
+        for s in standins:
+            register(url, s.sid, s.url)
+        rates = {}
+        for mode in args.modes:
+            ok, errors, elapsed = MODES[mode](url, args)
+            rates[mode] = ok / elapsed
+            print(f"{mode:6s}: {ok} messages in {elapsed:.2f}s -> {rates[mode]:8.0f} msgs/sec (errors={errors})")
+        if "single" in rates:
+            for mode in rates.keys() - {"single"}:
+                print(f"{mode} vs single: {rates[mode] / rates['single']:.1f}x")
+    finally:
+        proc.terminate()
+        proc.wait()
+        for s in standins:
+            s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# bench_compare.py
+"""
+Replication benchmark harness: iteration_1 (blocking, all-ack) vs iteration-2 (quorum `w`) master.
+
+For every target and `w` it starts the master script as a subprocess, registers N in-process
+stand-in secondaries and drives a write/read mix from --clients threads. Stand-ins sample their
+ACK delay from a distribution and can inject failures:
+
+    --delays 0.01 uniform:0:0.05 exp:0.02 lognormal:0.01:1.0   (one spec per secondary, cycled)
+    --fail-rate 0.05    every stand-in answers 500 to that fraction of replication requests
+    --outage 2          the first stand-in is down (503 to everything) for the first 2s of the run
+
+Reports throughput, write/read latency (p50/p99/p999), replication lag (write sent -> entry on
+every stand-in) and convergence time (end of the run -> every stand-in holds every appended entry).
+iteration_1 has no `w` (every write waits for all secondaries) and never retries, so a failed
+replication leaves that entry missing. --json writes all results as one JSON document.
+
+    python bench_compare.py --targets iteration_1 iteration-2 --w 1 2 3 --secondaries 2 \\
+        --clients 16 --ops 2000 --read-ratio 0.2 --delays 0.005 exp:0.02 --json results.json
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import requests
+
+from bench_load import QuietHTTPServer, percentile, register, start_master
+from wire import CONTENT_TYPE, decode_entries
+
+# Master script of each design, relative to this folder
+TARGETS = {
+    "iteration_1": "../iteration_1/master.py",
+    "iteration-2": "master.py",
+}
+
+
+def parse_delay(spec):
+    """
+    Delay sampler from a spec: "<sec>", "uniform:<lo>:<hi>", "exp:<mean>" or "lognormal:<median>:<sigma>".
+    """
+    kind, _, rest = spec.partition(":")
+    args = [float(a) for a in rest.split(":")] if rest else []
+    if not rest:
+        value = float(kind)
+        return lambda rng: value
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "exp" and len(args) == 1:
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1])
+    raise ValueError(f"bad delay spec: {spec}")
+
+
+class FaultySecondary:
+    """
+    Stand-in secondary: records which messages it ACKed and when; ACKs after a sampled delay,
+    answers 500 to a fraction of replication requests and 503 to everything while down.
+    """
+
+    def __init__(self, sid, delay, fail_rate=0.0, seed=0):
+        self.sid = sid
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.down_until = 0.0  # perf_counter deadline of an outage
+        self.stored = {}  # message -> perf_counter when first ACKed
+        self.failed = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if time.perf_counter() < standin.down_until:
+                    self._reply(503, {"error": "down"})
+                    return
+                if self.path.rstrip("/") not in ("/replicate", "/replicate_batch"):
+                    self._reply(404, {"error": "not found"})
+                    return
+                if self.headers.get("Content-Type") == CONTENT_TYPE:
+                    entries = decode_entries(body)
+                else:
+                    payload = json.loads(body or b"{}")
+                    entries = payload.get("entries", [payload])
+                with standin._lock:
+                    delay = standin.delay(standin._rng)
+                    fail = standin._rng.random() < standin.fail_rate
+                if delay > 0:
+                    time.sleep(delay)
+                if fail:
+                    with standin._lock:
+                        standin.failed += 1
+                    self._reply(500, {"error": "injected failure"})
+                    return
+                now = time.perf_counter()
+                with standin._lock:
+                    for e in entries:
+                        standin.stored.setdefault(e["message"], now)
+                self._reply(200, {"status": "ack"})
+
+            def do_GET(self):
+                if time.perf_counter() < standin.down_until:
+                    self._reply(503, {"error": "down"})
+                    return
+                self._reply(200, {"status": "ok", "messages": []})
+
+            def _reply(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = QuietHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def has(self, message):
+        with self._lock:
+            return self.stored.get(message)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def latency_summary(values):
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "p999_ms": percentile(values, 99.9) * 1000,
+    }
+
+
+def run_mix(master_url, clients, ops, read_ratio, w, prefix, seed):
+    """
+    Issue `ops` requests from `clients` threads, each a read with probability read_ratio.
+    Returns (write latencies, read latencies, errors by kind, {message: send time} of appended writes, elapsed).
+    """
+    writes, reads = [], []
+    errors = {"write": 0, "read": 0}
+    appended = {}
+    lock = threading.Lock()
+    counter = iter(range(ops))
+
+    def worker(k):
+        rng = random.Random(seed * 1000 + k)
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            if rng.random() < read_ratio:
+                t0 = time.perf_counter()
+                try:
+                    ok = session.get(f"{master_url}/", timeout=60).status_code == 200
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    reads.append(elapsed)
+                    errors["read"] += not ok
+                continue
+            message = f"{prefix}-{i}"
+            body = {"message": message} if w is None else {"message": message, "w": w}
+            t0 = time.perf_counter()
+            try:
+                r = session.post(f"{master_url}/", json=body, timeout=60)
+                code = r.status_code
+                status = r.json().get("status") if code in (200, 500) else None
+            except (requests.RequestException, ValueError):
+                code, status = None, None
+            elapsed = time.perf_counter() - t0
+            with lock:
+                writes.append(elapsed)
+                errors["write"] += code != 200
+                # 200 and partial_failure both mean the master appended the entry
+                if code == 200 or status == "partial_failure":
+                    appended[message] = t0
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return writes, reads, errors, appended, time.perf_counter() - start
+
+
+def convergence(standins, appended, timeout):
+    """
+    Wait until every stand-in holds every appended message.
+    Returns (seconds waited or None on timeout, per-message replication lags, missing entries).
+    """
+    start = time.perf_counter()
+    while True:
+        missing = sum(1 for s in standins for m in appended if s.has(m) is None)
+        if missing == 0 or time.perf_counter() - start > timeout:
+            break
+        time.sleep(0.05)
+    waited = time.perf_counter() - start
+    lags = []
+    for message, sent in appended.items():
+        arrivals = [s.has(message) for s in standins]
+        if all(a is not None for a in arrivals):
+            lags.append(max(arrivals) - sent)
+    return (waited if missing == 0 else None), lags, missing
+
+
+def run_one(target, w, args, port, run):
+    standins = [
+        FaultySecondary(f"standin-{i}", parse_delay(spec), args.fail_rate, seed=args.seed + i)
+        for i, spec in zip(range(args.secondaries), itertools.cycle(args.delays))
+    ]
+    proc, master_url = start_master(port, env={
+        # iteration_1 defaults to a 0s timeout, which fails every replication
+        "REPLICATE_TIMEOUT_SEC": str(args.timeout),
+        "ANTI_ENTROPY_INTERVAL_SEC": "0",
+        "LOG_LEVEL": "WARNING",
+    }, script=TARGETS[target])
+    try:
+        for s in standins:
+            register(master_url, s.sid, s.url)
+        run_mix(master_url, args.clients, min(100, args.ops), 0.0, w, f"warmup-{run}", args.seed)
+        if args.outage > 0 and standins:
+            standins[0].down_until = time.perf_counter() + args.outage
+        writes, reads, errors, appended, elapsed = run_mix(
+            master_url, args.clients, args.ops, args.read_ratio, w, f"run-{run}", args.seed
+        )
+        converged_after, lags, missing = convergence(standins, appended, args.converge_timeout)
+    finally:
+        proc.terminate()
+        proc.wait()
+        for s in standins:
+            s.stop()
+    return {
+        "target": target,
+        "w": w if w is not None else "all",
+        "secondaries": args.secondaries,
+        "delays": args.delays,
+        "fail_rate": args.fail_rate,
+        "outage_sec": args.outage,
+        "clients": args.clients,
+        "ops": args.ops,
+        "read_ratio": args.read_ratio,
+        "elapsed_sec": elapsed,
+        "throughput_ops": args.ops / elapsed,
+        "writes": {**latency_summary(writes), "errors": errors["write"], "appended": len(appended)},
+        "reads": {**latency_summary(reads), "errors": errors["read"]},
+        "replication_lag": latency_summary(lags),
+        "converged": converged_after is not None,
+        "converged_after_sec": converged_after,
+        "missing_entries": missing,
+        "injected_failures": sum(s.failed for s in standins),
+    }
+
+
+def report(r):
+    wr, rd, lag = r["writes"], r["reads"], r["replication_lag"]
+    converged = f"{r['converged_after_sec']:.2f}s" if r["converged"] else f"NO ({r['missing_entries']} missing)"
+    print(
+        f"{r['target']:11s} w={str(r['w']):3s}: {r['throughput_ops']:7.0f} ops/s | "
+        f"writes p50/p99/p999 {wr['p50_ms']:.1f}/{wr['p99_ms']:.1f}/{wr['p999_ms']:.1f}ms errors={wr['errors']} | "
+        f"reads p50/p99 {rd['p50_ms']:.1f}/{rd['p99_ms']:.1f}ms | "
+        f"lag p50/p99 {lag['p50_ms']:.1f}/{lag['p99_ms']:.1f}ms | converged {converged}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=["iteration_1", "iteration-2"])
+    parser.add_argument("--w", type=int, nargs="+", default=None, help="iteration-2 write concerns (default: all nodes)")
+    parser.add_argument("--secondaries", type=int, default=2)
+    parser.add_argument("--delays", nargs="+", default=["0"], help="ACK delay spec per secondary (cycled)")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--outage", type=float, default=0.0, help="first secondary down for this many seconds")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--read-ratio", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=10.0, help="REPLICATE_TIMEOUT_SEC of the master")
+    parser.add_argument("--converge-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5970)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    ws = args.w or [args.secondaries + 1]
+    runs = [(target, w) for target in args.targets for w in ([None] if target == "iteration_1" else ws)]
+    results = []
+    for run, ((target, w), port) in enumerate(zip(runs, itertools.count(args.port))):
+        result = run_one(target, w, args, port, run)
+        report(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"generated_at": time.time(), "results": results}, f, indent=2)
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
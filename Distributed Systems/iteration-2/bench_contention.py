@@ -0,0 +1,90 @@
+# bench_contention.py
+"""
+Reader/writer contention benchmark for the iteration-2 master.
+
+Preloads --preload entries, then runs --writers write clients (w=1, no secondaries) alone and
+next to --readers clients that keep reading the log (GET / for the full log, or --page entries
+from a random from_id). Reports writes/sec and write p50/p99 in both phases, reads/sec and the
+mean wait on master_lock (from /metrics), so readers holding the log lock show up as write latency.
+
+    python bench_contention.py --preload 20000 --writers 8 --readers 4 --requests 3000 [--wal]
+"""
+import argparse
+import random
+import re
+import tempfile
+import threading
+
+import requests
+
+from bench_load import percentile, run_writes, start_master
+
+LOCK_WAIT = re.compile(r'^master_lock_wait_seconds_(sum|count)\{lock="master_lock"\} (\S+)$', re.M)
+
+
+def lock_wait(url):
+    values = dict(LOCK_WAIT.findall(requests.get(f"{url}/metrics", timeout=5).text))
+    return float(values.get("sum", 0)), float(values.get("count", 0))
+
+
+def run_phase(url, args, readers):
+    stop = threading.Event()
+    reads = [0]
+    lock = threading.Lock()
+
+    def reader(k):
+        rng = random.Random(k)
+        session = requests.Session()
+        while not stop.is_set():
+            if args.page:
+                params = {"from_id": rng.randint(1, args.preload), "limit": args.page}
+            else:
+                params = None
+            session.get(f"{url}/", params=params, timeout=60).raise_for_status()
+            with lock:
+                reads[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+    wait_sum, wait_count = lock_wait(url)
+    for t in threads:
+        t.start()
+    latencies, errors, elapsed = run_writes(url, args.writers, args.requests, 1)
+    stop.set()
+    for t in threads:
+        t.join()
+    wait_sum2, wait_count2 = lock_wait(url)
+    mean_wait = (wait_sum2 - wait_sum) / max(1.0, wait_count2 - wait_count)
+    print(
+        f"readers={readers}: {len(latencies) / elapsed:6.0f} writes/sec "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms "
+        f"errors={errors} | {reads[0] / elapsed:5.1f} reads/sec | master_lock wait mean {mean_wait * 1e6:.0f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preload", type=int, default=20000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--page", type=int, default=0, help="read pages of this size instead of the full log")
+    parser.add_argument("--wal", action="store_true", help="run the master with a write-ahead log")
+    parser.add_argument("--port", type=int, default=5980)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as wal_dir:
+        env = {"LOG_RETAIN_ENTRIES": "0", "ANTI_ENTROPY_INTERVAL_SEC": "0"}
+        if args.wal:
+            env["MASTER_WAL_DIR"] = wal_dir
+        proc, url = start_master(args.port, env=env)
+        try:
+            run_writes(url, args.writers, args.preload, 1)
+            run_phase(url, args, 0)
+            run_phase(url, args, args.readers)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
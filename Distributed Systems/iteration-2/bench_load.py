@@ -0,0 +1,212 @@
+# bench_load.py
+"""
+Load benchmark for the iteration-2 master.
+
+Starts master.py as a subprocess, registers N local stand-in secondaries
+(tiny in-process HTTP servers that ACK every /replicate and /replicate_batch) and drives concurrent
+writers against POST /. Reports writes/sec and p50/p99 latency.
+
+    python bench_load.py --secondaries 2 --clients 16 --requests 5000 --w 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from wire import CONTENT_TYPE, decode_entries
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Peers dropping keep-alive connections on shutdown are expected here
+        pass
+
+
+class StandInSecondary:
+    """
+    Minimal secondary stand-in: ACKs replication requests after `delay` seconds.
+    """
+
+    def __init__(self, sid, delay=0.0):
+        self.sid = sid
+        self.delay = delay
+        self.received = 0
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if self.headers.get("Content-Type") == CONTENT_TYPE:
+                    entries = decode_entries(body)
+                else:
+                    payload = json.loads(body or b"{}")
+                    entries = payload.get("entries", [payload])
+                if standin.delay > 0:
+                    time.sleep(standin.delay)
+                with standin._lock:
+                    standin.received += len(entries)
+                self._reply(200, {"status": "ack"})
+
+            def do_GET(self):
+                self._reply(200, {"messages": []})
+
+            def _reply(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = QuietHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_master(port, env=None, script="master.py", timeout=15):
+    """
+    Launch a master script as a subprocess and wait until it answers GET /.
+    """
+    proc_env = dict(os.environ)
+    proc_env["MASTER_PORT"] = str(port)
+    proc_env.update(env or {})
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, script)],
+        env=proc_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{script} exited with code {proc.returncode} (port {port} busy?)")
+        try:
+            requests.get(f"{url}/", params={"limit": 1}, timeout=0.5)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{script} did not start on port {port}")
+
+
+def register(master_url, sid, url):
+    r = requests.post(f"{master_url}/register", json={"id": sid, "url": url}, timeout=5)
+    r.raise_for_status()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def run_writes(master_url, clients, total, w):
+    """
+    Issue `total` POSTs from `clients` threads. Returns (latencies, errors, elapsed).
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        session = requests.Session()
+        local = []
+        local_errors = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                r = session.post(f"{master_url}/", json={"message": f"msg-{i}", "w": w}, timeout=30)
+                if r.status_code != 200:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def report(label, latencies, errors, elapsed):
+    n = len(latencies)
+    print(
+        f"{label}: {n} writes in {elapsed:.2f}s -> {n / elapsed:.0f} writes/sec, "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms "
+        f"errors={errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--secondaries", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--w", type=int, default=None, help="write concern (default: all nodes)")
+    parser.add_argument("--delay", type=float, default=0.0, help="stand-in secondary ACK delay (s)")
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--workers", type=int, default=16, help="MASTER_MAX_WORKERS")
+    parser.add_argument("--batch-max", type=int, default=128, help="REPLICATE_BATCH_MAX")
+    parser.add_argument("--linger-ms", type=float, default=0.0, help="REPLICATE_BATCH_LINGER_MS")
+    parser.add_argument("--inflight", type=int, default=4, help="REPLICATE_MAX_INFLIGHT")
+    args = parser.parse_args()
+
+    w = args.w if args.w is not None else args.secondaries + 1
+    standins = [StandInSecondary(f"standin-{i}", delay=args.delay) for i in range(args.secondaries)]
+    proc, master_url = start_master(args.port, env={
+        "MASTER_MAX_WORKERS": str(args.workers),
+        "REPLICATE_BATCH_MAX": str(args.batch_max),
+        "REPLICATE_BATCH_LINGER_MS": str(args.linger_ms),
+        "REPLICATE_MAX_INFLIGHT": str(args.inflight),
+    })
+    try:
+        for s in standins:
+            register(master_url, s.sid, s.url)
+        run_writes(master_url, args.clients, min(200, args.requests), w)  # warm-up
+        latencies, errors, elapsed = run_writes(master_url, args.clients, args.requests, w)
+        report(f"w={w} secondaries={args.secondaries} clients={args.clients}", latencies, errors, elapsed)
+    finally:
+        proc.terminate()
+        proc.wait()
+        for s in standins:
+            s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench_memory.py
+"""
+Memory benchmark for log storage: RSS per million messages.
+
+Each layout is built in a fresh child process (so RSS is not shared between runs):
+
+  * dicts+index: one {"id", "message", "timestamp"} dict per entry, held by the ordered log
+    and by a by-id dict (the secondary's layout before compact storage)
+  * dicts: one dict per entry in sorted chunks (the master's layout before compact storage)
+  * columnar: OrderedLog with array-backed chunks (ids, timestamps, offsets + message buffer)
+
+    python bench_memory.py --n 1000000 --size 16
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+LAYOUTS = ("dicts+index", "dicts", "columnar")
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def build(layout, n, size):
+    from ordered_log import OrderedLog
+
+    now = time.time()
+    pad = "x" * max(0, size - 8)
+    before = rss_mb()
+    start = time.perf_counter()
+    if layout == "columnar":
+        log = OrderedLog()
+        for i in range(1, n + 1):
+            log.insert({"id": i, "message": f"{i:08d}{pad}", "timestamp": now + i})
+        keep = [log]
+    else:
+        chunks, chunk = [], []
+        by_id = {}
+        for i in range(1, n + 1):
+            entry = {"id": i, "message": f"{i:08d}{pad}", "timestamp": now + i}
+            if len(chunk) >= 1024:
+                chunks.append(chunk)
+                chunk = []
+            chunk.append(entry)
+            if layout == "dicts+index":
+                by_id[i] = entry
+        chunks.append(chunk)
+        keep = [chunks, by_id]
+    elapsed = time.perf_counter() - start
+    used = rss_mb() - before
+    print(f"{used:.1f} {elapsed:.2f}")
+    return keep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--size", type=int, default=16, help="message size in bytes")
+    parser.add_argument("--child", choices=LAYOUTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        build(args.child, args.n, args.size)
+        return
+
+    results = {}
+    for layout in LAYOUTS:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", layout, "--n", str(args.n), "--size", str(args.size)],
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        used, elapsed = float(out[0]), float(out[1])
+        results[layout] = used
+        per_million = used * 1_000_000 / args.n
+        print(
+            f"{layout:12s} n={args.n} size={args.size}B: {used:8.1f} MB RSS "
+            f"-> {per_million:8.1f} MB per million messages ({per_million * 1024 * 1024 / 1_000_000:.0f} B/entry), "
+            f"built in {elapsed:.2f}s"
+        )
+    print(f"columnar uses {results['dicts+index'] / max(0.1, results['columnar']):.1f}x less memory than dicts+index, "
+          f"{results['dicts'] / max(0.1, results['columnar']):.1f}x less than dicts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench_ordered_log.py
+"""
+Micro-benchmark for the secondary's log apply path.
+
+Applies N shuffled ids (with a by-id dedup dict, as secondary.py does) to
+  * OrderedLog (ordered_log.py)
+  * the previous list.append + list.sort(key=id) on every apply
+The old approach is O(n) per apply, so it is run on a smaller --baseline-n.
+
+    python bench_ordered_log.py --n 1000000 --baseline-n 20000
+"""
+import argparse
+import random
+import time
+
+from ordered_log import OrderedLog
+
+
+def apply_ordered_log(ids):
+    by_id = {}
+    log = OrderedLog()
+    start = time.perf_counter()
+    for i in ids:
+        if i in by_id:
+            continue
+        by_id[i] = {"id": i, "message": "m", "timestamp": 0.0}
+        log.insert(by_id[i])
+    elapsed = time.perf_counter() - start
+    assert log.max_contiguous_id == len(ids)
+    return elapsed
+
+
+def apply_sort_every_time(ids):
+    by_id = {}
+    log = []
+    start = time.perf_counter()
+    for i in ids:
+        if i in by_id:
+            continue
+        by_id[i] = {"id": i, "message": "m", "timestamp": 0.0}
+        log.append(by_id[i])
+        log.sort(key=lambda e: e["id"])
+    return time.perf_counter() - start
+
+
+def shuffled(n, seed):
+    ids = list(range(1, n + 1))
+    random.Random(seed).shuffle(ids)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--baseline-n", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for label, fn, n in (
+        ("OrderedLog", apply_ordered_log, args.n),
+        ("OrderedLog", apply_ordered_log, args.baseline_n),
+        ("sort-on-apply", apply_sort_every_time, args.baseline_n),
+    ):
+        elapsed = fn(shuffled(n, args.seed))
+        print(f"{label:14s} n={n:>9}: {elapsed:.2f}s -> {n / elapsed:,.0f} applies/sec")
+
+
+if __name__ == "__main__":
+    main()
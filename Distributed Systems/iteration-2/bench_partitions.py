@@ -0,0 +1,68 @@
+# bench_partitions.py
+"""
+Partitioned mode benchmark: aggregate writes/sec through router.py for 1..N partitions.
+
+For each partition count, starts that many master.py processes (each with its own
+stand-in secondaries) and a router in front of them, then drives concurrent writers
+against the router. Without --key writes are spread round-robin.
+
+    python bench_partitions.py --partitions 1 2 4 --secondaries 1 --clients 32 --requests 4000
+
+Against a running topology (e.g. docker-compose.partitioned.yml):
+
+    python bench_partitions.py --router http://127.0.0.2:5000 --clients 32 --requests 4000
+"""
+import argparse
+
+from bench_load import StandInSecondary, register, report, run_writes, start_master
+
+
+def bench(count, args):
+    procs = []
+    standins = []
+    try:
+        urls = []
+        for p in range(count):
+            proc, url = start_master(args.port + 1 + p)
+            procs.append(proc)
+            urls.append(url)
+            for i in range(args.secondaries):
+                s = StandInSecondary(f"p{p}-standin-{i}", delay=args.delay)
+                standins.append(s)
+                register(url, s.sid, s.url)
+        router, router_url = start_master(args.port, env={"PARTITIONS": ",".join(urls), "ROUTER_PORT": str(args.port)},
+                                          script="router.py")
+        procs.append(router)
+        run_writes(router_url, args.clients, min(200, args.requests), args.w)  # warm-up
+        latencies, errors, elapsed = run_writes(router_url, args.clients, args.requests, args.w)
+        report(f"partitions={count} w={args.w} clients={args.clients}", latencies, errors, elapsed)
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+        for s in standins:
+            s.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--secondaries", type=int, default=1, help="stand-in secondaries per partition")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--w", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.0, help="stand-in secondary ACK delay (s)")
+    parser.add_argument("--port", type=int, default=5900, help="router port, masters use the following ports")
+    parser.add_argument("--router", help="benchmark an already running router instead")
+    args = parser.parse_args()
+
+    if args.router:
+        latencies, errors, elapsed = run_writes(args.router.rstrip("/"), args.clients, args.requests, args.w)
+        report(f"router {args.router} w={args.w} clients={args.clients}", latencies, errors, elapsed)
+        return
+    for count in args.partitions:
+        bench(count, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# bench_processes.py
+"""
+Multi-process master benchmark: writes/sec of master_mp.py for several worker process
+counts, next to the single-process threaded master.py, against the same stand-in secondaries.
+
+    python bench_processes.py --processes 1 2 4 8 --secondaries 2 --clients 32 --requests 4000 --w 2
+"""
+import argparse
+
+from bench_load import StandInSecondary, register, report, run_writes, start_master
+
+
+def bench(label, script, env, standins, args):
+    proc, master_url = start_master(args.port, env=env, script=script)
+    try:
+        for s in standins:
+            register(master_url, s.sid, s.url)
+        run_writes(master_url, args.clients, min(200, args.requests), args.w)  # warm-up
+        latencies, errors, elapsed = run_writes(master_url, args.clients, args.requests, args.w)
+        report(f"{label} w={args.w} clients={args.clients}", latencies, errors, elapsed)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--secondaries", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--w", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.0, help="stand-in secondary ACK delay (s)")
+    parser.add_argument("--port", type=int, default=5900)
+    args = parser.parse_args()
+
+    standins = [StandInSecondary(f"standin-{i}", delay=args.delay) for i in range(args.secondaries)]
+    try:
+        bench("master.py (threaded)", "master.py", {}, standins, args)
+        for n in args.processes:
+            bench(f"master_mp.py processes={n}", "master_mp.py", {"MASTER_PROCESSES": str(n)}, standins, args)
+    finally:
+        for s in standins:
+            s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench_reads.py
+"""
+Read scaling benchmark: reads/sec as secondaries are added.
+
+For each secondary count, starts master.py and that many real secondary.py processes, preloads
+the log (written with w = all nodes), then drives concurrent readers issuing paged
+GET /?from_id=&limit=&min_id=<last id> (read-your-writes). With 0 secondaries every read goes
+to the master, otherwise reads are spread round-robin over the secondaries; reads a secondary
+redirects to the master are counted separately.
+
+    python bench_reads.py --secondaries 0 1 2 4 --readers 32 --reads 4000 --preload 2000 --page 100
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+
+import requests
+
+from bench_load import percentile, start_master
+
+
+def wait_registered(master_url, count, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = requests.get(f"{master_url}/secondaries/status", timeout=5).json()
+        if len(status["secondaries"]) >= count:
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"{count} secondaries did not register")
+
+
+def run_reads(urls, readers, total, last_id, page, consistency):
+    """
+    Issue `total` paged GETs from `readers` threads over `urls` round-robin.
+    Returns (latencies, redirected, errors, elapsed).
+    """
+    latencies = []
+    counts = {"redirected": 0, "errors": 0}
+    lock = threading.Lock()
+    counter = iter(range(total))
+    targets = itertools.cycle(urls)
+
+    def worker():
+        session = requests.Session()
+        local = []
+        redirected = errors = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+                url = next(targets)
+            if i is None:
+                break
+            params = {"from_id": random.randint(1, max(1, last_id - page + 1)), "limit": page}
+            params.update(consistency)
+            t0 = time.perf_counter()
+            try:
+                r = session.get(f"{url}/", params=params, timeout=30)
+                if r.status_code != 200:
+                    errors += 1
+                elif r.history:
+                    redirected += 1
+            except requests.RequestException:
+                errors += 1
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            counts["redirected"] += redirected
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=worker) for _ in range(readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, counts["redirected"], counts["errors"], time.perf_counter() - start
+
+
+def bench(count, args):
+    procs = []
+    try:
+        master, master_url = start_master(args.port)
+        procs.append(master)
+        urls = []
+        for i in range(count):
+            port = args.port + 1 + i
+            proc, url = start_master(port, env={
+                "MASTER_URL": master_url, "SECONDARY_ID": f"bench-s{i}", "SECONDARY_PORT": str(port),
+            }, script="secondary.py")
+            procs.append(proc)
+            urls.append(url)
+        if count:
+            wait_registered(master_url, count)
+
+        session = requests.Session()
+        last_id = 0
+        for i in range(args.preload):
+            r = session.post(f"{master_url}/", json={"message": f"msg-{i}", "w": count + 1}, timeout=30)
+            last_id = r.json()["entry"]["id"]
+
+        consistency = {} if args.any else {"min_id": last_id}
+        targets = urls or [master_url]
+        run_reads(targets, args.readers, min(200, args.reads), last_id, args.page, consistency)  # warm-up
+        latencies, redirected, errors, elapsed = run_reads(
+            targets, args.readers, args.reads, last_id, args.page, consistency
+        )
+        n = len(latencies)
+        print(
+            f"secondaries={count} readers={args.readers} page={args.page}: {n} reads in {elapsed:.2f}s "
+            f"-> {n / elapsed:.0f} reads/sec, p50={percentile(latencies, 50) * 1000:.1f}ms "
+            f"p99={percentile(latencies, 99) * 1000:.1f}ms redirected={redirected} errors={errors}"
+        )
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--secondaries", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--reads", type=int, default=4000)
+    parser.add_argument("--preload", type=int, default=2000, help="entries written before reading")
+    parser.add_argument("--page", type=int, default=100, help="entries per read (limit)")
+    parser.add_argument("--any", action="store_true", help="plain reads, without min_id")
+    parser.add_argument("--port", type=int, default=5900, help="master port, secondaries use the following ports")
+    args = parser.parse_args()
+
+    for count in args.secondaries:
+        bench(count, args)
+
+
+if __name__ == "__main__":
+    main()
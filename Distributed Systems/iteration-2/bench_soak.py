@@ -0,0 +1,134 @@
+# bench_soak.py
+"""
+Soak benchmark for log compaction: runs master.py and one secondary.py with snapshots on,
+writes at a steady --rate for --duration seconds and samples the resident memory (RSS) of both
+processes. With compaction memory should level off once the retention limit is reached
+instead of growing with the number of writes.
+
+    python bench_soak.py --duration 600 --rate 200 --retain 20000
+    python bench_soak.py --duration 86400 --rate 200        (the full 24h soak)
+    python bench_soak.py --duration 600 --no-compaction     (baseline: memory keeps climbing)
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench_load import HERE, start_master
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=600)
+    parser.add_argument("--rate", type=float, default=200, help="writes/sec")
+    parser.add_argument("--size", type=int, default=200, help="message size in bytes")
+    parser.add_argument("--retain", type=int, default=20000, help="LOG_RETAIN_ENTRIES")
+    parser.add_argument("--interval", type=float, default=10, help="SNAPSHOT_INTERVAL_SEC")
+    parser.add_argument("--sample-sec", type=float, default=30)
+    parser.add_argument("--no-compaction", action="store_true")
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--secondary-port", type=int, default=5901)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="soak-")
+    common = {
+        "LOG_RETAIN_ENTRIES": str(args.retain),
+        "SNAPSHOT_INTERVAL_SEC": str(args.interval),
+        "WAL_FSYNC": "0",
+        "WAL_SEGMENT_MB": "4",
+    }
+    master_env = dict(common, MASTER_WAL_DIR=os.path.join(workdir, "master-wal"))
+    if not args.no_compaction:
+        master_env["MASTER_SNAPSHOT_DIR"] = os.path.join(workdir, "master-snap")
+    proc, master_url = start_master(args.port, env=master_env)
+    secondary = None
+    try:
+        env = dict(os.environ, **common)
+        env.update({
+            "MASTER_URL": master_url,
+            "SECONDARY_ID": "soak",
+            "SECONDARY_PORT": str(args.secondary_port),
+            "SECONDARY_WAL_DIR": os.path.join(workdir, "secondary-wal"),
+        })
+        if not args.no_compaction:
+            env["SECONDARY_SNAPSHOT_DIR"] = os.path.join(workdir, "secondary-snap")
+        secondary = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "secondary.py")],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        while not requests.get(f"{master_url}/secondaries/status", timeout=5).json()["secondaries"]:
+            time.sleep(0.2)
+
+        stop = threading.Event()
+        written = [0]
+        errors = [0]
+        message = "x" * args.size
+
+        def writer():
+            session = requests.Session()
+            next_at = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    r = session.post(f"{master_url}/", json={"message": message, "w": 2}, timeout=10)
+                    if r.status_code == 200:
+                        written[0] += 1
+                    else:
+                        errors[0] += 1
+                except requests.RequestException:
+                    errors[0] += 1
+                next_at += 1.0 / args.rate
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        thread = threading.Thread(target=writer, daemon=True)
+        start = time.perf_counter()
+        thread.start()
+        samples = []
+        print(f"{'elapsed':>8} {'writes':>10} {'master MB':>10} {'secondary MB':>13}")
+        while True:
+            elapsed = time.perf_counter() - start
+            sample = (elapsed, written[0], rss_mb(proc.pid), rss_mb(secondary.pid))
+            samples.append(sample)
+            print(f"{sample[0]:8.0f} {sample[1]:10d} {sample[2]:10.1f} {sample[3]:13.1f}", flush=True)
+            if elapsed >= args.duration:
+                break
+            time.sleep(min(args.sample_sec, max(0.0, args.duration - elapsed)))
+        stop.set()
+        thread.join()
+
+        # Growth over the second half of the run (after the retention limit has been reached)
+        half = [s for s in samples if s[0] >= args.duration / 2]
+        first, last = half[0], half[-1]
+        print(
+            f"{written[0]} writes ({errors[0]} errors), compaction {'off' if args.no_compaction else 'on'}; "
+            f"RSS growth over the second half: master {last[2] - first[2]:+.1f} MB, "
+            f"secondary {last[3] - first[3]:+.1f} MB"
+        )
+    finally:
+        if secondary is not None:
+            secondary.terminate()
+            secondary.wait()
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench_wal.py
+"""
+Write-ahead log benchmark: writes/sec with fsync on and off.
+
+  * direct: `--threads` concurrent appenders on WriteAheadLog (shows group commit:
+    fsyncs issued vs records written)
+  * master: POST / (w=1, no secondaries) against master.py with MASTER_WAL_DIR set
+
+    python bench_wal.py --threads 16 --records 20000 --requests 3000
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from bench_load import report, run_writes, start_master
+from wal import WriteAheadLog
+
+
+def bench_direct(fsync, threads, records):
+    directory = tempfile.mkdtemp(prefix="wal-bench-")
+    wal = WriteAheadLog(directory, fsync=fsync)
+    per_thread = records // threads
+
+    def writer(t):
+        for i in range(per_thread):
+            wal.append({"id": t * per_thread + i, "message": f"message-{i}", "timestamp": time.time()})
+
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    wal.close()
+
+    start = time.perf_counter()
+    recovered = sum(1 for _ in WriteAheadLog(directory).replay())
+    recovery = time.perf_counter() - start
+    shutil.rmtree(directory)
+
+    n = per_thread * threads
+    print(
+        f"direct fsync={'on ' if fsync else 'off'} threads={threads}: {n / elapsed:,.0f} writes/sec, "
+        f"fsyncs={wal.fsync_count} ({n / max(1, wal.fsync_count):.1f} records/fsync), "
+        f"mmap recovery of {recovered} records in {recovery:.2f}s"
+    )
+
+
+def bench_master(fsync, args):
+    directory = tempfile.mkdtemp(prefix="wal-bench-master-")
+    proc, master_url = start_master(args.port, env={"MASTER_WAL_DIR": directory, "WAL_FSYNC": "1" if fsync else "0"})
+    try:
+        latencies, errors, elapsed = run_writes(master_url, args.clients, args.requests, 1)
+        report(f"master fsync={'on ' if fsync else 'off'} clients={args.clients}", latencies, errors, elapsed)
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--skip-master", action="store_true")
+    args = parser.parse_args()
+
+    for fsync in (False, True):
+        bench_direct(fsync, args.threads, args.records)
+    if not args.skip_master:
+        for fsync in (False, True):
+            bench_master(fsync, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# bench_wire.py
+"""
+Replication wire format benchmark: JSON vs binary frames (wire.py).
+
+1. Codec micro-benchmark: encode (master side) and decode (secondary side) time per entry
+   and bytes per entry, for batches of --batch entries.
+2. End-to-end apply throughput: a real secondary.py is fed pre-encoded /replicate_batch
+   requests in each format by --senders threads; reports entries/sec applied.
+
+    python bench_wire.py --entries 200000 --batch 128 --size 32 --senders 4
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+
+import requests
+
+from bench_load import start_master
+from wire import CONTENT_TYPE, decode_entries, encode_entries
+
+FORMATS = ("json", "binary")
+
+
+def make_batches(total, batch, size):
+    now = time.time()
+    pad = "x" * max(0, size - 8)
+    entries = [{"id": i, "message": f"{i:08d}{pad}", "timestamp": now + i} for i in range(1, total + 1)]
+    return [entries[i:i + batch] for i in range(0, total, batch)]
+
+
+def encode(fmt, batch):
+    if fmt == "binary":
+        return encode_entries(batch)
+    return json.dumps({"entries": batch}).encode("utf-8")
+
+
+def decode(fmt, body):
+    if fmt == "binary":
+        return decode_entries(body)
+    return json.loads(body)["entries"]
+
+
+def codec(batches, total):
+    for fmt in FORMATS:
+        start = time.perf_counter()
+        bodies = [encode(fmt, b) for b in batches]
+        encode_sec = time.perf_counter() - start
+        start = time.perf_counter()
+        for body in bodies:
+            decode(fmt, body)
+        decode_sec = time.perf_counter() - start
+        size = sum(len(b) for b in bodies)
+        print(
+            f"codec {fmt:6s}: encode {encode_sec / total * 1e6:5.2f} us/entry, "
+            f"decode {decode_sec / total * 1e6:5.2f} us/entry, {size / total:5.1f} bytes/entry"
+        )
+
+
+def apply_throughput(fmt, batches, total, senders, port):
+    headers = {"Content-Type": CONTENT_TYPE if fmt == "binary" else "application/json"}
+    bodies = iter([encode(fmt, b) for b in batches])
+    lock = threading.Lock()
+    errors = [0]
+    proc, url = start_master(port, env={
+        "SECONDARY_PORT": str(port), "SECONDARY_ID": f"bench-{fmt}",
+        # No master: registration keeps failing in the background, replication requests still apply
+        "MASTER_URL": "http://127.0.0.1:9", "CATCHUP_INTERVAL_SEC": "3600",
+    }, script="secondary.py")
+    try:
+        def sender():
+            session = requests.Session()
+            while True:
+                with lock:
+                    body = next(bodies, None)
+                if body is None:
+                    return
+                r = session.post(f"{url}/replicate_batch", data=body, headers=headers, timeout=30)
+                if r.status_code != 200:
+                    with lock:
+                        errors[0] += 1
+
+        threads = [threading.Thread(target=sender) for _ in range(senders)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        applied = requests.get(f"{url}/health", timeout=5).json()["max_contiguous_id"]
+        print(
+            f"apply {fmt:6s}: {applied} entries in {elapsed:.2f}s -> {applied / elapsed:.0f} entries/sec "
+            f"({senders} senders, errors={errors[0]})"
+        )
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=128)
+    parser.add_argument("--size", type=int, default=32, help="message size in bytes")
+    parser.add_argument("--senders", type=int, default=4)
+    parser.add_argument("--port", type=int, default=5950)
+    args = parser.parse_args()
+
+    batches = make_batches(args.entries, args.batch, args.size)
+    codec(batches, args.entries)
+    for fmt, port in zip(FORMATS, itertools.count(args.port)):
+        apply_throughput(fmt, batches, args.entries, args.senders, port)
+
+
+if __name__ == "__main__":
+    main()
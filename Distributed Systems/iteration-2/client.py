@@ -0,0 +1,490 @@
+# client.py
+"""
+Client library for the replicated log (iteration-2 master and secondaries).
+
+Writes go to the master. append() is one POST /; submit() queues a message and returns a future
+for its id. Queued messages are sent as bulk writes (POST /batch) of up to `batch_max` messages,
+at most `linger_ms` after the first one was queued, with up to `max_inflight` batches in flight
+(1 keeps submission order). Every batch carries an idempotency key, so resending it after a
+connection error can't append it twice.
+
+Reads go to a healthy secondary, round-robin, with `min_id` = the highest id this client wrote,
+so they include the client's own writes (the secondary waits for them or redirects to the master).
+Secondaries are either given (`replicas`) or discovered from the master's GET /secondaries/status.
+A secondary that fails is skipped for `retry_sec`; with none left, reads go to the master.
+
+Connections are kept alive in per-host pools. ReplicatedLogClient is the thread-based interface
+(requests), AsyncReplicatedLogClient the asyncio one (aiohttp), with the same methods:
+
+    with ReplicatedLogClient("http://127.0.0.1:5000", w=2) as log:
+        futures = [log.submit(f"msg-{i}") for i in range(10000)]
+        log.flush()
+        print(futures[-1].result(), log.read(from_id=1, limit=10))
+
+    async with AsyncReplicatedLogClient("http://127.0.0.1:5000", w=2) as log:
+        ids = await asyncio.gather(*(log.submit(f"msg-{i}") for i in range(10000)))
+        print(await log.read(from_id=1, limit=10))
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+
+import aiohttp
+import requests
+
+
+class WriteError(Exception):
+    """
+    A write the master did not confirm. `code` is the HTTP status (None: no response),
+    `body` the master's response. `ids` are the ids the master already assigned (e.g. on
+    "partial_failure": the entries are in its log and still reach the secondaries), None if
+    nothing was appended; don't append those messages again.
+    """
+
+    def __init__(self, code, body, ids=None):
+        super().__init__(f"write failed ({code}): {body}")
+        self.code = code
+        self.body = body
+        self.ids = ids
+
+
+class ReplicaSet:
+    """
+    Secondaries reads can go to: fixed urls, or the healthy secondaries listed by the master's
+    GET /secondaries/status (refreshed every `refresh_sec`). Picks them round-robin, skipping
+    those that failed in the last `retry_sec`.
+    """
+
+    def __init__(self, urls=None, refresh_sec=5.0, retry_sec=5.0):
+        self.fixed = urls is not None
+        self.urls = [u.rstrip("/") for u in urls or []]
+        self.refresh_sec = refresh_sec
+        self.retry_sec = retry_sec
+        self._refreshed_at = None
+        self._down = {}  # url -> monotonic time it may be used again
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def needs_refresh(self):
+        with self._lock:
+            return not self.fixed and (
+                self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_sec
+            )
+
+    def update(self, status):
+        """
+        Take the healthy secondaries from a GET /secondaries/status body (None: the master didn't answer).
+        """
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            if status is not None:
+                self.urls = [
+                    s["url"].rstrip("/") for s in status.get("secondaries", {}).values()
+                    if s.get("state", "healthy") == "healthy"
+                ]
+
+    def pick(self):
+        """
+        Next usable secondary url, or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.urls)):
+                url = self.urls[self._next % len(self.urls)]
+                self._next += 1
+                if self._down.get(url, 0.0) <= now:
+                    return url
+            return None
+
+    def failed(self, url):
+        with self._lock:
+            self._down[url] = time.monotonic() + self.retry_sec
+
+
+def _read_params(from_id, limit, min_id, max_lag):
+    params = {}
+    if from_id is not None:
+        params["from_id"] = from_id
+    if limit is not None:
+        params["limit"] = limit
+    if max_lag is not None:
+        params["max_lag"] = max_lag
+    elif min_id:
+        params["min_id"] = min_id
+    return params
+
+
+def _write_body(w, **fields):
+    """
+    JSON body of a write; without `w` the master's default (all nodes) applies.
+    """
+    if w is not None:
+        fields["w"] = w
+    return fields
+
+
+def _batch_ids(code, body, count):
+    """
+    Ids of a bulk write's messages; raises WriteError unless the master confirmed it.
+    """
+    ids = range(body["first_id"], body["first_id"] + count) if "first_id" in body else None
+    if code != 200 or ids is None:
+        raise WriteError(code, body, ids)
+    return ids
+
+
+def _entry_id(body):
+    entry = body.get("entry")
+    return range(entry["id"], entry["id"] + 1) if isinstance(entry, dict) and "id" in entry else None
+
+
+def _fail(futures, error):
+    """
+    Fail the futures of a bulk write's messages; a WriteError with assigned ids is split so that
+    each message's error carries its own id.
+    """
+    for i, future in enumerate(futures):
+        if future.done():
+            continue
+        if isinstance(error, WriteError) and error.ids is not None:
+            future.set_exception(WriteError(error.code, error.body, error.ids[i:i + 1]))
+        else:
+            future.set_exception(error)
+
+
+class ReplicatedLogClient:
+    """
+    Thread-safe client: submit() can be called from any number of producer threads.
+    """
+
+    def __init__(self, master_url, replicas=None, w=None, batch_max=1000, linger_ms=5.0, max_inflight=1,
+                 pool_size=16, timeout=30.0, retries=2, refresh_sec=5.0, retry_sec=5.0):
+        self.master_url = master_url.rstrip("/")
+        self.replicas = ReplicaSet(replicas, refresh_sec, retry_sec)
+        self.w = w
+        self.batch_max = batch_max
+        self.linger = linger_ms / 1000.0
+        self.timeout = timeout
+        self.retries = retries
+        self.last_id = 0  # highest id this client wrote (read-your-writes hint)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._queue = deque()  # (message, future, queued_at)
+        self._inflight = 0
+        self._flushing = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._senders = [
+            threading.Thread(target=self._sender, name=f"log-client-sender-{i}", daemon=True)
+            for i in range(max(1, max_inflight))
+        ]
+        for t in self._senders:
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ---- writes -------------------------------------------------------------
+
+    def append(self, message, w=None, idempotency_key=None):
+        """
+        One write (POST /), waits for its ACKs. Returns the entry.
+        """
+        body = _write_body(w or self.w, message=message)
+        if idempotency_key is not None:
+            body["idempotency_key"] = idempotency_key
+        code, resp = self._post("/", body)
+        if code != 200:
+            raise WriteError(code, resp, _entry_id(resp))
+        self._wrote(resp["entry"]["id"])
+        return resp["entry"]
+
+    def append_many(self, messages, w=None):
+        """
+        One bulk write (POST /batch) of the messages, right away. Returns their ids.
+        """
+        messages = list(messages)
+        code, resp = self._post("/batch", _write_body(w or self.w, messages=messages, idempotency_key=uuid.uuid4().hex))
+        ids = _batch_ids(code, resp, len(messages))
+        self._wrote(ids[-1])
+        return ids
+
+    def submit(self, message):
+        """
+        Queue a message for the next bulk write. Returns a Future of its id (WriteError on failure).
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("client is closed")
+            self._queue.append((message, future, time.monotonic()))
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_max:
+                self._cond.notify()
+        return future
+
+    def flush(self):
+        """
+        Send everything queued so far and wait until it was answered.
+        """
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                self._cond.wait_for(lambda: not self._queue and not self._inflight)
+            finally:
+                self._flushing -= 1
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._senders:
+            t.join()
+        self.session.close()
+
+    def _sender(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # Linger for a fuller batch unless a flush is waiting
+                while self._queue and len(self._queue) < self.batch_max and not (self._flushing or self._closed):
+                    remaining = self._queue[0][2] + self.linger - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_max, len(self._queue)))]
+                if not batch:
+                    continue
+                self._inflight += 1
+            try:
+                self._send(batch)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    def _send(self, batch):
+        # Cancelled futures are not sent; the rest can't be cancelled any more
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        futures = [future for _, future, _ in batch]
+        try:
+            ids = self.append_many([m for m, _, _ in batch])
+        except (requests.RequestException, ValueError) as e:
+            _fail(futures, WriteError(None, {"error": str(e)}))
+            return
+        except Exception as e:
+            # Anything else fails this batch only; the sender keeps running
+            _fail(futures, e)
+            return
+        for future, msg_id in zip(futures, ids):
+            future.set_result(msg_id)
+
+    def _post(self, path, body):
+        """
+        POST to the master, resent on connection errors (writes carry idempotency keys). Returns (code, body).
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                r = self.session.post(f"{self.master_url}{path}", json=body, timeout=self.timeout)
+                try:
+                    return r.status_code, r.json()
+                except ValueError:
+                    return r.status_code, {"error": r.text}
+            except requests.ConnectionError:
+                if attempt == self.retries or "idempotency_key" not in body:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
+    def _wrote(self, msg_id):
+        with self._cond:
+            self.last_id = max(self.last_id, msg_id)
+
+    # ---- reads --------------------------------------------------------------
+
+    def read(self, from_id=None, limit=None, consistent=True, max_lag=None):
+        """
+        Entries from a healthy secondary (the master if none answers). consistent=True includes
+        this client's own writes (min_id); max_lag=<sec> asks for bounded staleness instead.
+        """
+        params = _read_params(from_id, limit, self.last_id if consistent else None, max_lag)
+        url = self._replica()
+        if url is not None:
+            try:
+                r = self.session.get(f"{url}/", params=params, timeout=self.timeout)
+                if r.status_code == 200:
+                    return r.json()["messages"]
+            except (requests.RequestException, ValueError):
+                pass
+            self.replicas.failed(url)
+        r = self.session.get(f"{self.master_url}/", params=params, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()["messages"]
+
+    def _replica(self):
+        if self.replicas.needs_refresh():
+            try:
+                r = self.session.get(f"{self.master_url}/secondaries/status", timeout=self.timeout)
+                self.replicas.update(r.json() if r.status_code == 200 else None)
+            except (requests.RequestException, ValueError):
+                self.replicas.update(None)
+        return self.replicas.pick()
+
+
+class AsyncReplicatedLogClient:
+    """
+    asyncio client; use it from one event loop (`async with`, or call close()).
+    """
+
+    def __init__(self, master_url, replicas=None, w=None, batch_max=1000, linger_ms=5.0, max_inflight=1,
+                 pool_size=16, timeout=30.0, retries=2, refresh_sec=5.0, retry_sec=5.0):
+        self.master_url = master_url.rstrip("/")
+        self.replicas = ReplicaSet(replicas, refresh_sec, retry_sec)
+        self.w = w
+        self.batch_max = batch_max
+        self.linger = linger_ms / 1000.0
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.pool_size = pool_size
+        self.last_id = 0
+        self.session = None
+        self._queue = []  # (message, future)
+        self._timer = None
+        self._tasks = set()
+        self._slots = asyncio.Semaphore(max(1, max_inflight))
+
+    async def __aenter__(self):
+        self._session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    def _session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size),
+                                                 timeout=self.timeout)
+        return self.session
+
+    # ---- writes -------------------------------------------------------------
+
+    async def append(self, message, w=None, idempotency_key=None):
+        body = _write_body(w or self.w, message=message)
+        if idempotency_key is not None:
+            body["idempotency_key"] = idempotency_key
+        code, resp = await self._post("/", body)
+        if code != 200:
+            raise WriteError(code, resp, _entry_id(resp))
+        self.last_id = max(self.last_id, resp["entry"]["id"])
+        return resp["entry"]
+
+    async def append_many(self, messages, w=None):
+        messages = list(messages)
+        code, resp = await self._post(
+            "/batch", _write_body(w or self.w, messages=messages, idempotency_key=uuid.uuid4().hex)
+        )
+        ids = _batch_ids(code, resp, len(messages))
+        self.last_id = max(self.last_id, ids[-1])
+        return ids
+
+    def submit(self, message):
+        """
+        Queue a message for the next bulk write. Returns an asyncio future of its id.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((message, future))
+        if len(self._queue) >= self.batch_max:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._dispatch)
+        return future
+
+    async def flush(self):
+        while self._queue or self._tasks:
+            self._dispatch()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch, self._queue = self._queue[:self.batch_max], self._queue[self.batch_max:]
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        async with self._slots:
+            try:
+                ids = await self.append_many([m for m, _ in batch])
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                _fail([future for _, future in batch], WriteError(None, {"error": str(e)}))
+                return
+            except Exception as e:
+                _fail([future for _, future in batch], e)
+                return
+        for (_, future), msg_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(msg_id)
+
+    async def _post(self, path, body):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._session().post(f"{self.master_url}{path}", json=body) as r:
+                    try:
+                        return r.status, await r.json(content_type=None)
+                    except ValueError:
+                        return r.status, {"error": await r.text()}
+            except aiohttp.ClientConnectionError:
+                if attempt == self.retries or "idempotency_key" not in body:
+                    raise
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+    # ---- reads --------------------------------------------------------------
+
+    async def read(self, from_id=None, limit=None, consistent=True, max_lag=None):
+        params = _read_params(from_id, limit, self.last_id if consistent else None, max_lag)
+        url = await self._replica()
+        if url is not None:
+            try:
+                async with self._session().get(f"{url}/", params=params) as r:
+                    if r.status == 200:
+                        return (await r.json())["messages"]
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                pass
+            self.replicas.failed(url)
+        async with self._session().get(f"{self.master_url}/", params=params) as r:
+            r.raise_for_status()
+            return (await r.json())["messages"]
+
+    async def _replica(self):
+        if self.replicas.needs_refresh():
+            try:
+                async with self._session().get(f"{self.master_url}/secondaries/status") as r:
+                    self.replicas.update(await r.json() if r.status == 200 else None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                self.replicas.update(None)
+        return self.replicas.pick()
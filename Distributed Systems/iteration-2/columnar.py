@@ -0,0 +1,79 @@
+# columnar.py
+"""
+Columnar encoding of log entries, shared by the in-memory log (ordered_log.py), snapshot
+files (snapshot.py, zlib-compressed) and replication frames (wire.py, uncompressed):
+
+    ids (int64) | timestamps (float64, NaN for none) | message kinds (uint8) | message lengths (uint32) | messages
+
+Messages are utf-8: a plain string as is, any other JSON value as compact JSON.
+"""
+import json
+import math
+from array import array
+
+# Message kinds: plain string, or any other JSON value
+MSG_STR = 0
+MSG_JSON = 1
+
+
+def pack(entry):
+    """
+    (id, timestamp, kind, utf-8 bytes) of an entry dict.
+    """
+    message = entry["message"]
+    if isinstance(message, str):
+        kind, data = MSG_STR, message.encode("utf-8")
+    else:
+        kind, data = MSG_JSON, json.dumps(message, separators=(",", ":")).encode("utf-8")
+    ts = entry.get("timestamp")
+    return entry["id"], math.nan if ts is None else ts, kind, data
+
+
+def unpack_message(kind, data):
+    return data.decode("utf-8") if kind == MSG_STR else json.loads(data)
+
+
+def encode_columns(entries):
+    """
+    Columns of a list of {"id", "message", "timestamp"} dicts, in the given order.
+    """
+    ids = array("q")
+    timestamps = array("d")
+    kinds = array("B")
+    lengths = array("I")
+    messages = []
+    for e in entries:
+        msg_id, ts, kind, data = pack(e)
+        ids.append(msg_id)
+        timestamps.append(ts)
+        kinds.append(kind)
+        lengths.append(len(data))
+        messages.append(data)
+    return b"".join([ids.tobytes(), timestamps.tobytes(), kinds.tobytes(), lengths.tobytes(), *messages])
+
+
+def decode_columns(data, count, pos=0):
+    """
+    The `count` entries encoded in data[pos:], which must end with the last message.
+    Raises ValueError on truncated or malformed data.
+    """
+    ids, timestamps, kinds, lengths = array("q"), array("d"), array("B"), array("I")
+    for column in (ids, timestamps, kinds, lengths):
+        size = column.itemsize * count
+        if pos + size > len(data):
+            raise ValueError("truncated columns")
+        column.frombytes(data[pos:pos + size])
+        pos += size
+    if pos + sum(lengths) != len(data):
+        raise ValueError("message lengths don't match the data")
+    entries = []
+    for i in range(count):
+        end = pos + lengths[i]
+        try:
+            message = unpack_message(kinds[i], data[pos:end])
+        except UnicodeDecodeError as e:
+            raise ValueError(f"bad message encoding: {e}")
+        pos = end
+        ts = timestamps[i]
+        entries.append({"id": ids[i], "message": message, "timestamp": None if math.isnan(ts) else ts})
+    return entries
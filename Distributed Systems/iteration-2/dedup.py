@@ -0,0 +1,78 @@
+# dedup.py
+"""
+Idempotency keys for client writes: a bounded, time-expiring index key -> outcome of the
+first write with that key. Lookups are one dict access; eviction pops the oldest keys off
+a ring (insertion order = expiry order, the TTL is the same for every key), so neither
+ever scans the log.
+"""
+import time
+import threading
+from collections import deque
+
+
+class _Record:
+    __slots__ = ("expires_at", "done", "body", "code")
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+        self.done = threading.Event()
+        self.body = None
+        self.code = None
+
+
+class DedupIndex:
+    """
+    begin(key) either reserves the key for a new write (first=True) or returns the record of
+    the earlier write with that key. The owner then calls complete() once the entry is in the
+    log (the stored response, including its entry, is what retries get back) or discard() when
+    nothing was appended, so a retry runs the write again.
+    """
+
+    def __init__(self, capacity, ttl_sec):
+        self.capacity = capacity
+        self.ttl_sec = ttl_sec
+        self._records = {}  # key -> _Record
+        self._ring = deque()  # (key, record), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.evicted = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    def begin(self, key):
+        """
+        Returns (record, first).
+        """
+        now = time.monotonic()
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record.expires_at > now:
+                self.hits += 1
+                return record, False
+            self._evict(now)
+            record = _Record(now + self.ttl_sec)
+            self._records[key] = record
+            self._ring.append((key, record))
+            return record, True
+
+    def complete(self, record, body, code):
+        record.body = body
+        record.code = code
+        record.done.set()
+
+    def discard(self, key, record):
+        with self._lock:
+            if self._records.get(key) is record:
+                del self._records[key]
+        record.done.set()
+
+    def _evict(self, now):
+        # Called with the lock held; amortized O(1) per insert
+        ring = self._ring
+        while ring and (len(ring) >= self.capacity or ring[0][1].expires_at <= now):
+            key, record = ring.popleft()
+            if self._records.get(key) is record:
+                del self._records[key]
+                self.evicted += 1
@@ -0,0 +1,182 @@
+# digest.py
+"""
+Hashes of a log, to compare replicas without shipping their logs.
+
+PrefixDigest: hash of a log prefix (ids 1..n), a running blake2b over the entries in id order;
+a copy of its state is kept every `every` ids, so the hash at any id costs at most `every`
+entries on top of the entries appended since the last call.
+
+BucketTree: Merkle tree over id buckets, used by anti-entropy to locate diverged entries.
+"""
+import json
+import hashlib
+import threading
+
+# Per-entry digest length sent for a differing bucket (8 bytes, as hex)
+ENTRY_HASH_HEX = 16
+
+
+def entry_bytes(entry):
+    """
+    Canonical bytes of one entry for hashing (id and message; timestamps are not compared).
+    """
+    message = json.dumps(entry["message"], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f"{entry['id']}:{message}\n".encode("utf-8")
+
+
+class PrefixDigest:
+    """
+    `read(from_id, limit)` returns the entries from_id.. in id order (memory and snapshots);
+    the log must hold ids 1..n without gaps (the contiguous prefix).
+    """
+
+    def __init__(self, read, every=1024):
+        self._read = read
+        self.every = every
+        self._checkpoints = {0: hashlib.blake2b(digest_size=16)}  # id -> state after ids 1..id
+        self._head_id = 0
+        self._head = hashlib.blake2b(digest_size=16)
+        self._lock = threading.Lock()
+
+    def at(self, upto_id):
+        """
+        Hex digest of ids 1..upto_id. Raises LookupError if the log does not hold all of them.
+        """
+        with self._lock:
+            if upto_id >= self._head_id:
+                h = self._head.copy()
+                self._head_id = self._extend(h, self._head_id, upto_id, record=True)
+                self._head = h
+                return h.hexdigest()
+            start = upto_id - upto_id % self.every
+            h = self._checkpoints[start].copy()
+            self._extend(h, start, upto_id, record=False)
+            return h.hexdigest()
+
+    def _extend(self, h, last_id, upto_id, record):
+        while last_id < upto_id:
+            # Stop at checkpoint boundaries so every checkpoint gets recorded
+            step = min(upto_id - last_id, self.every - last_id % self.every)
+            entries = self._read(last_id + 1, step)
+            if len(entries) < step or entries[0]["id"] != last_id + 1 or entries[-1]["id"] != last_id + step:
+                raise LookupError(f"ids {last_id + 1}..{last_id + step} not in the log")
+            for e in entries:
+                h.update(entry_bytes(e))
+            last_id += step
+            if record and last_id % self.every == 0:
+                self._checkpoints[last_id] = h.copy()
+        return last_id
+
+    def invalidate(self, from_id):
+        """
+        Entries from from_id on were rewritten (repair): forget hashes covering them.
+        """
+        with self._lock:
+            if from_id > self._head_id:
+                return
+            keep = (from_id - 1) - (from_id - 1) % self.every
+            for cp in [cp for cp in self._checkpoints if cp > keep]:
+                del self._checkpoints[cp]
+            self._head_id = keep
+            self._head = self._checkpoints[keep].copy()
+
+
+class BucketTree:
+    """
+    Merkle tree over fixed-size id buckets of a contiguous log, for anti-entropy.
+
+    Leaf k is the hash of bucket k (ids k*bucket+1..(k+1)*bucket); only full buckets are leaves.
+    A node at `level` hashes up to `fanout` nodes of the level below. Node hashes depend on the
+    number of leaves compared (`n`), so both sides are compared on the same prefix; nodes that are
+    complete for `n` are cached. sync() hashes buckets that filled up since the last call,
+    so keeping the tree current costs about one hash per entry.
+    """
+
+    def __init__(self, read, bucket=256, fanout=16):
+        self._read = read
+        self.bucket = bucket
+        self.fanout = fanout
+        self._leaves = []
+        self._nodes = {}  # (level, index) -> digest of complete nodes
+        self._lock = threading.Lock()
+
+    def sync(self, contiguous_id):
+        """
+        Hash the buckets completed up to contiguous_id. Returns the number of leaves.
+        """
+        with self._lock:
+            while len(self._leaves) < contiguous_id // self.bucket:
+                self._leaves.append(self._hash_bucket(len(self._leaves)))
+            return len(self._leaves)
+
+    def depth(self, n):
+        """
+        Level of the root over n leaves.
+        """
+        level, width = 0, 1
+        while width < n:
+            level += 1
+            width *= self.fanout
+        return level
+
+    def hashes(self, level, indices, n):
+        """
+        Hex digests of nodes `indices` at `level` over the first n leaves (n <= leaves held).
+        """
+        with self._lock:
+            if n > len(self._leaves):
+                raise LookupError(f"only {len(self._leaves)} buckets, {n} requested")
+            return [self._node(level, i, n).hex() for i in indices]
+
+    def entry_hashes(self, k):
+        """
+        Per-entry digests of bucket k in id order, as one hex string (ENTRY_HASH_HEX characters per entry).
+        """
+        return "".join(
+            hashlib.blake2b(entry_bytes(e), digest_size=ENTRY_HASH_HEX // 2).hexdigest() for e in self.bucket_entries(k)
+        )
+
+    def bucket_entries(self, k):
+        first = k * self.bucket + 1
+        entries = self._read(first, self.bucket)
+        if len(entries) < self.bucket or entries[0]["id"] != first or entries[-1]["id"] != first + self.bucket - 1:
+            raise LookupError(f"bucket {k} (ids {first}..{first + self.bucket - 1}) not in the log")
+        return entries
+
+    def invalidate(self, msg_id):
+        """
+        The entry msg_id was rewritten (repair): rehash its bucket and drop the cached nodes above it.
+        """
+        with self._lock:
+            k = (msg_id - 1) // self.bucket
+            if k >= len(self._leaves):
+                return
+            self._leaves[k] = self._hash_bucket(k)
+            index = k
+            for level in range(1, self.depth(len(self._leaves)) + 1):
+                index //= self.fanout
+                self._nodes.pop((level, index), None)
+
+    def _hash_bucket(self, k):
+        h = hashlib.blake2b(digest_size=16)
+        for e in self.bucket_entries(k):
+            h.update(entry_bytes(e))
+        return h.digest()
+
+    def _node(self, level, index, n):
+        if level == 0:
+            return self._leaves[index]
+        span = self.fanout ** level
+        complete = (index + 1) * span <= n
+        if complete and (level, index) in self._nodes:
+            return self._nodes[(level, index)]
+        child_span = span // self.fanout
+        first = index * self.fanout
+        last = min(first + self.fanout, -(-n // child_span))
+        h = hashlib.blake2b(digest_size=16)
+        for child in range(first, last):
+            h.update(self._node(level - 1, child, n))
+        digest = h.digest()
+        if complete:
+            self._nodes[(level, index)] = digest
+        return digest
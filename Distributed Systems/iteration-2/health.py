@@ -0,0 +1,131 @@
+# health.py
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HEALTHY = "healthy"
+SUSPECTED = "suspected"
+UNHEALTHY = "unhealthy"
+
+
+class SecondaryHealth:
+    def __init__(self):
+        self.state = HEALTHY
+        self.misses = 0  # consecutive failed heartbeats / replications
+        self.latency_ewma = None  # seconds
+        self.last_seen = None  # time.time() of the last successful contact
+        self.last_error = None
+
+
+class HealthMonitor:
+    """
+    Tracks per-secondary health from periodic GET /health heartbeats and from replication results.
+
+    One miss makes a secondary `suspected`, `unhealthy_after` consecutive misses make it `unhealthy`;
+    any success makes it `healthy` again. Latency is an EWMA over heartbeat and replication RTTs.
+    Heartbeats run on their own small pool so a hanging secondary never holds replication workers.
+    `params` (callable -> dict) is sent as the query string of every heartbeat.
+    """
+
+    def __init__(self, targets, interval=1.0, timeout=1.0, unhealthy_after=3, alpha=0.2, logger=None, params=None):
+        self.targets = targets  # callable -> {sid: SecondaryClient}
+        self.params = params
+        self.interval = interval
+        self.timeout = timeout
+        self.unhealthy_after = max(1, unhealthy_after)
+        self.alpha = alpha
+        self.logger = logger
+        self._health = {}
+        self._pinging = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="heartbeat")
+
+    def start(self):
+        threading.Thread(target=self._run, name="heartbeat", daemon=True).start()
+
+    def reset(self, sid):
+        """
+        Fresh (healthy) state, e.g. when a secondary (re-)registers.
+        """
+        with self._lock:
+            self._health[sid] = SecondaryHealth()
+
+    def observe(self, sid, ok, rtt, error=None):
+        with self._lock:
+            h = self._health.setdefault(sid, SecondaryHealth())
+            previous = h.state
+            if ok:
+                h.misses = 0
+                h.state = HEALTHY
+                h.last_seen = time.time()
+                h.latency_ewma = rtt if h.latency_ewma is None else self.alpha * rtt + (1 - self.alpha) * h.latency_ewma
+            else:
+                h.misses += 1
+                h.last_error = error
+                h.state = UNHEALTHY if h.misses >= self.unhealthy_after else SUSPECTED
+            state = h.state
+        if state != previous and self.logger:
+            self.logger.warning(f"Secondary {sid} is now {state} (was {previous})")
+
+    def state(self, sid):
+        with self._lock:
+            h = self._health.get(sid)
+            return h.state if h else HEALTHY
+
+    def rank(self, streams):
+        """
+        Secondaries that can count towards a quorum (not unhealthy) as a list of (sid, stream),
+        healthy ones first, each group ordered by latency EWMA (fastest first).
+        """
+        order = {HEALTHY: 0, SUSPECTED: 1}
+        ranked = []
+        with self._lock:
+            for sid, stream in streams.items():
+                h = self._health.get(sid)
+                state = h.state if h else HEALTHY
+                if state == UNHEALTHY:
+                    continue
+                latency = h.latency_ewma if h and h.latency_ewma is not None else 0.0
+                ranked.append((order[state], latency, sid, stream))
+        ranked.sort(key=lambda r: (r[0], r[1]))
+        return [(sid, stream) for _, _, sid, stream in ranked]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                sid: {
+                    "state": h.state,
+                    "misses": h.misses,
+                    "latency_ewma_ms": round(h.latency_ewma * 1000, 2) if h.latency_ewma is not None else None,
+                    "last_seen": h.last_seen,
+                    "last_health_error": h.last_error,
+                }
+                for sid, h in self._health.items()
+            }
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            for sid, client in self.targets().items():
+                with self._lock:
+                    if sid in self._pinging:
+                        continue
+                    self._pinging.add(sid)
+                self._pool.submit(self._ping, sid, client)
+
+    def _ping(self, sid, client):
+        start = time.perf_counter()
+        try:
+            params = self.params() if self.params is not None else None
+            r = client.get("/health", params=params, timeout=self.timeout)
+            ok = r.status_code == 200
+            error = None if ok else {"status_code": r.status_code}
+        except requests.RequestException as e:
+            ok = False
+            error = {"error": str(e)}
+        finally:
+            with self._lock:
+                self._pinging.discard(sid)
+        self.observe(sid, ok, time.perf_counter() - start, error)
@@ -1,18 +1,58 @@
 # master.py
 import os
+import json
 import time
+import heapq
 import logging
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, Response, request, jsonify, send_file
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from metrics import Registry, TimedLock
+from ordered_log import OrderedLog
+from read_api import ndjson_stream, page_body, page_params, read_page
+from anti_entropy import AntiEntropy
+from dedup import DedupIndex
+from digest import BucketTree, PrefixDigest
+from health import HealthMonitor
+from replication import Replicator, WriteTracker
+from snapshot import Compactor, SnapshotStore
+from wal import WriteAheadLog
 
 app = Flask(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [MASTER] %(levelname)s: %(message)s")
+# Per-write lines are logged at DEBUG; LOG_LEVEL=DEBUG brings them back.
+# Werkzeug's per-request access log is off unless ACCESS_LOG=1.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s [MASTER] %(levelname)s: %(message)s")
+app.logger.setLevel(LOG_LEVEL)
+if os.environ.get("ACCESS_LOG", "0") != "1":
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+# Prometheus-style metrics served at GET /metrics
+metrics = Registry()
+APPEND_LATENCY = metrics.histogram(
+    "master_append_latency_seconds", "POST / latency from request to response, by write concern", ["w"]
+)
+WRITES = metrics.counter("master_writes_total", "POST / results by write concern and status", ["w", "status"])
+WRITE_ACKS = metrics.counter("master_write_acks_total", "Secondary ACKs received by the write path")
+REPLICATE_RTT = metrics.histogram(
+    "master_replicate_rtt_seconds", "Round trip of one /replicate_batch request, by secondary", ["secondary"]
+)
+REPLICATE_BATCHES = metrics.counter(
+    "master_replicate_batches_total", "/replicate_batch requests by secondary and result", ["secondary", "result"]
+)
+ANTI_ENTROPY_ROUNDS = metrics.counter(
+    "master_anti_entropy_rounds_total", "Anti-entropy rounds by secondary and outcome", ["secondary", "status"]
+)
+ANTI_ENTROPY_REPAIRED = metrics.counter(
+    "master_anti_entropy_repaired_entries_total", "Diverged entries rewritten on a secondary", ["secondary"]
+)
+LOCK_WAIT = metrics.histogram("master_lock_wait_seconds", "Time spent waiting to acquire a lock", ["lock"])
 
 # In-memory ordered log at master. Each entry: {"id": int, "message": str, "timestamp": float}
-master_log = []
-master_lock = threading.Lock()
+# Ids are assigned and appended under master_lock, so they reach the log in order; supports range reads.
+master_log = OrderedLog()
+master_lock = TimedLock(LOCK_WAIT.labels("master_lock"))
 
 # Registered secondaries: map id -> url
 secondaries = {}
@@ -23,24 +63,195 @@ secondaries_lock = threading.Lock()
 REPLICATE_TIMEOUT_SEC = float(os.environ.get("REPLICATE_TIMEOUT_SEC", "5.0"))
 # How many worker threads for parallel replication
 MAX_WORKERS = int(os.environ.get("MASTER_MAX_WORKERS", "16"))
-
-# Monotonic sequence counter for total ordering
-# Currently is not used
-_seq_lock = threading.Lock()
+# Batched replication: max entries per /replicate_batch request,
+# how long to wait for a batch to fill, and batches in flight per secondary
+BATCH_MAX = int(os.environ.get("REPLICATE_BATCH_MAX", "128"))
+BATCH_LINGER_MS = float(os.environ.get("REPLICATE_BATCH_LINGER_MS", "0"))
+MAX_INFLIGHT = int(os.environ.get("REPLICATE_MAX_INFLIGHT", "4"))
+# A secondary whose batch RTT (EWMA) or oldest in-flight batch exceeds this gets one batch in flight
+SLOW_RTT_MS = float(os.environ.get("REPLICATE_SLOW_RTT_MS", "200"))
+# Per-secondary outbox: max queued entries, and exponential backoff bounds for retrying failed batches
+OUTBOX_MAX = int(os.environ.get("REPLICATE_OUTBOX_MAX", "100000"))
+RETRY_BASE_MS = float(os.environ.get("REPLICATE_RETRY_BASE_MS", "100"))
+RETRY_MAX_MS = float(os.environ.get("REPLICATE_RETRY_MAX_MS", "10000"))
+# Replication wire format: "binary" (compact frames, falls back to JSON per secondary on 415) or "json"
+REPLICATE_WIRE = os.environ.get("REPLICATE_WIRE", "binary")
+
+# Heartbeats: how often to ping each secondary's /health, ping timeout,
+# and consecutive misses after which a (suspected) secondary is unhealthy
+HEARTBEAT_INTERVAL_SEC = float(os.environ.get("HEARTBEAT_INTERVAL_SEC", "1.0"))
+HEARTBEAT_TIMEOUT_SEC = float(os.environ.get("HEARTBEAT_TIMEOUT_SEC", "1.0"))
+UNHEALTHY_AFTER = int(os.environ.get("HEALTH_UNHEALTHY_AFTER", "3"))
+
+# Per-secondary health (healthy / suspected / unhealthy, latency EWMA) used for quorum selection
+health = HealthMonitor(
+    targets=lambda: replicator.clients(),
+    interval=HEARTBEAT_INTERVAL_SEC,
+    timeout=HEARTBEAT_TIMEOUT_SEC,
+    unhealthy_after=UNHEALTHY_AFTER,
+    logger=app.logger,
+    # Highest assigned id: secondaries measure their staleness against it (GET /?max_lag=)
+    params=lambda: {"last_id": _seq},
+)
+
+
+def observe_replication(sid, ok, rtt, detail):
+    """
+    Fed with the result of every /replicate_batch: health tracking + metrics.
+    """
+    health.observe(sid, ok, rtt, detail)
+    REPLICATE_RTT.labels(sid).observe(rtt)
+    REPLICATE_BATCHES.labels(sid, "ok" if ok else "error").inc()
+
+
+# Replication subsystem living for the whole process:
+# fixed worker pool + one pipelined, batched stream with a retrying outbox per registered secondary
+replicator = Replicator(
+    max_workers=MAX_WORKERS,
+    timeout=REPLICATE_TIMEOUT_SEC,
+    batch_max=BATCH_MAX,
+    linger=BATCH_LINGER_MS / 1000.0,
+    max_inflight=MAX_INFLIGHT,
+    outbox_max=OUTBOX_MAX,
+    retry_base=RETRY_BASE_MS / 1000.0,
+    retry_max=RETRY_MAX_MS / 1000.0,
+    observer=observe_replication,
+    logger=app.logger,
+    wire=REPLICATE_WIRE,
+    slow_rtt=SLOW_RTT_MS / 1000.0,
+)
+metrics.gauge(
+    "master_outbox_queued", "Entries waiting in each secondary's outbox", ["secondary"],
+    lambda: {(sid,): stream.stats()["queued"] for sid, stream in replicator.streams().items()},
+)
+
+# Reads: default/max page size for GET /?from_id=&limit= and entries per NDJSON chunk
+READ_PAGE_DEFAULT = int(os.environ.get("READ_PAGE_DEFAULT", "1000"))
+READ_PAGE_MAX = int(os.environ.get("READ_PAGE_MAX", "10000"))
+STREAM_CHUNK = int(os.environ.get("READ_STREAM_CHUNK", "1000"))
+
+# Optional durable write-ahead log (MASTER_WAL_DIR empty = in-memory only).
+# WAL_FSYNC=0 skips fsync (records still reach the OS page cache before the ACK).
+WAL_DIR = os.environ.get("MASTER_WAL_DIR", "")
+WAL_FSYNC = os.environ.get("WAL_FSYNC", "1") != "0"
+WAL_SEGMENT_MB = int(os.environ.get("WAL_SEGMENT_MB", "64"))
+wal = WriteAheadLog(WAL_DIR, segment_bytes=WAL_SEGMENT_MB * 1024 * 1024, fsync=WAL_FSYNC) if WAL_DIR else None
+
+# Log compaction (MASTER_SNAPSHOT_DIR empty = off): every SNAPSHOT_INTERVAL_SEC the oldest entries
+# beyond the retention limits (count / message bytes / age, 0 = no limit) are written to a compact
+# snapshot file and dropped from memory; WAL segments they cover are deleted.
+SNAPSHOT_DIR = os.environ.get("MASTER_SNAPSHOT_DIR", "")
+SNAPSHOT_INTERVAL_SEC = float(os.environ.get("SNAPSHOT_INTERVAL_SEC", "60"))
+LOG_RETAIN_ENTRIES = int(os.environ.get("LOG_RETAIN_ENTRIES", "100000"))
+LOG_RETAIN_BYTES = int(os.environ.get("LOG_RETAIN_BYTES", "0"))
+LOG_RETAIN_SEC = float(os.environ.get("LOG_RETAIN_SEC", "0"))
+snapshots = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+compactor = Compactor(
+    master_log,
+    master_lock,
+    snapshots,
+    retain_entries=LOG_RETAIN_ENTRIES,
+    retain_bytes=LOG_RETAIN_BYTES,
+    retain_sec=LOG_RETAIN_SEC,
+    interval=SNAPSHOT_INTERVAL_SEC,
+    on_compacted=wal.drop_segments if wal is not None else None,
+    logger=app.logger,
+) if snapshots is not None else None
+metrics.gauge("master_log_memory_entries", "Entries held in memory (not compacted)", [], lambda: {(): len(master_log)})
+
+# GET /secondaries/messages: secondaries are queried in parallel on a pool of its own (at least
+# INSPECT_MAX_WORKERS threads, grown to one per registered secondary), answers not in within
+# INSPECT_TIMEOUT_SEC are reported as timeouts; results are cached for INSPECT_CACHE_SEC
+INSPECT_TIMEOUT_SEC = float(os.environ.get("INSPECT_TIMEOUT_SEC", "2.0"))
+INSPECT_CACHE_SEC = float(os.environ.get("INSPECT_CACHE_SEC", "1.0"))
+INSPECT_MAX_WORKERS = int(os.environ.get("INSPECT_MAX_WORKERS", "16"))
+inspect_pool = ThreadPoolExecutor(max_workers=INSPECT_MAX_WORKERS, thread_name_prefix="inspect")
+_inspect_pool_size = INSPECT_MAX_WORKERS
+_inspect_cache = {}  # full -> (expires_at, body)
+_inspect_inflight = {}  # full -> Future of the inspection being computed
+_inspect_lock = threading.Lock()
+# Hash of the master's contiguous prefix, compared with the secondaries' at the same id
+master_digest = PrefixDigest(lambda from_id, limit: read_page(master_log, master_lock, from_id, limit, snapshots))
+
+# Anti-entropy: every ANTI_ENTROPY_INTERVAL_SEC (0 = off) compare Merkle trees over AE_BUCKET-id buckets
+# (AE_FANOUT children per node, same values on the secondaries) and repair entries that diverged
+ANTI_ENTROPY_INTERVAL_SEC = float(os.environ.get("ANTI_ENTROPY_INTERVAL_SEC", "30"))
+AE_BUCKET = int(os.environ.get("AE_BUCKET", "256"))
+AE_FANOUT = int(os.environ.get("AE_FANOUT", "16"))
+
+
+def observe_anti_entropy(sid, result):
+    ANTI_ENTROPY_ROUNDS.labels(sid, result["status"]).inc()
+    ANTI_ENTROPY_REPAIRED.labels(sid).inc(len(result.get("repaired", ())))
+
+
+anti_entropy = AntiEntropy(
+    BucketTree(lambda from_id, limit: read_page(master_log, master_lock, from_id, limit, snapshots),
+               AE_BUCKET, AE_FANOUT),
+    contiguous=lambda: master_log.readable_id,
+    targets=lambda: replicator.clients(),
+    interval=ANTI_ENTROPY_INTERVAL_SEC,
+    timeout=REPLICATE_TIMEOUT_SEC,
+    observer=observe_anti_entropy,
+    logger=app.logger,
+)
+
+# Idempotent writes: POST / with "idempotency_key" (or an Idempotency-Key header) is appended once;
+# retries with the same key get the first write's response back. Keys are kept for DEDUP_TTL_SEC,
+# at most DEDUP_MAX_KEYS of them (oldest evicted first).
+DEDUP_MAX_KEYS = int(os.environ.get("DEDUP_MAX_KEYS", "100000"))
+DEDUP_TTL_SEC = float(os.environ.get("DEDUP_TTL_SEC", "600"))
+# Max messages in one POST /batch (bulk append)
+BULK_MAX_MESSAGES = int(os.environ.get("BULK_MAX_MESSAGES", "10000"))
+dedup = DedupIndex(DEDUP_MAX_KEYS, DEDUP_TTL_SEC)
+metrics.gauge("master_dedup_keys", "Idempotency keys currently remembered", [], lambda: {(): len(dedup)})
+
+# Monotonic sequence counter for total ordering; ids are assigned and appended under master_lock
 _seq = 0
+# With the WAL, entries are appended before their fsync and become visible to reads
+# (master_log.visible_id) once they and every id below are durable; min-heap of durable ids ahead of that
+_durable_ahead = []
+if wal is not None:
+    master_log.visible_id = 0
+
+
+def publish_durable(seq_id):
+    """
+    Mark seq_id as durable and make the durable ids that follow the visible ones visible. Call under master_lock.
+    """
+    heapq.heappush(_durable_ahead, seq_id)
+    while _durable_ahead and _durable_ahead[0] == master_log.visible_id + 1:
+        master_log.visible_id = heapq.heappop(_durable_ahead)
 
 
-def next_seq():
+def recover_log():
+    """
+    Rebuild master_log and the sequence counter on startup: ids covered by snapshots stay on disk,
+    the rest is replayed from the write-ahead log.
+    """
     global _seq
-    with _seq_lock:
-        _seq += 1
-        return _seq
+    compacted = snapshots.last_id if snapshots is not None else 0
+    entries = sorted((e for e in wal.replay() if e["id"] > compacted), key=lambda e: e["id"]) if wal else []
+    with master_lock:
+        master_log.truncate(compacted)
+        for e in entries:
+            master_log.insert(e)
+        _seq = entries[-1]["id"] if entries else compacted
+        if wal is not None:
+            master_log.visible_id = _seq
+    app.logger.info(
+        f"Recovered {len(entries)} entries from WAL at {WAL_DIR or '-'} "
+        f"(ids up to {compacted} in snapshots at {SNAPSHOT_DIR or '-'})"
+    )
 
 
 @app.route("/register", methods=["POST"])
 def register_secondary():
     """
-    Secondary calls POST /register with JSON {"id": "...", "url": "http://ip:port"}
+    Secondary calls POST /register with JSON {"id": "...", "url": "http://ip:port", "max_contiguous_id": <int>}
+    Response carries the master's "last_id": everything after the secondary's max_contiguous_id
+    up to last_id is pulled by the secondary (catch-up via GET /?stream=1&from_id=...),
+    newer entries arrive through its replication stream.
     """
     data = request.get_json() or {}
     sid = data.get("id")
@@ -50,224 +261,446 @@ def register_secondary():
 
     with secondaries_lock:
         secondaries[sid] = url
-    app.logger.info(f"Registered secondary {sid} -> {url}")
-    return jsonify({"status": "registered", "secondaries": list(secondaries.keys())}), 200
-
-
-def replicate_to_secondary(sid, url, entry):
-    """
-    Send replicate request to one secondary. Returns tuple (sid, ok(boolean), details)
-    """
-    replicate_url = f"{url.rstrip('/')}/replicate"
-    try:
-        app.logger.debug(f"Sending replicate to {sid} @ {replicate_url}")
-        r = requests.post(replicate_url, json=entry, timeout=REPLICATE_TIMEOUT_SEC)
-        if r.status_code == 200:
-            return sid, True, None
-        else:
-            return sid, False, {"status_code": r.status_code, "body": r.text}
-    except requests.RequestException as e:
-        return sid, False, {"error": str(e)}
+    # Register the stream before reading last_id, so no entry falls between the two
+    stream = replicator.register(sid, url)
+    stream.reset_backoff()
+    health.reset(sid)
+    with master_lock:
+        last_id = master_log.last_id or 0
+    app.logger.info(
+        f"Registered secondary {sid} -> {url} "
+        f"(max_contiguous_id={data.get('max_contiguous_id', 0)}, master last_id={last_id})"
+    )
+    return jsonify({"status": "registered", "secondaries": list(secondaries.keys()), "last_id": last_id}), 200
 
 
 @app.route("/", methods=["POST"])
 def append_message():
     """
-    Client -> POST /   JSON: {"message": "...", "w": <int>}
+    Client -> POST /   JSON: {"message": "...", "w": <int>, "idempotency_key": "..."}
     w is the write concern (1 = master only, 2 = master + 1 secondary, etc.)
     Master appends message locally and then replicates to secondaries.
     Master returns only after receiving (w-1) ACKs from secondaries (or error if impossible).
+    idempotency_key is optional (also accepted as an Idempotency-Key header).
     """
     data = request.get_json() or {}
-    message = data.get("message")
+    if "Idempotency-Key" in request.headers:
+        data.setdefault("idempotency_key", request.headers["Idempotency-Key"])
+    body, code = append_entry(data)
+    return jsonify(body), code
+
+
+@app.route("/batch", methods=["POST"])
+def append_batch():
+    """
+    Client -> POST /batch   JSON: {"messages": ["...", ...], "w": <int>, "idempotency_key": "..."}
+    Bulk append: the messages get consecutive ids (response: "first_id", "last_id", "count") and are
+    ACKed as one write, once every one of them was ACKed by w-1 secondaries.
+    At most BULK_MAX_MESSAGES messages per request.
+    """
+    data = request.get_json() or {}
+    if "Idempotency-Key" in request.headers:
+        data.setdefault("idempotency_key", request.headers["Idempotency-Key"])
+    body, code = append_entry(data, bulk=True)
+    return jsonify(body), code
+
+
+def append_entry(data, bulk=False):
+    """
+    Append one client write (bulk: a POST /batch) and wait for its ACKs. Returns (response body, status code).
+    Shared by the HTTP routes and the worker processes of master_mp.py.
+
+    With an idempotency key the write happens once: a retry gets the first write's response
+    (same entry, "duplicate": true), waiting for it if the first write is still in flight.
+    Writes that appended nothing (validation errors, quorum unavailable) don't keep the key.
+    """
+    key = data.get("idempotency_key")
+    if key is None:
+        return _append(data, bulk)
+
+    start = time.perf_counter()
+    record, first = dedup.begin(str(key))
+    if first:
+        try:
+            body, code = _append(data, bulk)
+        except BaseException:
+            dedup.discard(str(key), record)
+            raise
+        if "entry" in body or "first_id" in body:
+            dedup.complete(record, body, code)
+        else:
+            dedup.discard(str(key), record)
+        return body, code
+
+    if not record.done.wait(REPLICATE_TIMEOUT_SEC + BATCH_LINGER_MS / 1000.0):
+        # The client's w isn't validated on this path, so it doesn't go into a metric label
+        return _write_result(start, "dup", "in_progress", {
+            "status": "in_progress",
+            "reason": "a write with this idempotency_key is still in progress",
+        }, 409)
+    if record.body is None:
+        # The first attempt appended nothing: this one is a fresh write
+        return append_entry(data, bulk)
+    app.logger.debug(
+        "Duplicate write for idempotency_key=%s -> id=%s", key,
+        record.body["entry"]["id"] if "entry" in record.body else record.body["first_id"],
+    )
+    return _write_result(start, record.body.get("w"), "duplicate", {**record.body, "duplicate": True}, record.code)
+
+
+def _append(data, bulk=False):
+    global _seq
+    start = time.perf_counter()
     try:
         w = int(data.get("w", len(dict(secondaries)) + 1))  # default w = # secondary + 1
     except Exception:
-        return jsonify({"error": "w must be integer >= 1"}), 400
-
-    if message is None:
-        return jsonify({"error": "message required"}), 400
+        return {"error": "w must be integer >= 1"}, 400
+
+    if bulk:
+        messages = data.get("messages")
+        if not isinstance(messages, list) or not messages or any(m is None for m in messages):
+            return {"error": "messages must be a non-empty list of messages"}, 400
+        if len(messages) > BULK_MAX_MESSAGES:
+            return {"error": f"at most {BULK_MAX_MESSAGES} messages per batch"}, 413
+    else:
+        messages = [data.get("message")]
+        if messages[0] is None:
+            return {"error": "message required"}, 400
     if w < 1:
-        return jsonify({"error": "w must be >= 1"}), 400
+        return {"error": "w must be >= 1"}, 400
 
-    # Assign global sequence id and timestamp, append to master log
-    # message_id = data.get("id")
-    # if message_id is None:
-    #    return jsonify({"error": "id required"}), 400
-    seq_id = next_seq()
-    entry = {"id": seq_id, "message": message, "timestamp": time.time()}
+    targets = replicator.streams()
+    total_nodes = 1 + len(targets)  # master + registered secondaries
+    if w > total_nodes:
+        return {"error": f"w={w} too large for current cluster size {total_nodes}"}, 400
 
+    required_acks = w - 1  # number of secondaries that must ACK
+    # Secondaries that can ACK (not unhealthy), fastest healthy ones first;
+    # unhealthy ones still get every entry through their outbox, last
+    available = health.rank(targets)
+    available_sids = {sid for sid, _ in available}
+    unhealthy = [(sid, stream) for sid, stream in targets.items() if sid not in available_sids]
+    if required_acks > len(available):
+        # Fail fast instead of waiting out timeouts on secondaries known to be down
+        return _write_result(start, w, "quorum_unavailable", {
+            "status": "failed",
+            "reason": "quorum unavailable",
+            "required_acks": required_acks,
+            "available": [sid for sid, _ in available],
+            "unhealthy": [sid for sid, _ in unhealthy],
+        }, 503)
+
+    # Assign global sequence id and timestamp and append to master log in one critical section,
+    # so ids reach the log (and the WAL) in order. With a WAL only the buffered write happens under
+    # the lock; the fsync is waited for outside it (concurrent writers share one, group commit).
+    # A bulk write gets consecutive ids and is written to the WAL in one go.
     with master_lock:
-        # if we want to avoid duplicates in messages
-        # if any(e["message"] == message for e in master_log):
-        #     return jsonify({"status": "duplicate_skipped"}), 200
-        master_log.append(entry)
-
-    app.logger.info(f"Appended to master log id={seq_id}: {message} (w={w})")
+        now = time.time()
+        entries = [{"id": _seq + 1 + i, "message": m, "timestamp": now} for i, m in enumerate(messages)]
+        if wal is not None:
+            try:
+                ticket = wal.write(entries)
+            except OSError as e:
+                app.logger.error(f"WAL write failed for id={entries[0]['id']}: {e}")
+                return _write_result(start, w, "wal_error", {"error": "failed to persist message"}, 500)
+        _seq = entries[-1]["id"]
+        for entry in entries:
+            master_log.insert(entry)
+    seq_id = entries[0]["id"]
+    # What the response reports as written: the entry, or the id range of a bulk write
+    if bulk:
+        written = {"first_id": seq_id, "last_id": entries[-1]["id"], "count": len(entries)}
+    else:
+        written = {"entry": entries[0]}
+
+    if wal is not None:
+        # Durable before it becomes visible to reads and secondaries
+        try:
+            wal.sync(ticket)
+            synced = True
+        except OSError as e:
+            app.logger.error(f"WAL fsync failed for id={seq_id}: {e}")
+            synced = False
+        with master_lock:
+            for entry in entries:
+                publish_durable(entry["id"])
+        if not synced:
+            # The record is in the WAL file and comes back on restart: publish and replicate it
+            # so the ids stay gap-free, but the client can't count on it being durable
+            for _, stream in available + unhealthy:
+                for entry in entries:
+                    stream.enqueue(entry)
+            return _write_result(start, w, "wal_error", {"error": "failed to persist message", **written}, 500)
+
+    # Lazy %-formatting: hot path, the string is only built when DEBUG is on
+    app.logger.debug("Appended to master log id=%s (%s entries): %s (w=%s)", seq_id, len(entries), messages[0], w)
 
     # If w == 1, we don't need any secondary ACKs (master-only write concern).
     # if w == 1:
     #    return jsonify({"status": "ok", "w": w, "entry": entry}), 200
 
     if w == 1:
-        with secondaries_lock:
-            targets = dict(secondaries)
-        if targets:
-            def replicate_bg(entry, targets):
-                for sid, url in targets.items():
-                    try:
-                        replicate_to_secondary(sid, url, entry)
-                    except Exception as e:
-                        app.logger.warning(f"Background replication to {sid} failed: {e}")
-            threading.Thread(target=replicate_bg, args=(entry, targets), daemon=True).start()
-        return jsonify({"status": "ok", "w": w, "entry": entry}), 200
-
-    # Determine how many secondary ACKs we need
-    with secondaries_lock:
-        targets = dict(secondaries)  # copy
-    total_nodes = 1 + len(targets)  # master + secondaries
-    if w > total_nodes:
-        return jsonify({"error": f"w={w} too large for current cluster size {total_nodes}"}), 400
-
-    required_acks = w - 1  # number of secondaries that must ACK
-
-    # Parallel replication to secondaries.
-    # We'll submit tasks in parallel and return as soon as required_acks are received (early exit).
-    #results = {}
-    #ack_count = 0
-    #errors = {}
-
-    if len(targets) == 0:
-        # No secondaries available
-        if required_acks > 0:
-            return jsonify({"status": "failed", "reason": "no secondaries available", "required_acks": required_acks}), 500
-        else:
-            return jsonify({"status": "ok", "w": w, "entry": entry}), 200
+        for _, stream in available + unhealthy:
+            for entry in entries:
+                stream.enqueue(entry)
+        return _write_result(start, w, "ok", {"status": "ok", "w": w, **written}, 200)
 
     # -------------------------------------------------------------------------
-    # Parallel replication with early return once required ACKs are received
+    # Hand the entry to every secondary's replication stream (fastest healthy
+    # first) and wait until the batches holding it are ACKed by required_acks
+    # secondaries (early return). Only available secondaries are waited on;
+    # unhealthy ones still get the entry through their outbox.
+    # Remaining replicas keep flowing through the streams in the background.
     # -------------------------------------------------------------------------
-    import concurrent.futures
-
-    ack_count = 0
-    results = {}
-    errors = {}
-    done_sids = set()
+    tracker = WriteTracker(required=required_acks, expected=len(available), entries=len(entries))
+    for _, stream in available:
+        for entry in entries:
+            stream.enqueue(entry, tracker)
+    for _, stream in unhealthy:
+        for entry in entries:
+            stream.enqueue(entry)
+
+    ack_count, results = tracker.wait(timeout=REPLICATE_TIMEOUT_SEC + BATCH_LINGER_MS / 1000.0)
+    WRITE_ACKS.inc(ack_count)
+
+    # ✅ Early return once required ACKs reached
+    if ack_count >= required_acks:
+        app.logger.debug("Required ACKs (%s) reached — responding to client", required_acks)
+        return _write_result(start, w, "ok", {
+            "status": "ok",
+            "w": w,
+            **written,
+            "acks_received": ack_count,
+            "results": results
+        }, 200)
 
-    def replicate_and_track(sid, url):
-        sid_ret, ok, detail = replicate_to_secondary(sid, url, entry)
-        return sid, ok, detail
+    # -------------------------------------------------------------------------
+    # Not enough ACKs within timeout
+    # -------------------------------------------------------------------------
+    errors = {sid: res["detail"] for sid, res in results.items() if not res["ack"]}
+    for sid, stream in available:
+        if sid not in results:
+            # Still queued or being retried in the secondary's outbox
+            errors[sid] = {"error": "timeout", "last_error": stream.last_error}
+    app.logger.error(f"Not enough ACKs ({ack_count}/{required_acks}) before timeout")
+    return _write_result(start, w, "partial_failure", {
+        "status": "partial_failure",
+        "w": w,
+        **written,
+        "required_acks": required_acks,
+        "acks_received": ack_count,
+        "results": results,
+        "errors": errors
+    }, 500)
+
+
+def _write_result(start, w, status, body, code):
+    """
+    Record latency/outcome of a POST / and pass its response through.
+    """
+    APPEND_LATENCY.labels(w).observe(time.perf_counter() - start)
+    WRITES.labels(w, status).inc()
+    return body, code
 
-    # Start replication threads
-    executor = concurrent.futures.ThreadPoolExecutor(
-        max_workers=min(MAX_WORKERS, max(1, len(targets)))
-    )
-    future_to_sid = {
-        executor.submit(replicate_and_track, sid, url): sid for sid, url in targets.items()
-    }
 
+@app.route("/", methods=["GET"])
+def get_messages():
+    """
+    Return master's authoritative log in total order.
+    GET /                              -> full log (legacy)
+    GET /?from_id=<id>&limit=<n>       -> one page + "next_from_id" cursor
+    GET /?stream=1[&from_id=][&limit=] -> NDJSON, one entry per line, sent in chunks
+    """
     try:
-        for fut in concurrent.futures.as_completed(future_to_sid):
-            sid = future_to_sid[fut]
-            try:
-                sid_ret, ok, detail = fut.result()
-            except Exception as e:
-                ok = False
-                detail = {"exception": str(e)}
+        from_id, limit = page_params(request.args, READ_PAGE_DEFAULT, READ_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "from_id and limit must be integers, limit >= 1"}), 400
 
-            results[sid] = {"ack": ok, "detail": detail}
+    if request.args.get("stream") in ("1", "true"):
+        # Streams are sent in chunks, so they are not capped at READ_PAGE_MAX
+        stream_limit = int(request.args["limit"]) if "limit" in request.args else None
+        return Response(
+            ndjson_stream(master_log, master_lock, from_id, stream_limit, STREAM_CHUNK, snapshots),
+            mimetype="application/x-ndjson",
+        )
 
-            if ok:
-                ack_count += 1
-                done_sids.add(sid)
-                app.logger.info(f"ACK from {sid} ({ack_count}/{required_acks})")
-            else:
-                errors[sid] = detail
-                app.logger.warning(f"Replication to {sid} failed: {detail}")
-
-            # ✅ Early return once required ACKs reached
-            if ack_count >= required_acks:
-                app.logger.info(
-                    f"Required ACKs ({required_acks}) reached — responding to client"
-                )
-
-                # Launch background thread to let remaining replicas finish
-                pending = [
-                    f for f in future_to_sid if f not in done_sids
-                ]
-
-                def background_wait(pending_futs):
-                    for f in pending_futs:
-                        try:
-                            f.result(timeout=REPLICATE_TIMEOUT_SEC)
-                        except Exception as e:
-                            app.logger.warning(f"Background replication failed: {e}")
-
-                threading.Thread(
-                    target=background_wait, args=(pending,), daemon=True
-                ).start()
-
-                return jsonify({
-                    "status": "ok",
-                    "w": w,
-                    "entry": entry,
-                    "acks_received": ack_count,
-                    "results": results
-                }), 200
-
-        # ---------------------------------------------------------------------
-        # Not enough ACKs within timeout
-        # ---------------------------------------------------------------------
-        app.logger.error(f"Not enough ACKs ({ack_count}/{required_acks}) before timeout")
-        return jsonify({
-            "status": "partial_failure",
-            "required_acks": required_acks,
-            "acks_received": ack_count,
-            "results": results,
-            "errors": errors
-        }), 500
+    if "from_id" in request.args or "limit" in request.args:
+        entries = read_page(master_log, master_lock, from_id, limit, snapshots)
+        return jsonify(page_body(entries, from_id, limit)), 200
 
-    finally:
-        executor.shutdown(wait=False)
+    entries = read_page(master_log, master_lock, None, None, snapshots)
+    return jsonify({"messages": entries}), 200
 
 
+@app.route("/snapshots", methods=["GET"])
+def list_snapshots():
+    """
+    Snapshot files holding the compacted prefix of the log (ids below "start_id").
+    Catch-up downloads them from GET /snapshots/<name> and pulls the tail as NDJSON.
+    """
+    with master_lock:
+        start_id = master_log.start_id
+    return jsonify({"snapshots": snapshots.list() if snapshots is not None else [], "start_id": start_id}), 200
 
 
-    # Success
-    return jsonify({"status": "ok", "w": w, "entry": entry, "acks_received": ack_count, "results": results}), 200
+@app.route("/snapshots/<name>", methods=["GET"])
+def get_snapshot(name):
+    path = snapshots.path(name) if snapshots is not None else None
+    if path is None:
+        return jsonify({"error": "unknown snapshot"}), 404
+    return send_file(path, mimetype="application/octet-stream")
 
 
-@app.route("/", methods=["GET"])
-def get_messages():
+@app.route("/secondaries/status", methods=["GET"])
+def get_secondaries_status():
     """
-    Return master's authoritative log in total order.
+    Per-secondary health (state, latency EWMA) and replication outbox state: queue depth,
+    in-flight batches, retries/backoff, rejected entries and how many entries the secondary
+    is behind the master (lag).
     """
     with master_lock:
-        return jsonify({"messages": list(master_log)}), 200
+        last_id = master_log.last_id or 0
+    states = health.snapshot()
+    status = {}
+    for sid, stream in replicator.streams().items():
+        stats = stream.stats()
+        stats["lag"] = max(0, last_id - stats["last_acked_id"])
+        stats.update(states.get(sid, {}))
+        status[sid] = stats
+    return jsonify({"last_id": last_id, "secondaries": status}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Prometheus text exposition format.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/secondaries/messages", methods=["GET"])
 def get_secondary_messages():
     """
-    Proxy to all registered secondaries and fetch their messages (for inspection).
+    Replica inspection; all secondaries are queried in parallel within INSPECT_TIMEOUT_SEC,
+    results are cached for INSPECT_CACHE_SEC.
+    GET /secondaries/messages         -> per-secondary summary (count, max contiguous id, prefix hash),
+                                         "in_sync" = same prefix hash as the master at that id
+    GET /secondaries/messages?full=1  -> every secondary's full log (expensive)
     """
-    with secondaries_lock:
-        targets = dict(secondaries)
+    full = request.args.get("full") in ("1", "true")
+    # Single flight: one caller inspects, concurrent callers wait for its result (not for the lock)
+    with _inspect_lock:
+        cached = _inspect_cache.get(full)
+        if cached is not None and cached[0] > time.monotonic():
+            return jsonify(cached[1]), 200
+        inflight = _inspect_inflight.get(full)
+        leader = inflight is None
+        if leader:
+            inflight = _inspect_inflight[full] = Future()
+    if leader:
+        try:
+            body = inspect_secondaries(full)
+            with _inspect_lock:
+                _inspect_cache[full] = (time.monotonic() + INSPECT_CACHE_SEC, body)
+            inflight.set_result(body)
+        except Exception as e:
+            inflight.set_exception(e)
+            raise
+        finally:
+            with _inspect_lock:
+                _inspect_inflight.pop(full, None)
+    return jsonify(inflight.result()), 200
+
+
+def inspection_pool(n):
+    """
+    Inspection pool with at least one thread per secondary, so no query queues behind another.
+    """
+    global inspect_pool, _inspect_pool_size
+    with _inspect_lock:
+        if n > _inspect_pool_size:
+            old = inspect_pool
+            inspect_pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="inspect")
+            _inspect_pool_size = n
+            old.shutdown(wait=False)
+        return inspect_pool
+
+
+def inspect_one(client, path, params, deadline):
+    """
+    GET from a secondary, abandoned once `deadline` passes (also while the body is still trickling in).
+    Returns (status code, body).
+    """
+    resp = client.get(path, params=params, timeout=max(0.001, deadline - time.monotonic()), stream=True)
+    with resp:
+        body = bytearray()
+        for chunk in resp.iter_content(64 * 1024):
+            body += chunk
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no answer within {INSPECT_TIMEOUT_SEC}s")
+    return resp.status_code, bytes(body)
+
 
+def inspect_secondaries(full):
+    with master_lock:
+        upto = master_log.readable_id
+    path, params = ("/", None) if full else ("/summary", {"upto": upto})
+    clients = replicator.clients()
+    pool = inspection_pool(len(clients))
+    deadline = time.monotonic() + INSPECT_TIMEOUT_SEC
+    futures = {sid: pool.submit(inspect_one, client, path, params, deadline) for sid, client in clients.items()}
+    done, _ = wait(futures.values(), timeout=INSPECT_TIMEOUT_SEC)
     aggregated = {}
-    for sid, url in targets.items():
+    for sid, future in futures.items():
+        if future not in done:
+            aggregated[sid] = {"error": f"no answer within {INSPECT_TIMEOUT_SEC}s"}
+            continue
         try:
-            resp = requests.get(f"{url.rstrip('/')}/", timeout=REPLICATE_TIMEOUT_SEC)
-            if resp.status_code == 200:
-                aggregated[sid] = resp.json()
+            code, body = future.result()
+            if code == 200:
+                aggregated[sid] = json.loads(body)
             else:
-                aggregated[sid] = {"error": f"status {resp.status_code}", "body": resp.text}
+                aggregated[sid] = {"error": f"status {code}", "body": body.decode("utf-8", "replace")}
         except Exception as e:
             aggregated[sid] = {"error": str(e)}
-    return jsonify(aggregated), 200
+    if full:
+        return aggregated
+
+    for summary in aggregated.values():
+        if "prefix_hash" in summary:
+            summary["in_sync"] = summary["prefix_hash"] == master_digest.at(summary["hash_upto"])
+    return {
+        "master": {"count": upto, "max_contiguous_id": upto, "prefix_hash": master_digest.at(upto)},
+        "secondaries": aggregated,
+    }
+
+
+@app.route("/secondaries/anti_entropy", methods=["GET", "POST"])
+def get_anti_entropy():
+    """
+    GET  -> last anti-entropy round per secondary (in_sync / repaired / error)
+    POST -> run a round with every secondary now and return its results
+    """
+    if request.method == "POST":
+        anti_entropy.run_once()
+    return jsonify(anti_entropy.snapshot()), 200
+
+
+def start_background():
+    """
+    Recover the log and start compaction and heartbeats (before serving requests).
+    """
+    if wal is not None or snapshots is not None:
+        recover_log()
+    if compactor is not None:
+        compactor.start()
+    health.start()
+    if ANTI_ENTROPY_INTERVAL_SEC > 0:
+        anti_entropy.start()
 
 
 if __name__ == "__main__":
     host = "0.0.0.0"
     port = int(os.environ.get("MASTER_PORT", 5000))
+    start_background()
     app.run(host=host, port=port, threaded=True)
\ No newline at end of file
@@ -0,0 +1,340 @@
+# master_async.py
+"""
+Asyncio variant of master.py for the core write/read path: POST /, GET / (full log, from_id/limit
+pages and stream=1 NDJSON), POST /register (with "last_id" for catch-up) and GET /secondaries/messages.
+Every write's quorum wait runs on a single event loop with one future per secondary instead of threads.
+
+Each entry is sent to each secondary with POST /replicate; connection errors, timeouts and 5xx/429
+are retried with exponential backoff and jitter (as replication.py does) for up to REPLICATE_RETRY_FOR_SEC,
+after that the secondary's gap fill / catch-up pulls the entry. Replicas still pending after an early
+return are tracked in `pending_replicas` and drained on shutdown rather than being left to daemon threads.
+
+Not implemented here (answered with 501): POST /batch, GET /secondaries/status, GET /snapshots.
+Run master.py for the client SDK's batched writes and for secondaries with SNAPSHOT_BOOTSTRAP.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+
+import aiohttp
+from aiohttp import web
+
+from read_api import page_body, page_params
+from replication import backoff_delay
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [MASTER-ASYNC] %(levelname)s: %(message)s")
+log = logging.getLogger("master_async")
+
+# In-memory ordered log at master. Each entry: {"id": int, "message": str, "timestamp": float}
+# Only touched from the event loop thread, so no lock is needed.
+master_log = []
+
+# Registered secondaries: map id -> url
+secondaries = {}
+# One keep-alive aiohttp session per registered secondary
+sessions = {}
+
+# Replication futures nobody is waiting on anymore (after an early return or for w=1)
+pending_replicas = set()
+
+# Configs
+REPLICATE_TIMEOUT_SEC = float(os.environ.get("REPLICATE_TIMEOUT_SEC", "5.0"))
+# Max concurrent connections per secondary
+MAX_WORKERS = int(os.environ.get("MASTER_MAX_WORKERS", "16"))
+# Exponential backoff (with jitter) between retries of a failed replication
+RETRY_BASE_MS = float(os.environ.get("REPLICATE_RETRY_BASE_MS", "100"))
+RETRY_MAX_MS = float(os.environ.get("REPLICATE_RETRY_MAX_MS", "10000"))
+# Give up retrying an entry after this long; the secondary pulls it through gap fill / catch-up
+RETRY_FOR_SEC = float(os.environ.get("REPLICATE_RETRY_FOR_SEC", "60"))
+# Paginated reads: default and max page size of GET /?from_id=&limit=, entries per NDJSON chunk
+READ_PAGE_DEFAULT = int(os.environ.get("READ_PAGE_DEFAULT", "1000"))
+READ_PAGE_MAX = int(os.environ.get("READ_PAGE_MAX", "10000"))
+STREAM_CHUNK = int(os.environ.get("READ_STREAM_CHUNK", "1000"))
+
+_seq = 0
+# Set on shutdown: replication retries stop
+_closing = False
+
+
+def next_seq():
+    global _seq
+    _seq += 1
+    return _seq
+
+
+async def post_replica(sid, entry):
+    """
+    One POST /replicate of an entry to the secondary's current url. Returns (ok, retryable, details)
+    """
+    try:
+        async with sessions[sid].post(
+            f"{secondaries[sid].rstrip('/')}/replicate",
+            json=entry,
+            timeout=aiohttp.ClientTimeout(total=REPLICATE_TIMEOUT_SEC),
+        ) as r:
+            if r.status == 200:
+                return True, False, None
+            return False, r.status >= 500 or r.status == 429, {"status_code": r.status, "body": await r.text()}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return False, True, {"error": str(e) or type(e).__name__}
+    except RuntimeError as e:
+        # Session closed under us by a re-registration with a new url: retry on the new session
+        return False, True, {"error": str(e)}
+
+
+async def replicate_to_secondary(sid, entry):
+    """
+    Send replicate request to one secondary, retrying retryable failures with backoff until
+    RETRY_FOR_SEC passed, the secondary is gone or the master shuts down.
+    A secondary that re-registers with a new url gets the retries there.
+    Returns tuple (sid, ok(boolean), details)
+    """
+    give_up_at = time.monotonic() + RETRY_FOR_SEC
+    failures = 0
+    while True:
+        ok, retryable, detail = await post_replica(sid, entry)
+        if ok or not retryable:
+            return sid, ok, detail
+        failures += 1
+        delay = backoff_delay(failures, RETRY_BASE_MS / 1000.0, RETRY_MAX_MS / 1000.0)
+        if _closing or time.monotonic() + delay > give_up_at:
+            return sid, False, dict(detail, retries=failures - 1)
+        log.debug(f"Replication of id={entry['id']} to {sid} failed, retry #{failures} in {delay:.2f}s: {detail}")
+        await asyncio.sleep(delay)
+        if sid not in secondaries:
+            return sid, False, dict(detail, retries=failures)
+
+
+def track_pending(task):
+    """
+    Keep a reference to a replication task until it finishes, log failures.
+    """
+    pending_replicas.add(task)
+
+    def done(t):
+        pending_replicas.discard(t)
+        if t.cancelled():
+            return
+        sid, ok, detail = t.result()
+        if not ok:
+            log.warning(f"Background replication to {sid} failed: {detail}")
+
+    task.add_done_callback(done)
+
+
+async def register_secondary(request):
+    """
+    Secondary calls POST /register with JSON {"id": "...", "url": "http://ip:port"}
+    Response carries the master's "last_id"; the secondary pulls what it misses up to it
+    (catch-up via GET /?stream=1&from_id=...).
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    sid = data.get("id")
+    url = data.get("url")
+    if not sid or not url:
+        return web.json_response({"error": "id and url required"}, status=400)
+
+    old = sessions.get(sid)
+    if old is None or secondaries.get(sid) != url:
+        sessions[sid] = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=MAX_WORKERS))
+        if old is not None:
+            await old.close()
+    secondaries[sid] = url
+    log.info(
+        f"Registered secondary {sid} -> {url} "
+        f"(max_contiguous_id={data.get('max_contiguous_id', 0)}, master last_id={_seq})"
+    )
+    return web.json_response({"status": "registered", "secondaries": list(secondaries.keys()), "last_id": _seq})
+
+
+async def append_message(request):
+    """
+    Client -> POST /   JSON: {"message": "...", "w": <int>}
+    Same semantics as master.py: returns after (w-1) secondary ACKs (or error if impossible).
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    message = data.get("message")
+    try:
+        w = int(data.get("w", len(secondaries) + 1))  # default w = # secondary + 1
+    except Exception:
+        return web.json_response({"error": "w must be integer >= 1"}, status=400)
+
+    if message is None:
+        return web.json_response({"error": "message required"}, status=400)
+    if w < 1:
+        return web.json_response({"error": "w must be >= 1"}, status=400)
+
+    targets = list(secondaries)
+    total_nodes = 1 + len(targets)  # master + secondaries
+    if w > total_nodes:
+        return web.json_response({"error": f"w={w} too large for current cluster size {total_nodes}"}, status=400)
+
+    entry = {"id": next_seq(), "message": message, "timestamp": time.time()}
+    master_log.append(entry)
+    log.debug(f"Appended to master log id={entry['id']} (w={w})")
+
+    required_acks = w - 1
+    if required_acks > 0 and not targets:
+        return web.json_response(
+            {"status": "failed", "reason": "no secondaries available", "required_acks": required_acks}, status=500
+        )
+
+    # One future per secondary for this write
+    tasks = {asyncio.ensure_future(replicate_to_secondary(sid, entry)) for sid in targets}
+    if required_acks == 0:
+        for t in tasks:
+            track_pending(t)
+        return web.json_response({"status": "ok", "w": w, "entry": entry})
+
+    ack_count = 0
+    results = {}
+    errors = {}
+    pending = tasks
+    # Retries keep going in the background, but the client gets an answer within REPLICATE_TIMEOUT_SEC
+    deadline = time.monotonic() + REPLICATE_TIMEOUT_SEC
+    while pending and ack_count < required_acks:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            sid, ok, detail = t.result()
+            results[sid] = {"ack": ok, "detail": detail}
+            if ok:
+                ack_count += 1
+            else:
+                errors[sid] = detail
+                log.warning(f"Replication to {sid} failed: {detail}")
+
+    for t in pending:
+        track_pending(t)
+
+    if ack_count >= required_acks:
+        return web.json_response({
+            "status": "ok",
+            "w": w,
+            "entry": entry,
+            "acks_received": ack_count,
+            "results": results,
+        })
+
+    log.error(f"Not enough ACKs ({ack_count}/{required_acks}) before timeout")
+    return web.json_response({
+        "status": "partial_failure",
+        "required_acks": required_acks,
+        "acks_received": ack_count,
+        "results": results,
+        "errors": errors,
+    }, status=500)
+
+
+def read_range(from_id, limit):
+    """
+    Up to `limit` entries (None = all) with id >= from_id. Ids are consecutive from 1, so this is a slice.
+    """
+    start = max(0, (from_id or 1) - 1)
+    return master_log[start:] if limit is None else master_log[start:start + limit]
+
+
+async def get_messages(request):
+    """
+    Return master's authoritative log in total order.
+    GET /                              -> full log (legacy)
+    GET /?from_id=<id>&limit=<n>       -> one page + "next_from_id" cursor
+    GET /?stream=1[&from_id=][&limit=] -> NDJSON, one entry per line, sent in chunks
+    """
+    try:
+        from_id, limit = page_params(request.query, READ_PAGE_DEFAULT, READ_PAGE_MAX)
+    except ValueError:
+        return web.json_response({"error": "from_id and limit must be integers, limit >= 1"}, status=400)
+
+    if request.query.get("stream") in ("1", "true"):
+        # Streams are sent in chunks, so they are not capped at READ_PAGE_MAX
+        stream_limit = int(request.query["limit"]) if "limit" in request.query else None
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        sent = 0
+        while stream_limit is None or sent < stream_limit:
+            n = STREAM_CHUNK if stream_limit is None else min(STREAM_CHUNK, stream_limit - sent)
+            entries = read_range(from_id, n)
+            if not entries:
+                break
+            await resp.write("".join(json.dumps(e) + "\n" for e in entries).encode("utf-8"))
+            sent += len(entries)
+            if len(entries) < n:
+                break
+            from_id = entries[-1]["id"] + 1
+        await resp.write_eof()
+        return resp
+
+    if "from_id" in request.query or "limit" in request.query:
+        return web.json_response(page_body(read_range(from_id, limit), from_id, limit))
+
+    return web.json_response({"messages": master_log})
+
+
+async def not_supported(request):
+    """
+    Endpoints of master.py this variant doesn't implement.
+    """
+    return web.json_response(
+        {"error": f"{request.method} {request.path} is not supported by master_async.py, run master.py"}, status=501
+    )
+
+
+async def get_secondary_messages(request):
+    """
+    Fetch messages from all registered secondaries concurrently (for inspection).
+    """
+    async def fetch(sid):
+        try:
+            async with sessions[sid].get(
+                f"{secondaries[sid].rstrip('/')}/", timeout=aiohttp.ClientTimeout(total=REPLICATE_TIMEOUT_SEC)
+            ) as resp:
+                if resp.status == 200:
+                    return sid, await resp.json()
+                return sid, {"error": f"status {resp.status}", "body": await resp.text()}
+        except Exception as e:
+            return sid, {"error": str(e) or type(e).__name__}
+
+    results = await asyncio.gather(*(fetch(sid) for sid in list(secondaries)))
+    return web.json_response(dict(results))
+
+
+async def on_shutdown(app):
+    global _closing
+    _closing = True
+    if pending_replicas:
+        log.info(f"Draining {len(pending_replicas)} pending replication(s)")
+        await asyncio.wait(list(pending_replicas), timeout=REPLICATE_TIMEOUT_SEC)
+        for t in list(pending_replicas):
+            t.cancel()
+    for session in sessions.values():
+        await session.close()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post("/register", register_secondary)
+    app.router.add_post("/", append_message)
+    app.router.add_get("/", get_messages)
+    app.router.add_get("/secondaries/messages", get_secondary_messages)
+    app.router.add_post("/batch", not_supported)
+    app.router.add_get("/secondaries/status", not_supported)
+    app.router.add_get("/snapshots", not_supported)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+if __name__ == "__main__":
+    host = "0.0.0.0"
+    port = int(os.environ.get("MASTER_PORT", 5000))
+    web.run_app(create_app(), host=host, port=port, access_log=None)
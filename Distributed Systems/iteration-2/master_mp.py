@@ -0,0 +1,202 @@
+# master_mp.py
+"""
+Multi-process master: MASTER_PROCESSES worker processes accept HTTP on one shared listening
+socket and do the per-request work (HTTP parsing, JSON decoding, response serialization).
+The parent process is the core: it owns the sequencer, the log, the WAL, the replication
+streams and the per-write ACK tracking (everything in master.py) and serves the workers
+over a local Unix socket. Same API as master.py.
+
+    MASTER_PROCESSES=4 python master_mp.py
+"""
+import os
+import sys
+import queue
+import signal
+import socket
+import logging
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+
+from flask import Flask, Response, request, jsonify
+
+from read_api import ndjson_chunks, page_body, page_params
+
+# Worker processes accepting HTTP connections
+PROCESSES = int(os.environ.get("MASTER_PROCESSES", "4"))
+# Same read settings as master.py (workers build pages and streams themselves)
+READ_PAGE_DEFAULT = int(os.environ.get("READ_PAGE_DEFAULT", "1000"))
+READ_PAGE_MAX = int(os.environ.get("READ_PAGE_MAX", "10000"))
+STREAM_CHUNK = int(os.environ.get("READ_STREAM_CHUNK", "1000"))
+
+worker_app = Flask("master_mp")
+core = None  # CoreClient of this worker process
+
+
+class CoreClient:
+    """
+    Pool of connections from a worker to the core. Werkzeug serves every request on a new
+    thread, so connections are pooled rather than thread-local; each call holds one
+    connection for a single request/response round trip.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._idle = queue.LifoQueue()
+
+    def call(self, *request_args):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        try:
+            conn.send(request_args)
+            result = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+        self._idle.put(conn)
+        return result
+
+
+@worker_app.route("/", methods=["POST"])
+def append_message():
+    """
+    Client -> POST /   JSON: {"message": "...", "w": <int>, "idempotency_key": "..."}
+    Parsed here; sequencing, dedup, replication and waiting for w-1 ACKs happen in the core.
+    """
+    data = request.get_json() or {}
+    if "Idempotency-Key" in request.headers:
+        data.setdefault("idempotency_key", request.headers["Idempotency-Key"])
+    body, code = core.call("append", data)
+    return jsonify(body), code
+
+
+@worker_app.route("/batch", methods=["POST"])
+def append_batch():
+    """
+    Client -> POST /batch   JSON: {"messages": [...], "w": <int>, "idempotency_key": "..."} (bulk append)
+    """
+    data = request.get_json() or {}
+    if "Idempotency-Key" in request.headers:
+        data.setdefault("idempotency_key", request.headers["Idempotency-Key"])
+    body, code = core.call("append_batch", data)
+    return jsonify(body), code
+
+
+@worker_app.route("/", methods=["GET"])
+def get_messages():
+    """
+    Same reads as master.py; the core only copies entries out of the log, serialization happens here.
+    """
+    try:
+        from_id, limit = page_params(request.args, READ_PAGE_DEFAULT, READ_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "from_id and limit must be integers, limit >= 1"}), 400
+
+    if request.args.get("stream") in ("1", "true"):
+        stream_limit = int(request.args["limit"]) if "limit" in request.args else None
+
+        def read(start, n):
+            return core.call("read", start, n)
+
+        return Response(ndjson_chunks(read, from_id, stream_limit, STREAM_CHUNK), mimetype="application/x-ndjson")
+
+    if "from_id" in request.args or "limit" in request.args:
+        entries = core.call("read", from_id, limit)
+        return jsonify(page_body(entries, from_id, limit)), 200
+
+    return jsonify({"messages": core.call("read", None, None)}), 200
+
+
+@worker_app.route("/<path:path>", methods=["GET", "POST"])
+def forward(path):
+    """
+    Everything else (/register, /secondaries/..., /metrics, /snapshots/...) is handled by master.py's app in the core.
+    """
+    status, content_type, data = core.call(
+        "http", request.method, f"/{path}", request.query_string, request.get_data(), request.content_type
+    )
+    return Response(data, status=status, content_type=content_type)
+
+
+def run_worker(fd, host, port, address, authkey):
+    from werkzeug.serving import make_server
+
+    global core
+    core = CoreClient(address, authkey)
+    if os.environ.get("ACCESS_LOG", "0") != "1":
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, port, worker_app, threaded=True, fd=fd)
+    server.serve_forever()
+
+
+def serve_worker(conn, master):
+    """
+    Core side of one worker connection: answer requests until the worker closes it.
+    """
+    client = master.app.test_client()
+    try:
+        while True:
+            op, *args = conn.recv()
+            if op == "append":
+                result = master.append_entry(args[0])
+            elif op == "append_batch":
+                result = master.append_entry(args[0], bulk=True)
+            elif op == "read":
+                from_id, limit = args
+                result = master.read_page(master.master_log, master.master_lock, from_id, limit, master.snapshots)
+            else:
+                method, path, query_string, body, content_type = args
+                r = client.open(path, method=method, query_string=query_string, data=body, content_type=content_type)
+                result = (r.status_code, r.content_type, r.get_data())
+            conn.send(result)
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def main():
+    host = "0.0.0.0"
+    port = int(os.environ.get("MASTER_PORT", 5000))
+
+    # Shared listening socket: every worker accepts on it, the kernel spreads connections
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    address = os.path.join(tempfile.mkdtemp(prefix="master-mp-"), "core.sock")
+    authkey = os.urandom(16)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+
+    # Fork the workers before the core starts any thread
+    ctx = multiprocessing.get_context("fork")
+    workers = [
+        ctx.Process(target=run_worker, args=(sock.fileno(), host, port, address, authkey), daemon=True)
+        for _ in range(PROCESSES)
+    ]
+    for w in workers:
+        w.start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    import master
+    master.start_background()
+    master.app.logger.info(f"Multi-process master on port {port}: {PROCESSES} worker processes, core pid {os.getpid()}")
+    try:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=serve_worker, args=(conn, master), daemon=True).start()
+    finally:
+        for w in workers:
+            w.terminate()
+        listener.close()
+        os.remove(address)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# metrics.py
+"""
+Minimal Prometheus-style metrics (counters, histograms, callback gauges) rendered in the
+text exposition format for GET /metrics. No external dependency; each labelled child
+has its own lock so the hot path only pays for one dict lookup and a short critical section.
+"""
+import time
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    # Label value escaping of the Prometheus text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            # Exposed at 0 from the start, so rate() and alerts see the series before the first inc()
+            self.labels()
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        lines = self._header()
+        for values, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, values)} {child.value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = self._header()
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, values)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Gauge whose samples are produced at scrape time by `fn` -> {label values tuple: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames, fn):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def render(self):
+        lines = self._header()
+        for values, value in sorted(self.fn().items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, values)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames, fn):
+        return self._add(Gauge(name, help_text, labelnames, fn))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class TimedLock:
+    """
+    Drop-in replacement for threading.Lock in `with` blocks that records how long
+    callers waited to acquire it.
+    """
+
+    def __init__(self, histogram_child):
+        self._lock = threading.Lock()
+        self._wait = histogram_child
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._wait.observe(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
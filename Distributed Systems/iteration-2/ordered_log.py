@@ -0,0 +1,295 @@
+# ordered_log.py
+import math
+import heapq
+from array import array
+from bisect import bisect_left
+
+from columnar import pack, unpack_message
+
+
+class _Chunk:
+    """
+    Columnar storage of a sorted run of entries: parallel arrays of ids, timestamps
+    (NaN for none), message kinds, offsets and lengths into one bytearray of utf-8 messages.
+    About 25 bytes per entry plus the message itself, instead of a dict, a str, an int
+    and a float object per entry.
+
+    Messages are appended to the buffer in arrival order; only the small per-entry columns
+    are shifted when an entry lands in the middle of the run.
+    """
+
+    __slots__ = ("ids", "timestamps", "kinds", "offsets", "lengths", "buf", "epoch")
+
+    def __init__(self, epoch=-1):
+        self.epoch = epoch  # OrderedLog._views when created: no view has seen it if still equal
+        self.ids = array("q")
+        self.timestamps = array("d")
+        self.kinds = array("B")
+        self.offsets = array("I")
+        self.lengths = array("I")
+        self.buf = bytearray()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def insert(self, pos, msg_id, ts, kind, data):
+        if pos == len(self.ids):
+            self.ids.append(msg_id)
+            self.timestamps.append(ts)
+            self.kinds.append(kind)
+            self.offsets.append(len(self.buf))
+            self.lengths.append(len(data))
+        else:
+            self.ids.insert(pos, msg_id)
+            self.timestamps.insert(pos, ts)
+            self.kinds.insert(pos, kind)
+            self.offsets.insert(pos, len(self.buf))
+            self.lengths.insert(pos, len(data))
+        self.buf += data
+
+    def copy(self, epoch=-1):
+        out = _Chunk(epoch)
+        out.ids = array("q", self.ids)
+        out.timestamps = array("d", self.timestamps)
+        out.kinds = array("B", self.kinds)
+        out.offsets = array("I", self.offsets)
+        out.lengths = array("I", self.lengths)
+        out.buf = bytearray(self.buf)
+        return out
+
+    def entry(self, i):
+        offset = self.offsets[i]
+        data = self.buf[offset:offset + self.lengths[i]]
+        ts = self.timestamps[i]
+        return {
+            "id": self.ids[i],
+            "message": unpack_message(self.kinds[i], data),
+            "timestamp": None if math.isnan(ts) else ts,
+        }
+
+    def slice(self, start, stop=None):
+        """
+        New chunk with entries [start:stop], its message buffer rebuilt without the rest.
+        """
+        out = _Chunk()
+        stop = len(self.ids) if stop is None else stop
+        for i in range(start, stop):
+            offset = self.offsets[i]
+            out.insert(i - start, self.ids[i], self.timestamps[i], self.kinds[i],
+                       self.buf[offset:offset + self.lengths[i]])
+        return out
+
+
+class OrderedLog:
+    """
+    Log entries kept in total order by sequence id.
+
+    Entries live in a list of sorted chunks (at most 2 * chunk_size each) plus a list of
+    per-chunk max ids, so an insert is a bisect over chunk maxes and a small insert into
+    one chunk instead of re-sorting the whole log. In-order appends hit the tail chunk directly.
+    Chunks store entries column-wise (see _Chunk); entry dicts are only built on the way out.
+
+    The log also tracks the highest contiguous id (every id from `first_id` up to it is present),
+    using a min-heap of ids that arrived ahead of a gap.
+    Deduplication is the caller's job (the secondary only ever appends its contiguous prefix).
+
+    A prefix that was compacted into a snapshot can be dropped with truncate(); ids below
+    `start_id` then count as present but are no longer held in memory.
+
+    Reads go through view(): an immutable view taken under the caller's lock in O(chunks),
+    then read without it. Chunks are copy-on-write except for appends at the tail, which
+    don't touch the entries a view already covers. Views only see ids <= `visible_id`
+    (None = everything inserted), so a writer can insert under the lock and publish later.
+    """
+
+    def __init__(self, first_id=1, chunk_size=1024):
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._maxes = []
+        self._len = 0
+        self._bytes = 0  # total utf-8 message bytes, for byte-based retention
+        self._start = first_id
+        self._contiguous = first_id - 1
+        self._ahead = []  # min-heap of ids > contiguous + 1
+        self.visible_id = None
+        self._views = 0  # views taken so far, see _writable()
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return self.range()
+
+    @property
+    def max_contiguous_id(self):
+        return self._contiguous
+
+    @property
+    def last_id(self):
+        return self._maxes[-1] if self._maxes else None
+
+    @property
+    def readable_id(self):
+        """
+        Highest id a view sees with every id below it present.
+        """
+        return self._contiguous if self.visible_id is None else min(self._contiguous, self.visible_id)
+
+    @property
+    def start_id(self):
+        """
+        Lowest id that may still be held in memory (everything below was truncated).
+        """
+        return self._start
+
+    @property
+    def message_bytes(self):
+        return self._bytes
+
+    def insert(self, entry):
+        msg_id, ts, kind, data = pack(entry)
+        if not self._chunks or msg_id > self._maxes[-1]:
+            # Fast path: append at the tail
+            if not self._chunks or len(self._chunks[-1]) >= self.chunk_size:
+                self._chunks.append(_Chunk(self._views))
+                self._maxes.append(msg_id)
+            chunk = self._chunks[-1]
+            chunk.insert(len(chunk), msg_id, ts, kind, data)
+            self._maxes[-1] = msg_id
+        else:
+            i = bisect_left(self._maxes, msg_id)
+            chunk = self._writable(i)
+            chunk.insert(bisect_left(chunk.ids, msg_id), msg_id, ts, kind, data)
+            if len(chunk) > 2 * self.chunk_size:
+                half = len(chunk) // 2
+                self._chunks[i:i + 1] = [chunk.slice(0, half), chunk.slice(half)]
+                self._maxes[i:i + 1] = [chunk.ids[half - 1], chunk.ids[-1]]
+        self._len += 1
+        self._bytes += len(data)
+        self._advance(msg_id)
+
+    def replace(self, entry):
+        """
+        Overwrite the entry with the same id (anti-entropy repair). Returns False if that id is not held in memory.
+        """
+        msg_id, ts, kind, data = pack(entry)
+        i = bisect_left(self._maxes, msg_id)
+        if i == len(self._chunks):
+            return False
+        chunk = self._chunks[i]
+        k = bisect_left(chunk.ids, msg_id)
+        if k == len(chunk.ids) or chunk.ids[k] != msg_id:
+            return False
+        chunk = self._writable(i)
+        self._bytes += len(data) - chunk.lengths[k]
+        chunk.timestamps[k] = ts
+        chunk.kinds[k] = kind
+        chunk.offsets[k] = len(chunk.buf)
+        chunk.lengths[k] = len(data)
+        chunk.buf += data
+        # Rebuild the chunk so the old message bytes don't linger in its buffer
+        self._chunks[i] = chunk.slice(0)
+        return True
+
+    def _writable(self, i):
+        """
+        Chunk i, copied first if a view taken since it was created may still be reading it (copy on write).
+        """
+        chunk = self._chunks[i]
+        if chunk.epoch != self._views:
+            chunk = self._chunks[i] = chunk.copy(self._views)
+        return chunk
+
+    def _advance(self, msg_id):
+        if msg_id == self._contiguous + 1:
+            self._contiguous = msg_id
+            while self._ahead and self._ahead[0] <= self._contiguous + 1:
+                self._contiguous = max(self._contiguous, heapq.heappop(self._ahead))
+        elif msg_id > self._contiguous + 1:
+            heapq.heappush(self._ahead, msg_id)
+
+    def truncate(self, upto_id):
+        """
+        Drop all entries with id <= upto_id (they now live in a snapshot) and treat
+        every id up to upto_id as present.
+        """
+        if upto_id < self._start:
+            return
+        i = bisect_left(self._maxes, upto_id + 1)
+        for chunk in self._chunks[:i]:
+            self._len -= len(chunk)
+            self._bytes -= sum(chunk.lengths)
+        del self._chunks[:i]
+        del self._maxes[:i]
+        if self._chunks:
+            chunk = self._chunks[0]
+            k = bisect_left(chunk.ids, upto_id + 1)
+            if k:
+                self._len -= k
+                self._bytes -= sum(chunk.lengths[:k])
+                self._chunks[0] = chunk.slice(k)
+        self._start = upto_id + 1
+        if upto_id > self._contiguous:
+            self._contiguous = upto_id
+            while self._ahead and self._ahead[0] <= self._contiguous + 1:
+                self._contiguous = max(self._contiguous, heapq.heappop(self._ahead))
+
+    def range(self, from_id=None, to_id=None, limit=None):
+        """
+        Yield entries with from_id <= id <= to_id in order (bounds optional), at most `limit` of them.
+        Iterate under the lock, or use view().
+        """
+        return _range(self._chunks, self._maxes, None, from_id, to_id, limit)
+
+    def view(self):
+        """
+        Immutable view of the visible entries. Take it under the lock; read it without.
+        """
+        self._views += 1
+        return LogView(self)
+
+
+class LogView:
+    """
+    Point-in-time view of an OrderedLog (see OrderedLog.view()).
+    """
+
+    __slots__ = ("_chunks", "_maxes", "_tail_len", "start_id", "visible_id", "length", "message_bytes")
+
+    def __init__(self, log):
+        self._chunks = list(log._chunks)
+        self._maxes = list(log._maxes)
+        self._tail_len = len(self._chunks[-1]) if self._chunks else 0
+        self.start_id = log.start_id
+        self.visible_id = log.visible_id
+        self.length = len(log)
+        self.message_bytes = log.message_bytes
+
+    def range(self, from_id=None, to_id=None, limit=None):
+        if self.visible_id is not None and (to_id is None or to_id > self.visible_id):
+            to_id = self.visible_id
+        return _range(self._chunks, self._maxes, self._tail_len, from_id, to_id, limit)
+
+
+def _range(chunks, maxes, tail_len, from_id, to_id, limit):
+    """
+    Entries of sorted chunks in id order; tail_len bounds the last chunk (None = its current length).
+    """
+    if limit is not None and limit <= 0:
+        return
+    i = 0 if from_id is None else bisect_left(maxes, from_id)
+    count = 0
+    last = len(chunks) - 1
+    for j in range(i, len(chunks)):
+        chunk = chunks[j]
+        ids = chunk.ids
+        n = tail_len if j == last and tail_len is not None else len(ids)
+        start = 0 if from_id is None else bisect_left(ids, from_id, 0, n)
+        for k in range(start, n):
+            if to_id is not None and ids[k] > to_id:
+                return
+            yield chunk.entry(k)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        from_id = None
@@ -0,0 +1,77 @@
+# read_api.py
+"""
+Shared GET / helpers for master and secondaries: cursor pagination
+(`from_id`/`limit`) and NDJSON streaming over an OrderedLog.
+Only taking a view of the log (OrderedLog.view()) happens under the log lock; building the
+page and serializing it happen outside, so long reads don't block writers.
+Ids below the log's in-memory start are read from the snapshot store (if compaction is on).
+"""
+import json
+
+
+def page_params(args, default_limit, max_limit):
+    """
+    Parse from_id/limit query args. Returns (from_id or None, limit). Raises ValueError on bad input.
+    """
+    from_id = args.get("from_id")
+    limit = args.get("limit")
+    from_id = int(from_id) if from_id not in (None, "") else None
+    limit = int(limit) if limit not in (None, "") else default_limit
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
+    return from_id, min(limit, max_limit)
+
+
+def read_page(log, lock, from_id, limit, store=None):
+    """
+    Up to `limit` entries with id >= from_id (`limit` None = all), from a view of the log taken
+    under `lock`. Snapshotted ids are read from `store`.
+    """
+    with lock:
+        view = log.view()
+    start = view.start_id
+    in_memory = from_id is not None and from_id >= start
+    tail = list(view.range(from_id if in_memory else None, limit=limit))
+    if store is None or in_memory:
+        return tail
+    # Snapshot files are immutable, and a snapshot is stored before the log is truncated
+    head = list(store.range(from_id, start - 1, limit=limit))
+    if limit is not None:
+        return head + tail[:limit - len(head)]
+    return head + tail
+
+
+def page_body(entries, from_id, limit):
+    """
+    JSON body of a paginated read. `next_from_id` is the cursor for the next page (or for tailing).
+    """
+    if entries:
+        next_from_id = entries[-1]["id"] + 1
+    else:
+        next_from_id = from_id
+    return {"messages": entries, "next_from_id": next_from_id, "more": len(entries) >= limit}
+
+
+def ndjson_stream(log, lock, from_id, limit, chunk, store=None):
+    """
+    Generator of NDJSON lines (one entry per line), fetched `chunk` entries at a time.
+    `limit` None means until the end of the log as seen while streaming.
+    """
+    return ndjson_chunks(lambda start, n: read_page(log, lock, start, n, store), from_id, limit, chunk)
+
+
+def ndjson_chunks(read, from_id, limit, chunk):
+    """
+    Same as ndjson_stream over any `read(from_id, n)` -> entries (e.g. a read served by another process).
+    """
+    sent = 0
+    while limit is None or sent < limit:
+        n = chunk if limit is None else min(chunk, limit - sent)
+        entries = read(from_id, n)
+        if not entries:
+            return
+        yield "".join(json.dumps(e) + "\n" for e in entries)
+        sent += len(entries)
+        if len(entries) < n:
+            return
+        from_id = entries[-1]["id"] + 1
@@ -0,0 +1,412 @@
+# replication.py
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from wire import CONTENT_TYPE, encode_entries
+
+
+def backoff_delay(failures, base, cap):
+    """
+    Seconds to wait before retry #`failures`: exponential backoff capped at `cap`, with jitter.
+    """
+    delay = min(cap, base * 2 ** (failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class SecondaryClient:
+    """
+    Keep-alive HTTP session bound to a single registered secondary.
+    Connections are reused across writes instead of doing a TCP handshake per request.
+    """
+
+    def __init__(self, sid, url, pool_size):
+        self.sid = sid
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, path, **kwargs):
+        return self.session.post(f"{self.url}{path}", **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.session.get(f"{self.url}{path}", **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class WriteTracker:
+    """
+    Collects per-secondary ACKs for a single write.
+    The client request thread waits on it until `required` ACKs arrived
+    or every one of the `expected` secondaries has answered.
+    A bulk write of `entries` entries counts for a secondary once all of them were ACKed
+    (or the first one failed for good).
+    """
+
+    def __init__(self, required, expected, entries=1):
+        self.required = required
+        self.expected = expected
+        self.entries = entries
+        self.acks = 0
+        self.results = {}
+        self._unacked = {}  # sid -> entries not ACKed yet (bulk writes)
+        self._cond = threading.Condition()
+
+    def record(self, sid, ok, detail):
+        with self._cond:
+            if sid in self.results:
+                return
+            if ok and self.entries > 1:
+                left = self._unacked.get(sid, self.entries) - 1
+                self._unacked[sid] = left
+                if left > 0:
+                    return
+            self.results[sid] = {"ack": ok, "detail": detail}
+            if ok:
+                self.acks += 1
+            self._cond.notify_all()
+
+    def wait(self, timeout):
+        """
+        Returns (acks, results) once enough ACKs arrived, all secondaries answered, or timeout.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.acks >= self.required or len(self.results) >= self.expected, timeout
+            )
+            return self.acks, dict(self.results)
+
+
+class ReplicationStream:
+    """
+    Bounded outbox and ordered, pipelined replication stream to one secondary.
+
+    Entries are queued by the write path; a sender thread packs up to `batch_max`
+    consecutive entries (waiting at most `linger` seconds for a batch to fill) into
+    one POST /replicate_batch, keeping up to `max_inflight` batches in flight.
+    While all in-flight slots are busy new entries accumulate, so batches grow with load.
+
+    Failed batches (connection errors, timeouts, 5xx) go back to the head of the outbox and
+    are retried with exponential backoff and jitter, coalesced with whatever queued up meanwhile.
+    While a secondary is failing or slow (no RTT measured yet, RTT EWMA above `slow_rtt`, or a
+    batch in flight for longer than that) only one batch is in flight, so a dead or slow replica holds at most one
+    worker of the shared pool and can't starve the streams of healthy ones. Once `outbox_max` entries are queued, new entries
+    are rejected right away; the secondary pulls them later through catch-up.
+
+    Batches are sent in `wire` format: "binary" (wire.py frames) or "json". A secondary that
+    answers 415 to a binary batch gets JSON from then on.
+    """
+
+    def __init__(self, client, executor, timeout, batch_max, linger, max_inflight,
+                 outbox_max=100000, retry_base=0.1, retry_max=10.0, observer=None, logger=None, wire="binary",
+                 slow_rtt=0.2, alpha=0.2):
+        self.client = client
+        self.executor = executor
+        self.timeout = timeout
+        self.batch_max = max(1, batch_max)
+        self.linger = max(0.0, linger)
+        self.max_inflight = max(1, max_inflight)
+        self.outbox_max = outbox_max
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.observer = observer  # callable(sid, ok, rtt, error) fed with every batch result
+        self.logger = logger
+        self.wire = wire
+        self.slow_rtt = slow_rtt
+        self.alpha = alpha
+        self._pending = deque()  # (entry, tracker, enqueued_at)
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._sent_at = {}  # id(batch) -> monotonic send time, for batches in flight
+        self._rtt = None  # EWMA of batch RTTs (seconds)
+        self._failures = 0  # consecutive failed batches
+        self._retry_at = 0.0
+        self._closed = False
+        self._successor = None  # stream that replaced this one (same secondary, new url)
+        # Counters for /secondaries/status
+        self.acked = 0
+        self.last_acked_id = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name=f"stream-{client.sid}", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, entry, tracker=None):
+        """
+        Queue an entry for replication. Returns False (and fails the tracker) if the outbox is full.
+        """
+        with self._cond:
+            full = self._closed or len(self._pending) >= self.outbox_max
+            if full:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self._pending.append((entry, tracker, time.monotonic()))
+                self._cond.notify()
+        if full:
+            if tracker is not None:
+                tracker.record(self.client.sid, False, {"error": "outbox full"})
+            if self.logger and dropped % 1000 == 1:
+                self.logger.warning(f"Outbox for {self.client.sid} is full, {dropped} entries rejected so far")
+            return False
+        return True
+
+    def close(self, successor=None):
+        """
+        Stop the stream and hand back entries that were still queued (in order).
+        Batches in flight that fail retryably later go to `successor`, or fail their writes without one.
+        """
+        with self._cond:
+            self._closed = True
+            self._successor = successor
+            left = list(self._pending)
+            self._pending.clear()
+            self._cond.notify()
+        return left
+
+    def adopt(self, items):
+        """
+        Take over queued entries from a stream this one replaces.
+        Once closed, they go on to this stream's successor, or fail their writes without one.
+        """
+        with self._cond:
+            if not self._closed:
+                self._pending.extend(items)
+                self._cond.notify()
+                return
+            successor = self._successor
+        if successor is not None:
+            successor.adopt(items)
+            return
+        for _, tracker, _ in items:
+            if tracker is not None:
+                tracker.record(self.client.sid, False, {"error": "replication stream closed"})
+
+    def reset_backoff(self):
+        """
+        Retry queued entries right away (e.g. the secondary just announced itself again).
+        """
+        with self._cond:
+            self._retry_at = 0.0
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "url": self.client.url,
+                "wire": self.wire,
+                "queued": len(self._pending),
+                "inflight": self._inflight,
+                "rtt_ewma_ms": round(self._rtt * 1000, 2) if self._rtt is not None else None,
+                "slow": self._slow(now),
+                "oldest_queued_sec": round(now - self._pending[0][2], 3) if self._pending else 0.0,
+                "consecutive_failures": self._failures,
+                "backoff_sec": round(max(0.0, self._retry_at - now), 3),
+                "acked": self.acked,
+                "last_acked_id": self.last_acked_id,
+                "retries": self.retries,
+                "dropped": self.dropped,
+                "last_error": self.last_error,
+            }
+
+    def _slow(self, now):
+        # Unknown RTT counts as slow: a new stream starts with one batch in flight
+        if self._rtt is None or self._rtt > self.slow_rtt:
+            return True
+        return any(now - sent > self.slow_rtt for sent in self._sent_at.values())
+
+    def _ready(self, now):
+        limit = 1 if self._failures or self._slow(now) else self.max_inflight
+        return bool(self._pending) and self._inflight < limit and now >= self._retry_at
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                if self._ready(now):
+                    break
+                wait = None
+                if self._pending and now < self._retry_at:
+                    wait = self._retry_at - now
+                self._cond.wait(wait)
+            if not self._failures:
+                deadline = time.monotonic() + self.linger
+                while len(self._pending) < self.batch_max and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return None
+            n = min(self.batch_max, len(self._pending))
+            self._inflight += 1
+            batch = [self._pending.popleft() for _ in range(n)]
+            self._sent_at[id(batch)] = time.monotonic()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.executor.submit(self._send, batch)
+
+    def _post_batch(self, entries):
+        if self.wire == "binary":
+            r = self.client.post("/replicate_batch", data=encode_entries(entries),
+                                 headers={"Content-Type": CONTENT_TYPE}, timeout=self.timeout)
+            if r.status_code != 415:
+                return r
+            # Secondary without binary support: negotiate down to JSON for good
+            self.wire = "json"
+            if self.logger:
+                self.logger.info(f"Secondary {self.client.sid} does not accept {CONTENT_TYPE}, replicating as JSON")
+        return self.client.post("/replicate_batch", json={"entries": entries}, timeout=self.timeout)
+
+    def _send(self, batch):
+        entries = sorted((item[0] for item in batch), key=lambda e: e["id"])
+        retryable = False
+        start = time.perf_counter()
+        try:
+            r = self._post_batch(entries)
+            ok = r.status_code == 200
+            detail = None if ok else {"status_code": r.status_code, "body": r.text}
+            retryable = r.status_code >= 500 or r.status_code == 429
+        except requests.RequestException as e:
+            ok = False
+            detail = {"error": str(e)}
+            retryable = True
+        except Exception as e:
+            ok = False
+            detail = {"exception": str(e)}
+        rtt = time.perf_counter() - start
+        if self.observer is not None:
+            self.observer(self.client.sid, ok, rtt, detail)
+
+        with self._cond:
+            self._inflight -= 1
+            self._sent_at.pop(id(batch), None)
+            self._rtt = rtt if self._rtt is None else self.alpha * rtt + (1 - self.alpha) * self._rtt
+            if ok:
+                self._failures = 0
+                self._retry_at = 0.0
+                self.acked += len(entries)
+                self.last_acked_id = max(self.last_acked_id, entries[-1]["id"])
+            else:
+                self.last_error = detail
+                if retryable and not self._closed:
+                    self._failures += 1
+                    self.retries += 1
+                    self._retry_at = time.monotonic() + backoff_delay(self._failures, self.retry_base, self.retry_max)
+                    self._pending.extendleft(reversed(batch))
+            closed = self._closed
+            successor = self._successor
+            failures = self._failures
+            self._cond.notify()
+
+        if not ok and self.logger:
+            if not retryable:
+                action = "dropped"
+            elif not closed:
+                action = f"retry #{failures}"
+            elif successor is not None:
+                action = "handed over to the new stream"
+            else:
+                action = "dropped, stream closed"
+            self.logger.warning(
+                f"Batch replication to {self.client.sid} failed "
+                f"(ids {entries[0]['id']}..{entries[-1]['id']}, {action}): {detail}"
+            )
+        if not ok and retryable and closed:
+            # Replaced (the secondary re-registered with a new url) or shut down while in flight
+            self.adopt(batch)
+        elif ok or not retryable:
+            for _, tracker, _ in batch:
+                if tracker is not None:
+                    tracker.record(self.client.sid, ok, detail)
+
+
+class Replicator:
+    """
+    Process-wide replication subsystem: one fixed worker pool shared by all writes
+    and one ReplicationStream (bounded outbox with its own keep-alive SecondaryClient)
+    per registered secondary id.
+    """
+
+    def __init__(self, max_workers, timeout, batch_max=128, linger=0.0, max_inflight=4,
+                 outbox_max=100000, retry_base=0.1, retry_max=10.0, observer=None, logger=None, wire="binary",
+                 slow_rtt=0.2):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.batch_max = batch_max
+        self.linger = linger
+        self.max_inflight = max_inflight
+        self.outbox_max = outbox_max
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.observer = observer
+        self.logger = logger
+        self.wire = wire
+        self.slow_rtt = slow_rtt
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="replicate")
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def register(self, sid, url):
+        """
+        Create (or replace, if the url changed) the stream for secondary `sid`.
+        """
+        with self._lock:
+            old = self._streams.get(sid)
+            if old is not None and old.client.url == url.rstrip("/"):
+                return old
+            client = SecondaryClient(sid, url, pool_size=self.max_workers)
+            stream = ReplicationStream(
+                client,
+                self.executor,
+                timeout=self.timeout,
+                batch_max=self.batch_max,
+                linger=self.linger,
+                max_inflight=self.max_inflight,
+                outbox_max=self.outbox_max,
+                retry_base=self.retry_base,
+                retry_max=self.retry_max,
+                observer=self.observer,
+                logger=self.logger,
+                wire=self.wire,
+                slow_rtt=self.slow_rtt,
+            )
+            self._streams[sid] = stream
+        if old is not None:
+            # Entries queued for the old url now go to the new one
+            stream.adopt(old.close(successor=stream))
+        return stream
+
+    def streams(self):
+        with self._lock:
+            return dict(self._streams)
+
+    def clients(self):
+        with self._lock:
+            return {sid: stream.client for sid, stream in self._streams.items()}
+
+    def shutdown(self):
+        for stream in self.streams().values():
+            # Closed without a successor, adopt() fails the writes still queued
+            stream.adopt(stream.close())
+        self.executor.shutdown(wait=False)
+        for client in self.clients().values():
+            client.close()
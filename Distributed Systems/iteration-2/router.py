@@ -0,0 +1,248 @@
+# router.py
+"""
+Thin router for the partitioned mode: N independent masters (partitions), each with its own
+sequence counter, log and secondaries. Writes are routed by key, reads are merged and
+ordered by (partition, id).
+"""
+import os
+import json
+import zlib
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import Flask, Response, request, jsonify
+
+app = Flask(__name__)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s [ROUTER] %(levelname)s: %(message)s")
+app.logger.setLevel(LOG_LEVEL)
+if os.environ.get("ACCESS_LOG", "0") != "1":
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+# Configs
+# Partition masters, comma-separated; partition number = position in the list
+PARTITIONS = [u.strip().rstrip("/") for u in os.environ.get("PARTITIONS", "http://master:5000").split(",") if u.strip()]
+# Timeout for requests forwarded to a partition master (should cover its REPLICATE_TIMEOUT_SEC)
+ROUTER_TIMEOUT_SEC = float(os.environ.get("ROUTER_TIMEOUT_SEC", "60"))
+# Keep-alive connections per partition
+ROUTER_POOL_SIZE = int(os.environ.get("ROUTER_POOL_SIZE", "32"))
+
+# One keep-alive session per partition, shared by all request threads
+sessions = []
+for _ in PARTITIONS:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=ROUTER_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    sessions.append(session)
+# Parallel reads across partitions
+executor = ThreadPoolExecutor(max_workers=max(1, len(PARTITIONS)), thread_name_prefix="router")
+# Parallel per-partition groups of split POST /batch writes (separate, so slow writes don't hold up reads)
+batch_executor = ThreadPoolExecutor(max_workers=ROUTER_POOL_SIZE, thread_name_prefix="router-batch")
+
+# Writes without a key (and without an idempotency key) are spread round-robin
+_round_robin = itertools.count()
+_round_robin_lock = threading.Lock()
+
+
+def partition_for(key, idempotency_key=None):
+    """
+    Stable key -> partition mapping (crc32, same on every router instance). Without a key the
+    idempotency key is hashed instead, so a retry reaches the master that deduplicates it;
+    with neither = round-robin.
+    """
+    if key is None:
+        key = idempotency_key
+    if key is None:
+        with _round_robin_lock:
+            return next(_round_robin) % len(PARTITIONS)
+    return zlib.crc32(str(key).encode("utf-8")) % len(PARTITIONS)
+
+
+def tag(entry, partition):
+    entry["partition"] = partition
+    return entry
+
+
+def forward_write(partition, path, body, headers=None):
+    """
+    POST a write to a partition master. Returns (response body with "partition" added, status code).
+    """
+    try:
+        r = sessions[partition].post(
+            f"{PARTITIONS[partition]}{path}", json=body, headers=headers or {}, timeout=ROUTER_TIMEOUT_SEC
+        )
+    except requests.RequestException as e:
+        app.logger.error(f"Partition {partition} ({PARTITIONS[partition]}) unreachable: {e}")
+        return {"status": "failed", "reason": "partition unreachable", "partition": partition}, 503
+    try:
+        result = r.json()
+    except ValueError:
+        return {"status": "failed", "partition": partition, "body": r.text}, r.status_code
+    result["partition"] = partition
+    if isinstance(result.get("entry"), dict):
+        tag(result["entry"], partition)
+    return result, r.status_code
+
+
+@app.route("/", methods=["POST"])
+def append_message():
+    """
+    Client -> POST /   JSON: {"message": "...", "w": <int>, "key": "...", "idempotency_key": "..."}
+    Forwarded to the partition owning `key` (or `idempotency_key` without a key); w applies within
+    that partition. An Idempotency-Key header is forwarded as is.
+    The response is the partition master's, with "partition" added.
+    """
+    data = request.get_json() or {}
+    headers = {}
+    if "Idempotency-Key" in request.headers:
+        headers["Idempotency-Key"] = request.headers["Idempotency-Key"]
+    partition = partition_for(data.get("key"), data.get("idempotency_key", headers.get("Idempotency-Key")))
+    body = {k: v for k, v in data.items() if k != "key"}
+    result, code = forward_write(partition, "/", body, headers)
+    return jsonify(result), code
+
+
+@app.route("/batch", methods=["POST"])
+def append_batch():
+    """
+    Client -> POST /batch   JSON: {"messages": [...], "w": <int>, "key": "...", "keys": [...], "idempotency_key": "..."}
+    Without "keys" the whole batch goes to one partition, chosen like POST / (`key`, else the
+    idempotency key, else round-robin); the response is that master's ("first_id", "last_id",
+    "count"), with "partition" added, so the client SDK's batches work unchanged.
+    With "keys" (one partition key per message, null = the batch's partition) the messages are
+    split by partition and each group is sent as its own bulk write, in parallel, with idempotency
+    key "<idempotency_key>:<partition>". The response lists "ids" as [partition, id] per message
+    (null where its group failed) and each master's answer under "partitions"; the status code is
+    200 only if every group succeeded, else the worst group's.
+    """
+    data = request.get_json() or {}
+    idempotency_key = data.get("idempotency_key", request.headers.get("Idempotency-Key"))
+    default = partition_for(data.get("key"), idempotency_key)
+    body = {k: v for k, v in data.items() if k not in ("key", "keys")}
+    if idempotency_key is not None:
+        body["idempotency_key"] = idempotency_key
+    keys = data.get("keys")
+    if keys is None:
+        result, code = forward_write(default, "/batch", body)
+        return jsonify(result), code
+
+    messages = data.get("messages")
+    if not isinstance(messages, list) or not isinstance(keys, list) or len(keys) != len(messages):
+        return jsonify({"error": "keys must be a list with one key per message"}), 400
+    groups = {}  # partition -> positions of its messages in the batch
+    for i, key in enumerate(keys):
+        groups.setdefault(default if key is None else partition_for(key), []).append(i)
+
+    def send(partition, positions):
+        group = dict(body, messages=[messages[i] for i in positions])
+        if idempotency_key is not None:
+            group["idempotency_key"] = f"{idempotency_key}:{partition}"
+        return forward_write(partition, "/batch", group)
+
+    futures = {p: batch_executor.submit(send, p, positions) for p, positions in groups.items()}
+    ids = [None] * len(messages)
+    results = {}
+    codes = []
+    for partition, future in futures.items():
+        result, code = future.result()
+        results[str(partition)] = result
+        codes.append(code)
+        if code == 200 and "first_id" in result:
+            for n, i in enumerate(groups[partition]):
+                ids[i] = [partition, result["first_id"] + n]
+    code = 200 if all(c == 200 for c in codes) else max(c for c in codes if c != 200)
+    return jsonify({
+        "status": "ok" if code == 200 else "partial_failure",
+        "count": len(messages),
+        "ids": ids,
+        "partitions": results,
+    }), code
+
+
+def fetch_partition(partition, params=None):
+    r = sessions[partition].get(f"{PARTITIONS[partition]}/", params=params, timeout=ROUTER_TIMEOUT_SEC)
+    r.raise_for_status()
+    return r.json()
+
+
+@app.route("/", methods=["GET"])
+def get_messages():
+    """
+    Merged view of all partitions, ordered by (partition, id).
+    GET /                                          -> all partitions (fetched in parallel)
+    GET /?partition=<p>[&from_id=][&limit=]        -> one partition's log or page (cursor as on a master)
+    GET /?stream=1                                 -> NDJSON, partition by partition
+    """
+    if "partition" in request.args:
+        try:
+            partition = int(request.args["partition"])
+            PARTITIONS[partition]
+        except (ValueError, IndexError):
+            return jsonify({"error": f"partition must be 0..{len(PARTITIONS) - 1}"}), 400
+        params = {k: v for k, v in request.args.items() if k != "partition"}
+        try:
+            body = fetch_partition(partition, params)
+        except requests.RequestException as e:
+            return jsonify({"error": str(e), "partition": partition}), 502
+        body["messages"] = [tag(e, partition) for e in body.get("messages", [])]
+        body["partition"] = partition
+        return jsonify(body), 200
+
+    if request.args.get("stream") in ("1", "true"):
+        return Response(stream_all(), mimetype="application/x-ndjson")
+
+    # Unreachable partitions are reported under "errors"
+    futures = [executor.submit(fetch_partition, p) for p in range(len(PARTITIONS))]
+    messages = []
+    errors = {}
+    for partition, future in enumerate(futures):
+        try:
+            messages.extend(tag(e, partition) for e in future.result()["messages"])
+        except requests.RequestException as e:
+            errors[partition] = str(e)
+    body = {"messages": messages}
+    if errors:
+        body["errors"] = errors
+    return jsonify(body), 200
+
+
+def stream_all():
+    """
+    Proxy each partition's NDJSON stream in turn, tagging entries with their partition.
+    """
+    for partition, url in enumerate(PARTITIONS):
+        with sessions[partition].get(f"{url}/", params={"stream": 1}, stream=True, timeout=ROUTER_TIMEOUT_SEC) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line:
+                    yield json.dumps(tag(json.loads(line), partition)) + "\n"
+
+
+@app.route("/partitions", methods=["GET"])
+def get_partitions():
+    """
+    Partition masters and their secondaries' replication status.
+    """
+    def status(partition):
+        try:
+            r = sessions[partition].get(f"{PARTITIONS[partition]}/secondaries/status", timeout=5)
+            return r.json()
+        except (requests.RequestException, ValueError) as e:
+            return {"error": str(e)}
+
+    results = list(executor.map(status, range(len(PARTITIONS))))
+    return jsonify({
+        str(p): {"url": PARTITIONS[p], **results[p]} for p in range(len(PARTITIONS))
+    }), 200
+
+
+if __name__ == "__main__":
+    host = "0.0.0.0"
+    port = int(os.environ.get("ROUTER_PORT", 5000))
+    app.logger.info(f"Routing to {len(PARTITIONS)} partition(s): {PARTITIONS}")
+    app.run(host=host, port=port, threaded=True)
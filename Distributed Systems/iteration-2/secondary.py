@@ -2,23 +2,68 @@
 import os
 import time
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, redirect
+from werkzeug.serving import WSGIRequestHandler
 import requests
 import socket
 import uuid
 import threading
+import json
+from collections import deque
+
+from digest import BucketTree, PrefixDigest
+from metrics import Registry, TimedLock
+from ordered_log import OrderedLog
+from read_api import ndjson_stream, page_body, page_params, read_page
+from snapshot import Compactor, SnapshotStore, decode_snapshot
+from wal import WriteAheadLog
+from wire import CONTENT_TYPE as WIRE_CONTENT_TYPE, decode_entries
 
 app = Flask(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [SECONDARY] %(levelname)s: %(message)s")
+# Per-entry lines are logged at DEBUG; LOG_LEVEL=DEBUG brings them back.
+# Werkzeug's per-request access log is off unless ACCESS_LOG=1.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s [SECONDARY] %(levelname)s: %(message)s")
+app.logger.setLevel(LOG_LEVEL)
+if os.environ.get("ACCESS_LOG", "0") != "1":
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+# Prometheus-style metrics served at GET /metrics
+metrics = Registry()
+APPLY_SECONDS = metrics.histogram("secondary_apply_seconds", "Time to apply one replicated batch (incl. WAL)")
+APPLIED = metrics.counter("secondary_applied_entries_total", "Entries applied to the log")
+DUPLICATES = metrics.counter("secondary_duplicates_total", "Replicated entries ignored as duplicates")
+REJECTED = metrics.counter("secondary_rejected_requests_total", "Replication requests rejected as invalid")
+HOLDBACK_OVERFLOW = metrics.counter(
+    "secondary_holdback_overflow_total", "Entries refused because the hold-back buffer was full"
+)
+READ_REDIRECTS = metrics.counter("secondary_read_redirects_total", "min_id/max_lag reads redirected to the master")
+REPAIRED = metrics.counter("secondary_repaired_entries_total", "Entries rewritten by anti-entropy repair")
+APPLY_LAG = metrics.histogram("secondary_apply_lag_seconds", "Time from receiving a replicated batch to applying it")
+GAP_FILLS = metrics.counter("secondary_gap_fills_total", "Gap-fill (catch-up) requests sent to the master")
+LOCK_WAIT = metrics.histogram("secondary_lock_wait_seconds", "Time spent waiting to acquire a lock", ["lock"])
 
 # In-memory storage:
-# - map of id -> message (for dedup)
-secondary_by_id = {}
-# - ordered list of entries for returning in total order
-secondary_log = []
-log_lock = threading.Lock()
+# - the log holds only the contiguous prefix 1..max_contiguous_id, applied in strict id order,
+#   so reads never see a gap
+secondary_log = OrderedLog()
+# - hold-back buffer: id -> entry for entries that arrived ahead of a hole,
+#   moved into the log as soon as the hole is filled
+holdback = {}
+log_lock = TimedLock(LOCK_WAIT.labels("log_lock"))
+# Apply queue (oldest first) and the number of entries in it, guarded by apply_cond
+apply_queue = deque()
+apply_queued = 0
+apply_cond = threading.Condition()
+# Read consistency: readers waiting for min_id / max_lag sleep on applied_cond, notified whenever the
+# contiguous prefix grows. Staleness: every master heartbeat carries the master's last id; the log is
+# in sync with the master as of the newest heartbeat whose last id it has reached (synced_at).
+applied_cond = threading.Condition()
+master_marks = deque(maxlen=10000)  # (received_at, master last_id) not reached yet, oldest first
+synced_at = 0.0
 
 MASTER_URL = os.environ.get("MASTER_URL", "http://master:5000")  # master service url inside compose
+MASTER_PUBLIC_URL = os.environ.get("MASTER_PUBLIC_URL", MASTER_URL).rstrip("/")  # master url for client redirects
 PORT = int(os.environ.get("SECONDARY_PORT", 5001))
 # Secondary ID precedence: env SECONDARY_ID -> hostname -> generated uuid
 ID = os.environ.get("SECONDARY_ID") or socket.gethostname() or f"secondary-{str(uuid.uuid4())[:8]}"
@@ -30,6 +75,80 @@ try:
 except Exception:
     SLEEP_SEC = 0.0
 
+# Reads: default/max page size for GET /?from_id=&limit= and entries per NDJSON chunk
+READ_PAGE_DEFAULT = int(os.environ.get("READ_PAGE_DEFAULT", "1000"))
+READ_PAGE_MAX = int(os.environ.get("READ_PAGE_MAX", "10000"))
+STREAM_CHUNK = int(os.environ.get("READ_STREAM_CHUNK", "1000"))
+# Apply pipeline: replication requests put their entries into a bounded queue (at most APPLY_QUEUE_MAX
+# entries, beyond that they get 503 and the master retries) that one applier thread drains in batches of
+# up to APPLY_BATCH_MAX entries. ACK_MODE decides when a replication request is ACKed:
+#   applied  - once its entries are applied (visible to reads), default
+#   durable  - once they are in the WAL (like received without SECONDARY_WAL_DIR)
+#   received - once they are queued
+ACK_MODE = os.environ.get("ACK_MODE", "applied")
+APPLY_QUEUE_MAX = int(os.environ.get("APPLY_QUEUE_MAX", "100000"))
+APPLY_BATCH_MAX = int(os.environ.get("APPLY_BATCH_MAX", "1024"))
+# Consistent reads: GET /?min_id=<id> (read-your-writes) or ?max_lag=<sec> (bounded staleness) wait up to
+# READ_WAIT_SEC for this secondary to catch up, then redirect (307) to MASTER_PUBLIC_URL (default MASTER_URL)
+READ_WAIT_SEC = float(os.environ.get("READ_WAIT_SEC", "1.0"))
+
+# Catch-up: entries applied per batch, max entries pulled from the master per resync round,
+# and how often to check for a hole that persists in front of the hold-back buffer
+CATCHUP_BATCH = int(os.environ.get("CATCHUP_BATCH", "1000"))
+CATCHUP_MAX_ENTRIES = int(os.environ.get("CATCHUP_MAX_ENTRIES", "100000"))
+CATCHUP_INTERVAL_SEC = float(os.environ.get("CATCHUP_INTERVAL_SEC", "1"))
+# Gap fill pulls only the holes between held-back ids; holes separated by at most this many
+# held-back ids are pulled as one range (re-serving a few entries beats another round trip)
+GAP_MERGE_IDS = int(os.environ.get("GAP_MERGE_IDS", "16"))
+# Max entries held back behind a hole; beyond that replication requests get 503 (the master retries)
+HOLDBACK_MAX = int(os.environ.get("HOLDBACK_MAX", "10000"))
+# Only one resync runs at a time
+catchup_lock = threading.Lock()
+
+# Optional durable write-ahead log (SECONDARY_WAL_DIR empty = in-memory only)
+WAL_DIR = os.environ.get("SECONDARY_WAL_DIR", "")
+WAL_FSYNC = os.environ.get("WAL_FSYNC", "1") != "0"
+WAL_SEGMENT_MB = int(os.environ.get("WAL_SEGMENT_MB", "64"))
+wal = WriteAheadLog(WAL_DIR, segment_bytes=WAL_SEGMENT_MB * 1024 * 1024, fsync=WAL_FSYNC) if WAL_DIR else None
+
+# Log compaction (SECONDARY_SNAPSHOT_DIR empty = off), same retention settings as the master.
+# Catch-up installs the master's snapshots for a compacted range and pulls only the tail as NDJSON.
+SNAPSHOT_DIR = os.environ.get("SECONDARY_SNAPSHOT_DIR", "")
+SNAPSHOT_INTERVAL_SEC = float(os.environ.get("SNAPSHOT_INTERVAL_SEC", "60"))
+LOG_RETAIN_ENTRIES = int(os.environ.get("LOG_RETAIN_ENTRIES", "100000"))
+LOG_RETAIN_BYTES = int(os.environ.get("LOG_RETAIN_BYTES", "0"))
+LOG_RETAIN_SEC = float(os.environ.get("LOG_RETAIN_SEC", "0"))
+snapshots = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+compactor = Compactor(
+    secondary_log,
+    log_lock,
+    snapshots,
+    retain_entries=LOG_RETAIN_ENTRIES,
+    retain_bytes=LOG_RETAIN_BYTES,
+    retain_sec=LOG_RETAIN_SEC,
+    interval=SNAPSHOT_INTERVAL_SEC,
+    on_compacted=wal.drop_segments if wal is not None else None,
+    logger=app.logger,
+) if snapshots is not None else None
+
+# Hash of the contiguous prefix for GET /summary (replica comparison without shipping the log)
+prefix_digest = PrefixDigest(lambda from_id, limit: read_page(secondary_log, log_lock, from_id, limit, snapshots))
+# Anti-entropy: Merkle tree over AE_BUCKET-id buckets with AE_FANOUT children per node (same values as on the master);
+# the master walks it through POST /merkle and rewrites diverged entries through POST /repair
+AE_BUCKET = int(os.environ.get("AE_BUCKET", "256"))
+AE_FANOUT = int(os.environ.get("AE_FANOUT", "16"))
+merkle = BucketTree(
+    lambda from_id, limit: read_page(secondary_log, log_lock, from_id, limit, snapshots), AE_BUCKET, AE_FANOUT
+)
+
+metrics.gauge("secondary_max_contiguous_id", "Highest id with no gap below it", [],
+              lambda: {(): secondary_log.max_contiguous_id})
+metrics.gauge("secondary_apply_queue_entries", "Entries received but not applied yet", [],
+              lambda: {(): apply_queued})
+metrics.gauge("secondary_apply_queue_age_seconds", "Age of the oldest entry waiting in the apply queue", [],
+              lambda: {(): apply_lag()})
+metrics.gauge("secondary_holdback_entries", "Entries waiting in the hold-back buffer", [], lambda: {(): len(holdback)})
+
 app.logger.info(f"Secondary {ID} starting with delay: {SLEEP_SEC}s")
 
 def get_local_ip():
@@ -42,56 +161,714 @@ def get_local_ip():
 def register_with_master():
     ip = get_local_ip()
     url = f"http://{ip}:{PORT}"
-    payload = {"id": ID, "url": url}
+    with log_lock:
+        max_contiguous_id = secondary_log.max_contiguous_id
+    payload = {"id": ID, "url": url, "max_contiguous_id": max_contiguous_id}
     try:
         r = requests.post(f"{MASTER_URL.rstrip('/')}/register", json=payload, timeout=5)
         if r.status_code == 200:
             app.logger.info(f"Successfully registered with master: {payload}")
+            last_id = r.json().get("last_id", 0)
+            if last_id > max_contiguous_id:
+                threading.Thread(target=catch_up, args=(last_id,), daemon=True).start()
         else:
             app.logger.error(f"Failed to register with master: {r.status_code} {r.text}")
     except Exception as e:
         app.logger.exception(f"Exception when registering with master: {e}")
         raise
 
+def apply_entries(entries, persist=True):
+    """
+    Apply validated entries in strict id order. Returns (applied, overflow): the number of entries
+    appended to the log and the entries that did not fit into the hold-back buffer.
+
+    An entry right after the highest contiguous id is appended to the log, followed by every
+    held-back entry it unblocks; an entry ahead of a hole waits in the hold-back buffer
+    (at most HOLDBACK_MAX entries). Entries at or below the contiguous id, or already held back,
+    are duplicates. With a WAL, new entries are persisted before they are applied (and before the ACK)
+    unless `persist` is False (replaying the WAL itself).
+    """
+    start = time.perf_counter()
+    if wal is not None and persist:
+        persist_entries(entries)
+
+    applied = 0
+    duplicates = 0
+    overflow = []
+    with log_lock:
+        for e in sorted(entries, key=lambda e: e["id"]):
+            msg_id = e["id"]
+            contiguous = secondary_log.max_contiguous_id
+            if msg_id <= contiguous or msg_id in holdback:
+                app.logger.debug("[%s] Duplicate id=%s ignored", ID, msg_id)
+                duplicates += 1
+                continue
+            entry = {"id": msg_id, "message": e["message"], "timestamp": e.get("timestamp")}
+            if msg_id > contiguous + 1:
+                if len(holdback) >= HOLDBACK_MAX:
+                    overflow.append(e)
+                else:
+                    holdback[msg_id] = entry
+                    app.logger.debug("[%s] Held back id=%s (contiguous id=%s)", ID, msg_id, contiguous)
+                continue
+            secondary_log.insert(entry)
+            applied += 1
+            app.logger.debug("[%s] Applied id=%s: %s", ID, msg_id, e["message"])
+            # The hole in front of held-back entries may be filled now
+            applied += drain_holdback()
+    if applied:
+        notify_applied()
+    APPLY_SECONDS.observe(time.perf_counter() - start)
+    APPLIED.inc(applied)
+    DUPLICATES.inc(duplicates)
+    if overflow:
+        HOLDBACK_OVERFLOW.inc(len(overflow))
+    return applied, overflow
+
+
+def persist_entries(entries):
+    """
+    Write the entries not applied or held back yet to the WAL (group commit with concurrent callers).
+    """
+    with log_lock:
+        contiguous = secondary_log.max_contiguous_id
+        fresh = [e for e in entries if e["id"] > contiguous and e["id"] not in holdback]
+    wal.append_many([{"id": e["id"], "message": e["message"], "timestamp": e.get("timestamp")} for e in fresh])
+
+
+class _Pending:
+    __slots__ = ("entries", "received_at", "done", "overflow", "error")
+
+    def __init__(self, entries, done):
+        self.entries = entries
+        self.received_at = time.monotonic()
+        self.done = done
+        self.overflow = []
+        self.error = None
+
+
+def enqueue_entries(entries):
+    """
+    Hand validated entries of one replication request to the applier and return once they are
+    as far as ACK_MODE requires. Returns the queued _Pending, or None if the apply queue is full.
+    """
+    global apply_queued
+    with apply_cond:
+        if apply_queued + len(entries) > APPLY_QUEUE_MAX:
+            return None
+        apply_queued += len(entries)  # reserved before the WAL write, queued right after
+    if ACK_MODE == "durable" and wal is not None:
+        try:
+            persist_entries(entries)
+        except BaseException:
+            with apply_cond:
+                apply_queued -= len(entries)
+            raise
+    pending = _Pending(entries, threading.Event() if ACK_MODE == "applied" else None)
+    with apply_cond:
+        apply_queue.append(pending)
+        apply_cond.notify()
+    if pending.done is not None:
+        pending.done.wait()
+    return pending
+
+
+def apply_lag():
+    """
+    Seconds the oldest queued entry has been waiting.
+    """
+    with apply_cond:
+        return time.monotonic() - apply_queue[0].received_at if apply_queue else 0.0
+
+
+def start_applier():
+    """
+    Applier thread: drains the apply queue in batches of up to APPLY_BATCH_MAX entries, each entry
+    SLEEP_SEC after it was received (lag emulation without holding request threads).
+    """
+    def run():
+        global apply_queued
+        # In durable mode (with a WAL) the request handlers already persisted the entries
+        persist = not (ACK_MODE == "durable" and wal is not None)
+        while True:
+            with apply_cond:
+                while True:
+                    if not apply_queue:
+                        apply_cond.wait()
+                        continue
+                    wait = apply_queue[0].received_at + SLEEP_SEC - time.monotonic()
+                    if wait <= 0:
+                        break
+                    apply_cond.wait(wait)
+                batch, count = [], 0
+                now = time.monotonic()
+                while apply_queue and count < APPLY_BATCH_MAX and apply_queue[0].received_at + SLEEP_SEC <= now:
+                    pending = apply_queue.popleft()
+                    batch.append(pending)
+                    count += len(pending.entries)
+                apply_queued -= count
+
+            try:
+                _, overflow = apply_entries([e for p in batch for e in p.entries], persist=persist)
+            except Exception as e:
+                app.logger.exception(f"[{ID}] Apply failed: {e}")
+                overflow = []
+                for p in batch:
+                    p.error = str(e)
+            if overflow:
+                overflow_ids = {e["id"] for e in overflow}
+                for p in batch:
+                    p.overflow = [e for e in p.entries if e["id"] in overflow_ids]
+                if ACK_MODE != "applied":
+                    # Already ACKed: the dropped entries come back through a gap fill
+                    request_gap_fill(max(overflow_ids))
+            now = time.monotonic()
+            for p in batch:
+                APPLY_LAG.observe(now - p.received_at)
+                if p.done is not None:
+                    p.done.set()
+    threading.Thread(target=run, name="applier", daemon=True).start()
+
+
+def drain_holdback():
+    """
+    Move held-back entries that now follow the contiguous prefix into the log. Call under log_lock.
+    """
+    moved = 0
+    while holdback:
+        nxt = holdback.pop(secondary_log.max_contiguous_id + 1, None)
+        if nxt is None:
+            break
+        secondary_log.insert(nxt)
+        moved += 1
+    return moved
+
+
+def advance_to(last_id):
+    """
+    Move the log past an installed snapshot: everything up to last_id is now on disk.
+    """
+    with log_lock:
+        secondary_log.truncate(last_id)
+        for msg_id in [i for i in holdback if i <= last_id]:
+            del holdback[msg_id]
+        drain_holdback()
+    notify_applied()
+
+
+def notify_applied():
+    """
+    The contiguous prefix grew: advance synced_at past the heartbeat marks it reached and wake waiting readers.
+    """
+    global synced_at
+    contiguous = secondary_log.max_contiguous_id
+    with applied_cond:
+        while master_marks and master_marks[0][1] <= contiguous:
+            synced_at = master_marks.popleft()[0]
+        applied_cond.notify_all()
+
+
+def record_master_mark(master_last_id):
+    """
+    A heartbeat told us the master's last id (as of now).
+    """
+    global synced_at
+    now = time.time()
+    with applied_cond:
+        if secondary_log.max_contiguous_id >= master_last_id:
+            synced_at = now
+            master_marks.clear()
+            applied_cond.notify_all()
+        elif not master_marks or master_marks[-1][1] < master_last_id:
+            master_marks.append((now, master_last_id))
+
+
+def wait_consistent(min_id, max_lag, timeout):
+    """
+    Wait until the log holds min_id (if given) and is at most max_lag seconds behind the master (if given).
+    Returns False if that did not happen within timeout.
+    """
+    deadline = time.monotonic() + timeout
+    with applied_cond:
+        while True:
+            if (min_id is None or secondary_log.max_contiguous_id >= min_id) and (
+                max_lag is None or time.time() - synced_at <= max_lag
+            ):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            applied_cond.wait(remaining)
+
+
+def fetch_snapshots(from_id):
+    """
+    Ship the compacted part of the range starting at from_id as snapshot files from the master.
+    With local compaction a snapshot is installed as-is, otherwise its entries are applied.
+    Returns (next id to pull as NDJSON, entries covered by the snapshots).
+    """
+    base = MASTER_URL.rstrip("/")
+    r = requests.get(f"{base}/snapshots", timeout=30)
+    if r.status_code != 200:
+        return from_id, 0
+    covered = 0
+    for meta in r.json().get("snapshots", []):
+        if meta["last_id"] < from_id:
+            continue
+        if meta["first_id"] > from_id:
+            break
+        resp = requests.get(f"{base}/snapshots/{meta['name']}", timeout=300)
+        resp.raise_for_status()
+        data = resp.content
+        if compactor is None or compactor.install(data, advance_to) is None:
+            entries = decode_snapshot(data)
+            for i in range(0, len(entries), CATCHUP_BATCH):
+                apply_entries(entries[i:i + CATCHUP_BATCH])
+        app.logger.info(f"[{ID}] Installed snapshot {meta['name']} ({meta['bytes']} bytes)")
+        covered += meta["last_id"] - from_id + 1
+        from_id = meta["last_id"] + 1
+    return from_id, covered
+
+
+def received_last_id():
+    """
+    Highest id received so far (applied or held back). Call under log_lock.
+    """
+    return max(holdback) if holdback else secondary_log.max_contiguous_id
+
+
+def request_gap_fill(upto=None):
+    """
+    Ask the master for the holes in front of held-back entries (and up to `upto`), in the background.
+    """
+    GAP_FILLS.inc()
+    threading.Thread(target=fill_gaps, args=(upto,), daemon=True).start()
+
+
+def missing_ranges(upto=None):
+    """
+    (first, last) id ranges missing between the highest contiguous id and the highest held-back id
+    (or `upto`, if higher), holes closer than GAP_MERGE_IDS merged. Call under log_lock.
+    """
+    ranges = []
+    prev = secondary_log.max_contiguous_id
+    for msg_id in sorted(i for i in holdback if i > prev):
+        if msg_id > prev + 1:
+            # prev - ranges[-1][1] ids since the previous hole are all held back
+            if ranges and prev - ranges[-1][1] <= GAP_MERGE_IDS:
+                ranges[-1] = (ranges[-1][0], msg_id - 1)
+            else:
+                ranges.append((prev + 1, msg_id - 1))
+        prev = msg_id
+    if upto is not None and upto > prev:
+        if ranges and prev - ranges[-1][1] <= GAP_MERGE_IDS:
+            ranges[-1] = (ranges[-1][0], upto)
+        else:
+            ranges.append((prev + 1, upto))
+    return ranges
+
+
+def overlap(a, b):
+    """
+    Ids in both of two sorted lists of (first, last) ranges, as ranges.
+    """
+    out = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        first, last = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if first <= last:
+            out.append((first, last))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def fill_gaps(upto=None, ranges=None):
+    """
+    Pull only the missing id ranges (given, or every hole in front of held-back entries and up
+    to `upto`) from the master. Returns number of applied entries.
+    """
+    if not catchup_lock.acquire(blocking=False):
+        return 0
+    try:
+        if ranges is None:
+            with log_lock:
+                ranges = missing_ranges(upto)
+        applied = 0
+        for first, last in ranges:
+            applied += pull_range(first, last)[0]
+        app.logger.info(
+            f"[{ID}] Gap fill: {len(ranges)} ranges, {sum(b - a + 1 for a, b in ranges)} ids, applied {applied}"
+        )
+        return applied
+    except (requests.RequestException, ValueError) as e:
+        app.logger.warning(f"[{ID}] Gap fill failed: {e}")
+        return 0
+    finally:
+        catchup_lock.release()
+
+
+def pull_range(from_id, to_id=None):
+    """
+    Stream ids from_id..to_id (to_id None = up to CATCHUP_MAX_ENTRIES) from the master
+    (GET /?stream=1 NDJSON), applying CATCHUP_BATCH entries at a time.
+    Returns (applied, next from_id, received). Raises ValueError if a line is not an entry
+    (e.g. a master without paged NDJSON reads answers with its whole log as one JSON object).
+    """
+    limit = CATCHUP_MAX_ENTRIES
+    if to_id is not None:
+        limit = min(limit, to_id - from_id + 1)
+    applied = 0
+    received = 0
+    batch = []
+    with requests.get(
+        f"{MASTER_URL.rstrip('/')}/",
+        params={"stream": 1, "from_id": from_id, "limit": limit},
+        stream=True,
+        timeout=30,
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            entry = json.loads(line)
+            if not isinstance(entry, dict) or not isinstance(entry.get("id"), int) or entry.get("message") is None:
+                raise ValueError(f"master sent something other than an entry: {line[:200]!r}")
+            batch.append(entry)
+            received += 1
+            if len(batch) >= CATCHUP_BATCH:
+                applied += apply_entries(batch)[0]
+                from_id = batch[-1]["id"] + 1
+                batch = []
+    if batch:
+        applied += apply_entries(batch)[0]
+        from_id = batch[-1]["id"] + 1
+    return applied, from_id, received
+
+
+def catch_up(target_id=None):
+    """
+    Pull the range after our highest contiguous id from the master: the part the master has
+    compacted as snapshot files, then the tail (GET /?stream=1 NDJSON)
+    in rounds of at most CATCHUP_MAX_ENTRIES, applying CATCHUP_BATCH entries at a time.
+    Stops once target_id is reached or a round brings nothing new. Returns number of applied entries.
+    """
+    if not catchup_lock.acquire(blocking=False):
+        return 0
+    try:
+        with log_lock:
+            from_id = secondary_log.max_contiguous_id + 1
+        app.logger.info(f"[{ID}] Catch-up from id={from_id} (target={target_id})")
+        from_id, applied = fetch_snapshots(from_id)
+        while target_id is None or from_id <= target_id:
+            pulled, from_id, received = pull_range(from_id, target_id)
+            applied += pulled
+            if received == 0:
+                break
+        app.logger.info(f"[{ID}] Catch-up done, applied {applied} entries")
+        return applied
+    except (requests.RequestException, ValueError) as e:
+        app.logger.warning(f"[{ID}] Catch-up failed: {e}")
+        return 0
+    finally:
+        catchup_lock.release()
+
+
+def start_gap_detector():
+    """
+    Periodically look for holes in front of held-back entries. Ids that were already missing at
+    the previous check (not just in-flight batches) are pulled from the master.
+    """
+    def run():
+        previous = []
+        while True:
+            time.sleep(CATCHUP_INTERVAL_SEC)
+            try:
+                with log_lock:
+                    contiguous = secondary_log.max_contiguous_id
+                    ranges = missing_ranges()
+                stale = overlap(previous, ranges)
+                previous = ranges
+                if stale:
+                    app.logger.warning(
+                        f"[{ID}] Gap after id={contiguous} ({len(stale)} ranges still missing), requesting gap fill"
+                    )
+                    GAP_FILLS.inc()
+                    fill_gaps(ranges=stale)
+            except Exception as e:
+                # Keep detecting: holes still missing are pulled again on a later check
+                app.logger.exception(f"[{ID}] Gap detector round failed: {e}")
+    threading.Thread(target=run, daemon=True).start()
+
+
 @app.route("/replicate", methods=["POST"])
 def replicate():
     """
     Master -> POST /replicate  JSON: {"id": <seq>, "message": "...", "timestamp": ...}
-    Secondary simulates delay SLEEP_SEC to emulate lagging replicas.
-    Deduplicates by id and maintains total ordering by id.
+              or a binary frame (Content-Type: application/x-repl-entries, see wire.py) holding the entry
+    Goes through the apply pipeline like /replicate_batch.
     """
-    data = request.get_json() or {}
+    if request.mimetype == WIRE_CONTENT_TYPE:
+        try:
+            entries = decode_entries(request.get_data())
+        except ValueError as e:
+            REJECTED.inc()
+            return jsonify({"error": f"invalid frame: {e}"}), 400
+        if len(entries) != 1:
+            REJECTED.inc()
+            return jsonify({"error": "exactly one entry expected, use /replicate_batch"}), 400
+        data = entries[0]
+    else:
+        data = request.get_json() or {}
     msg_id = data.get("id")
     message = data.get("message")
-    timestamp = data.get("timestamp", None)
 
     if msg_id is None or message is None:
+        REJECTED.inc()
         return jsonify({"error": "invalid entry, id and message required"}), 400
 
-    # Simulate apply delay (emulate lag)
-    if SLEEP_SEC > 0:
-        app.logger.info(f"[{ID}] Simulating apply delay of {SLEEP_SEC}s for id={msg_id}")
-        time.sleep(SLEEP_SEC)
+    pending = enqueue_entries([data])
+    if pending is None:
+        return jsonify({"error": "apply queue full", "id": msg_id}), 503
+    if pending.error:
+        return jsonify({"error": pending.error, "id": msg_id}), 500
+    if pending.overflow:
+        request_gap_fill()
+        return jsonify({"error": "hold-back buffer full", "id": msg_id}), 503
+    return jsonify({"status": "ack", "ack": ACK_MODE, "id": msg_id}), 200
+
 
+@app.route("/replicate_batch", methods=["POST"])
+def replicate_batch():
+    """
+    Master -> POST /replicate_batch  JSON: {"entries": [{"id": <seq>, "message": "...", "timestamp": ...}, ...]}
+              or a binary frame of entries (Content-Type: application/x-repl-entries, see wire.py)
+    The batch is queued for the applier thread and ACKed as a unit once it is received, durable
+    or applied (ACK_MODE); a full apply queue answers 503 and the master retries.
+    Entries ahead of a hole are held back (and ACKed); if the hold-back buffer is full
+    the batch gets 503 (applied mode), the master retries it and a gap fill is requested.
+    """
+    if request.mimetype == WIRE_CONTENT_TYPE:
+        try:
+            entries = decode_entries(request.get_data())
+        except ValueError as e:
+            REJECTED.inc()
+            return jsonify({"error": f"invalid frame: {e}"}), 400
+    else:
+        data = request.get_json() or {}
+        entries = data.get("entries")
+        if not isinstance(entries, list):
+            REJECTED.inc()
+            return jsonify({"error": "entries list required"}), 400
+        for e in entries:
+            if not isinstance(e, dict) or e.get("id") is None or e.get("message") is None:
+                REJECTED.inc()
+                return jsonify({"error": "invalid entry, id and message required"}), 400
+
+    ids = [e["id"] for e in entries]
+    if not entries:
+        return jsonify({"status": "ack", "ack": ACK_MODE, "ids": ids}), 200
+    pending = enqueue_entries(entries)
+    if pending is None:
+        return jsonify({"error": "apply queue full", "ids": ids}), 503
+    if pending.error:
+        return jsonify({"error": pending.error, "ids": ids}), 500
+    if pending.overflow:
+        request_gap_fill()
+        return jsonify({"error": "hold-back buffer full", "ids": [e["id"] for e in pending.overflow]}), 503
+    return jsonify({"status": "ack", "ack": ACK_MODE, "ids": ids}), 200
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Heartbeat target for the master. GET /health?last_id=<id> also records the master's last id
+    (used for max_lag reads).
+    """
+    if "last_id" in request.args:
+        try:
+            record_master_mark(int(request.args["last_id"]))
+        except ValueError:
+            return jsonify({"error": "last_id must be integer"}), 400
     with log_lock:
-        if msg_id in secondary_by_id:
-            app.logger.info(f"[{ID}] Duplicate id={msg_id} ignored")
-        else:
-            # Store by id for dedup, and append to log, then keep log sorted by id (total ordering)
-            secondary_by_id[msg_id] = {"id": msg_id, "message": message, "timestamp": timestamp}
-            secondary_log.append(secondary_by_id[msg_id])
-            # Keep list sorted by id (since master assigns increasing ids)
-            secondary_log.sort(key=lambda e: e["id"])
-            app.logger.info(f"[{ID}] Applied id={msg_id}: {message}")
+        max_contiguous_id = secondary_log.max_contiguous_id
+        last_id = received_last_id()
+        held_back = len(holdback)
+    return jsonify({
+        "status": "ok",
+        "id": ID,
+        "max_contiguous_id": max_contiguous_id,
+        "last_id": last_id,
+        "held_back": held_back,
+        "apply_queue": apply_queued,
+        "apply_lag_sec": round(apply_lag(), 3),
+    }), 200
 
-    return jsonify({"status": "ack", "id": msg_id}), 200
+
+@app.route("/summary", methods=["GET"])
+def get_summary():
+    """
+    Cheap replica summary for the master's /secondaries/messages.
+    GET /summary[?upto=<id>] -> prefix hash of ids 1..min(upto, max_contiguous_id)
+    """
+    try:
+        upto = int(request.args["upto"]) if "upto" in request.args else None
+    except ValueError:
+        return jsonify({"error": "upto must be integer"}), 400
+    with log_lock:
+        max_contiguous_id = secondary_log.max_contiguous_id
+        last_id = received_last_id()
+        held_back = len(holdback)
+    hash_upto = max_contiguous_id if upto is None else min(upto, max_contiguous_id)
+    return jsonify({
+        "id": ID,
+        "count": max_contiguous_id,  # the log is the contiguous prefix 1..max_contiguous_id
+        "max_contiguous_id": max_contiguous_id,
+        "last_id": last_id,
+        "held_back": held_back,
+        "hash_upto": hash_upto,
+        "prefix_hash": prefix_digest.at(hash_upto),
+    }), 200
+
+
+@app.route("/merkle", methods=["GET", "POST"])
+def get_merkle():
+    """
+    Anti-entropy tree (see digest.BucketTree).
+    GET /merkle -> {"bucket", "fanout", "leaves"}: full buckets of the contiguous prefix
+    POST /merkle {"leaves": n, "level": l, "indices": [...]} -> {"hashes": [...]} node hashes over the first n leaves
+    POST /merkle {"buckets": [...]} -> {"entries": {bucket: "<hex>"}} per-entry hashes of buckets, in id order
+    """
+    if request.method == "GET":
+        with log_lock:
+            contiguous = secondary_log.max_contiguous_id
+        return jsonify({"bucket": AE_BUCKET, "fanout": AE_FANOUT, "leaves": merkle.sync(contiguous)}), 200
+
+    data = request.get_json() or {}
+    try:
+        if "buckets" in data:
+            return jsonify({"entries": {k: merkle.entry_hashes(int(k)) for k in data["buckets"]}}), 200
+        hashes = merkle.hashes(int(data["level"]), [int(i) for i in data["indices"]], int(data["leaves"]))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "leaves, level and indices (or buckets) required"}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"hashes": hashes}), 200
+
+
+@app.route("/repair", methods=["POST"])
+def repair():
+    """
+    Master -> POST /repair  JSON: {"entries": [...]}: authoritative versions of entries that diverged.
+    Only entries of the contiguous prefix still held in memory can be rewritten; the rest are returned as "skipped".
+    """
+    data = request.get_json() or {}
+    entries = data.get("entries")
+    if not isinstance(entries, list) or any(not isinstance(e, dict) or "id" not in e or "message" not in e
+                                            for e in entries):
+        REJECTED.inc()
+        return jsonify({"error": "entries list with id and message required"}), 400
+    repaired, skipped = repair_entries(entries)
+    return jsonify({"status": "ok", "repaired": repaired, "skipped": skipped}), 200
+
+
+def repair_entries(entries, persist=True):
+    """
+    Overwrite entries of the contiguous prefix with the master's version. Returns (repaired ids, skipped ids).
+    With a WAL the new versions are persisted first (flagged "repair", replayed after the regular records).
+    """
+    entries = [{"id": e["id"], "message": e["message"], "timestamp": e.get("timestamp")} for e in entries]
+    with log_lock:
+        contiguous = secondary_log.max_contiguous_id
+        start_id = secondary_log.start_id
+    skipped = [e["id"] for e in entries if not start_id <= e["id"] <= contiguous]
+    entries = [e for e in entries if start_id <= e["id"] <= contiguous]
+    if wal is not None and persist and entries:
+        wal.append_many([{**e, "repair": True} for e in entries])
+    repaired = []
+    with log_lock:
+        for e in entries:
+            if secondary_log.replace(e):
+                repaired.append(e["id"])
+            else:
+                skipped.append(e["id"])
+    for msg_id in repaired:
+        merkle.invalidate(msg_id)
+    if repaired:
+        prefix_digest.invalidate(min(repaired))
+        REPAIRED.inc(len(repaired))
+        app.logger.warning(f"[{ID}] Repaired {len(repaired)} diverged entries: {repaired[:20]}")
+    return repaired, skipped
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Prometheus text exposition format.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/", methods=["GET"])
 def get_messages():
+    """
+    Return replicated messages in total order (only the contiguous prefix, held-back entries are not visible).
+    GET /                              -> full log (legacy)
+    GET /?from_id=<id>&limit=<n>       -> one page + "next_from_id" cursor
+    GET /?stream=1[&from_id=][&limit=] -> NDJSON, one entry per line, sent in chunks
+    Any of them with &min_id=<id> (read-your-writes: the log holds at least up to id) or
+    &max_lag=<sec> (bounded staleness: in sync with the master as of at most sec ago) waits up to
+    READ_WAIT_SEC for this secondary to catch up, then redirects (307) to the master.
+    """
+    try:
+        from_id, limit = page_params(request.args, READ_PAGE_DEFAULT, READ_PAGE_MAX)
+        min_id = int(request.args["min_id"]) if "min_id" in request.args else None
+        max_lag = float(request.args["max_lag"]) if "max_lag" in request.args else None
+    except ValueError:
+        return jsonify({"error": "from_id, limit, min_id must be integers (limit >= 1), max_lag a number"}), 400
+
+    if (min_id is not None or max_lag is not None) and not wait_consistent(min_id, max_lag, READ_WAIT_SEC):
+        app.logger.debug("[%s] Read behind (min_id=%s, max_lag=%s), redirecting to master", ID, min_id, max_lag)
+        READ_REDIRECTS.inc()
+        query = request.query_string.decode()
+        return redirect(f"{MASTER_PUBLIC_URL}/?{query}" if query else f"{MASTER_PUBLIC_URL}/", code=307)
+
+    if request.args.get("stream") in ("1", "true"):
+        # Streams are sent in chunks, so they are not capped at READ_PAGE_MAX
+        stream_limit = int(request.args["limit"]) if "limit" in request.args else None
+        return Response(
+            ndjson_stream(secondary_log, log_lock, from_id, stream_limit, STREAM_CHUNK, snapshots),
+            mimetype="application/x-ndjson",
+        )
+
+    if "from_id" in request.args or "limit" in request.args:
+        entries = read_page(secondary_log, log_lock, from_id, limit, snapshots)
+        return jsonify(page_body(entries, from_id, limit)), 200
+
+    entries = read_page(secondary_log, log_lock, None, None, snapshots)
+    return jsonify({"messages": entries}), 200
+
+
+def recover_log():
+    """
+    Rebuild the log on startup: ids covered by snapshots stay on disk, the rest (and the
+    hold-back buffer, if a hole was open) is replayed from the write-ahead log.
+    """
+    compacted = snapshots.last_id if snapshots is not None else 0
     with log_lock:
-        # Return the ordered list
-        return jsonify({"messages": list(secondary_log)}), 200
+        secondary_log.truncate(compacted)
+    entries = list(wal.replay()) if wal is not None else []
+    repairs = [e for e in entries if e.get("repair")]
+    entries = [e for e in entries if not e.get("repair")]
+    applied, overflow = apply_entries(entries, persist=False) if entries else (0, [])
+    if repairs:
+        repair_entries(repairs, persist=False)
+    app.logger.info(
+        f"[{ID}] Recovered {applied} entries from WAL at {WAL_DIR or '-'} (ids up to {compacted} in snapshots, "
+        f"{len(holdback)} held back, {len(overflow)} left for catch-up)"
+    )
 
 
 def start_registration_background():
@@ -112,6 +889,14 @@ def start_registration_background():
 
 
 if __name__ == "__main__":
-    # Start registration background thread
+    if wal is not None or snapshots is not None:
+        recover_log()
+    if compactor is not None:
+        compactor.start()
+    # Start registration background thread (catches up on the missing range once registered)
+    start_applier()
     start_registration_background()
+    start_gap_detector()
+    # HTTP/1.1 so the master's keep-alive sessions can reuse connections
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
     app.run(host="0.0.0.0", port=PORT)
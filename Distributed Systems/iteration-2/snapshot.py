@@ -0,0 +1,266 @@
+# snapshot.py
+"""
+Log compaction: the oldest part of an in-memory OrderedLog is written to immutable snapshot
+files and truncated from memory. Together the snapshots hold the compacted prefix of the log
+(each file covers one contiguous id range); reads below the in-memory start are served from them.
+"""
+import os
+import time
+import zlib
+import struct
+import threading
+from bisect import bisect_right
+
+from columnar import decode_columns, encode_columns, pack
+
+# Snapshot file: <header><zlib-compressed columns>
+# header: magic, version, first id, last id, entry count, crc32 of the compressed body
+_HEADER = struct.Struct("<4sHqqII")
+_MAGIC = b"RLSN"
+_VERSION = 1
+_NAME_FMT = "snapshot-{:012d}-{:012d}.snap"
+
+
+def encode_snapshot(entries):
+    """
+    Columnar encoding (columnar.py) of a list of entries sorted by id, zlib-compressed.
+    """
+    body = zlib.compress(encode_columns(entries), 6)
+    header = _HEADER.pack(_MAGIC, _VERSION, entries[0]["id"], entries[-1]["id"], len(entries), zlib.crc32(body))
+    return header + body
+
+
+def snapshot_range(data):
+    """
+    (first_id, last_id, count) from a snapshot's header. Raises ValueError if it is not a snapshot.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated snapshot")
+    magic, version, first_id, last_id, count, _ = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("not a snapshot file")
+    return first_id, last_id, count
+
+
+def decode_snapshot(data):
+    """
+    Entries stored in a snapshot, in id order. Raises ValueError on a corrupt file.
+    """
+    first_id, last_id, count = snapshot_range(data)
+    crc = _HEADER.unpack_from(data)[5]
+    body = data[_HEADER.size:]
+    if zlib.crc32(body) != crc:
+        raise ValueError("snapshot checksum mismatch")
+    return decode_columns(zlib.decompress(body), count)
+
+
+class SnapshotStore:
+    """
+    Directory of snapshot files, each covering ids first_id..last_id; consecutive files cover
+    consecutive ranges. Files are written to a temp name, fsynced and renamed, so a crash never
+    leaves a half-written snapshot behind. The last decoded file is cached for range reads.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._snapshots = []  # (first_id, last_id, name, bytes), sorted by first_id
+        self._cache = (None, None)  # (name, entries)
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif name.startswith("snapshot-") and name.endswith(".snap"):
+                first_id, last_id = (int(part) for part in name[len("snapshot-"):-len(".snap")].split("-"))
+                self._snapshots.append((first_id, last_id, name, os.path.getsize(path)))
+
+    @property
+    def last_id(self):
+        """
+        Highest id covered by a snapshot (0 if there is none).
+        """
+        with self._lock:
+            return self._snapshots[-1][1] if self._snapshots else 0
+
+    def list(self):
+        with self._lock:
+            return [
+                {"name": name, "first_id": first_id, "last_id": last_id, "bytes": size}
+                for first_id, last_id, name, size in self._snapshots
+            ]
+
+    def path(self, name):
+        """
+        Path of a stored snapshot, None for an unknown name.
+        """
+        with self._lock:
+            if any(s[2] == name for s in self._snapshots):
+                return os.path.join(self.directory, name)
+        return None
+
+    def write(self, entries):
+        """
+        Compact entries (sorted by id, following the last snapshot) into a new snapshot file.
+        """
+        return self.install(encode_snapshot(entries))
+
+    def install(self, data):
+        """
+        Store an encoded snapshot (written locally or received from the master).
+        """
+        first_id, last_id, _ = snapshot_range(data)
+        name = _NAME_FMT.format(first_id, last_id)
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        with self._lock:
+            self._snapshots.append((first_id, last_id, name, len(data)))
+            self._snapshots.sort()
+        return {"name": name, "first_id": first_id, "last_id": last_id, "bytes": len(data)}
+
+    def _entries(self, name):
+        with self._lock:
+            cached_name, cached = self._cache
+        if cached_name == name:
+            return cached
+        with open(os.path.join(self.directory, name), "rb") as f:
+            entries = decode_snapshot(f.read())
+        with self._lock:
+            self._cache = (name, entries)
+        return entries
+
+    def range(self, from_id=None, to_id=None, limit=None):
+        """
+        Yield snapshotted entries with from_id <= id <= to_id in order, at most `limit` of them.
+        """
+        with self._lock:
+            snapshots = list(self._snapshots)
+        i = 0 if from_id is None else max(0, bisect_right([s[0] for s in snapshots], from_id) - 1)
+        count = 0
+        for first_id, last_id, name, _ in snapshots[i:]:
+            if to_id is not None and first_id > to_id:
+                return
+            if from_id is not None and last_id < from_id:
+                continue
+            for entry in self._entries(name):
+                if from_id is not None and entry["id"] < from_id:
+                    continue
+                if to_id is not None and entry["id"] > to_id:
+                    return
+                yield entry
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+
+class Compactor:
+    """
+    Keeps an OrderedLog within its retention limits: every `interval` seconds the oldest entries
+    beyond `retain_entries` entries, `retain_bytes` message bytes or `retain_sec` seconds of age
+    (0 = no limit) are written to a snapshot and truncated from memory. Only the contiguous prefix
+    is compacted. `on_compacted(last_id)` runs after each new snapshot (e.g. to drop WAL segments).
+    """
+
+    def __init__(self, log, lock, store, retain_entries=0, retain_bytes=0, retain_sec=0.0,
+                 interval=60.0, on_compacted=None, logger=None):
+        self.log = log
+        self.lock = lock
+        self.store = store
+        self.retain_entries = retain_entries
+        self.retain_bytes = retain_bytes
+        self.retain_sec = retain_sec
+        self.interval = interval
+        self.on_compacted = on_compacted
+        self.logger = logger
+        self._compact_lock = threading.Lock()  # one compaction / snapshot install at a time
+
+    def start(self):
+        threading.Thread(target=self._run, name="compactor", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.compact()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Compaction failed: {e}")
+
+    def _retention_cut(self, view, readable_id):
+        """
+        Highest id that falls outside the retention limits, from a view of the log.
+        """
+        excess_entries = view.length - self.retain_entries if self.retain_entries else 0
+        excess_bytes = view.message_bytes - self.retain_bytes if self.retain_bytes else 0
+        oldest_kept = time.time() - self.retain_sec if self.retain_sec else None
+        cut = None
+        dropped = dropped_bytes = 0
+        for entry in view.range(to_id=readable_id):
+            expired = oldest_kept is not None and (entry.get("timestamp") or 0) < oldest_kept
+            if dropped >= excess_entries and dropped_bytes >= excess_bytes and not expired:
+                break
+            cut = entry["id"]
+            dropped += 1
+            # Same measure as OrderedLog.message_bytes: utf-8 bytes (compact JSON for non-strings)
+            dropped_bytes += len(pack(entry)[3])
+        return cut
+
+    def compact(self, upto_id=None):
+        """
+        Snapshot and truncate the prefix up to `upto_id` (default: whatever the retention limits
+        push out). Returns the new snapshot's metadata, or None if there was nothing to compact.
+        """
+        with self._compact_lock:
+            return self._compact(upto_id)
+
+    def _compact(self, upto_id):
+        with self.lock:
+            view = self.log.view()
+            readable_id = self.log.readable_id
+        # Only the compaction lock keeps truncate() out; the view is read outside the log lock
+        cut = self._retention_cut(view, readable_id) if upto_id is None else min(upto_id, readable_id)
+        if cut is None or cut < view.start_id:
+            return None
+        entries = list(view.range(view.start_id, cut))
+        if not entries:
+            return None
+        # Encoding and fsync happen outside the log lock; the entries stay readable from memory meanwhile
+        meta = self.store.write(entries)
+        with self.lock:
+            self.log.truncate(cut)
+        if self.logger:
+            self.logger.info(
+                f"Compacted ids {meta['first_id']}..{meta['last_id']} into {meta['name']} ({meta['bytes']} bytes)"
+            )
+        if self.on_compacted is not None:
+            self.on_compacted(cut)
+        return meta
+
+    def install(self, data, advance):
+        """
+        Install a snapshot received from the master. Entries still held only in memory below it
+        are compacted first, so the snapshots keep covering the whole prefix; then
+        `advance(last_id)` moves the log past the snapshot (called under the compaction lock).
+        Returns None if the snapshot overlaps local ones (the caller applies its entries instead).
+        """
+        first_id, last_id, _ = snapshot_range(data)
+        with self._compact_lock:
+            if first_id <= self.store.last_id:
+                return None
+            if first_id - 1 > self.store.last_id:
+                self._compact(first_id - 1)
+            meta = self.store.install(data)
+            advance(last_id)
+        if self.on_compacted is not None:
+            self.on_compacted(last_id)
+        return meta
@@ -0,0 +1,217 @@
+# stress_holdback.py
+"""
+Stress script for the secondary's hold-back buffer: delivers --entries ids to a real
+secondary.py in shuffled batches from several sender threads, never delivers a --drop
+fraction of them (so holes must be filled by gap-fill requests), and meanwhile keeps
+reading pages from the secondary, checking that every read is a gap-free prefix.
+With --window N ids are only shuffled within windows of N consecutive ids (like pipelined
+batches from a master), so gap fills should pull little more than the dropped ids.
+
+A stand-in master (in this process) accepts the registration and serves the
+gap-fill stream (GET /?stream=1&from_id=&limit=).
+
+    python stress_holdback.py --entries 20000 --batch 32 --senders 8 --drop 0.01 --holdback 2000 [--window 1024]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from bench_load import HERE, QuietHTTPServer
+
+
+class StandInMaster:
+    """
+    Answers POST /register and streams entries[from_id..] as NDJSON for gap fills (no snapshots).
+    """
+
+    def __init__(self, entries):
+        self.entries = entries  # entries[i] has id i + 1
+        self.gap_fills = 0
+        self.served = 0
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                self._reply(200, "application/json", json.dumps({"status": "registered", "last_id": 0}).encode())
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/snapshots"):
+                    # No compaction: catch-up goes straight to the NDJSON stream
+                    self._reply(404, "application/json", b'{"error": "no snapshots"}')
+                    return
+                args = parse_qs(url.query)
+                from_id = int(args.get("from_id", ["1"])[0])
+                limit = int(args.get("limit", [str(len(standin.entries))])[0])
+                chunk = standin.entries[from_id - 1:from_id - 1 + limit]
+                standin.gap_fills += 1
+                standin.served += len(chunk)
+                body = "".join(json.dumps(e) + "\n" for e in chunk).encode()
+                self._reply(200, "application/x-ndjson", body)
+
+            def _reply(self, code, content_type, body):
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = QuietHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_secondary(port, master_url, holdback):
+    env = dict(os.environ)
+    env.update({
+        "MASTER_URL": master_url,
+        "SECONDARY_ID": "stress",
+        "SECONDARY_PORT": str(port),
+        "HOLDBACK_MAX": str(holdback),
+        "CATCHUP_INTERVAL_SEC": "0.5",
+    })
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "secondary.py")],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"secondary.py exited with code {proc.returncode} (port {port} busy?)")
+        try:
+            requests.get(f"{url}/health", timeout=0.5)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"secondary.py did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--senders", type=int, default=8)
+    parser.add_argument("--drop", type=float, default=0.01, help="fraction of ids never delivered")
+    parser.add_argument("--holdback", type=int, default=2000, help="HOLDBACK_MAX of the secondary")
+    parser.add_argument("--window", type=int, default=0, help="shuffle within windows of this many ids (0 = all)")
+    parser.add_argument("--port", type=int, default=5901)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = time.time()
+    entries = [{"id": i, "message": f"message-{i}", "timestamp": now} for i in range(1, args.entries + 1)]
+    delivered = [e for e in entries if rng.random() >= args.drop]
+    window = args.window or len(delivered)
+    for i in range(0, len(delivered), window):
+        part = delivered[i:i + window]
+        rng.shuffle(part)
+        delivered[i:i + window] = part
+    batches = [delivered[i:i + args.batch] for i in range(0, len(delivered), args.batch)]
+
+    master = StandInMaster(entries)
+    proc, url = start_secondary(args.port, master.url, args.holdback)
+    lock = threading.Lock()
+    queue = iter(batches)
+    stats = {"posts": 0, "rejected": 0, "reads": 0, "violations": 0}
+    done = threading.Event()
+
+    def sender():
+        session = requests.Session()
+        while True:
+            with lock:
+                batch = next(queue, None)
+            if batch is None:
+                return
+            while True:
+                r = session.post(f"{url}/replicate_batch", json={"entries": batch}, timeout=30)
+                with lock:
+                    stats["posts"] += 1
+                if r.status_code != 503:
+                    r.raise_for_status()
+                    break
+                # Hold-back buffer full: back off like the master's outbox does
+                with lock:
+                    stats["rejected"] += 1
+                time.sleep(0.05)
+
+    def reader():
+        session = requests.Session()
+        while not done.is_set():
+            from_id = rng.randint(1, args.entries)
+            page = session.get(url, params={"from_id": from_id, "limit": 500}, timeout=30).json()
+            ids = [m["id"] for m in page["messages"]]
+            # Every page must be a prefix slice with no holes
+            if ids and ids != list(range(from_id, from_id + len(ids))):
+                with lock:
+                    stats["violations"] += 1
+            with lock:
+                stats["reads"] += 1
+
+    try:
+        start = time.perf_counter()
+        readers = [threading.Thread(target=reader, daemon=True) for _ in range(2)]
+        senders = [threading.Thread(target=sender) for _ in range(args.senders)]
+        for t in readers + senders:
+            t.start()
+        for t in senders:
+            t.join()
+        delivered_at = time.perf_counter() - start
+
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            health = requests.get(f"{url}/health", timeout=5).json()
+            if health["max_contiguous_id"] >= args.entries:
+                break
+            time.sleep(0.1)
+        converged_at = time.perf_counter() - start
+        done.set()
+        for t in readers:
+            t.join()
+
+        full = requests.get(url, timeout=30).json()["messages"]
+        ok = [m["id"] for m in full] == list(range(1, args.entries + 1))
+        print(
+            f"{args.entries} entries ({args.entries - len(delivered)} dropped), {len(batches)} shuffled batches "
+            f"of {args.batch} from {args.senders} senders, holdback max {args.holdback}"
+        )
+        print(
+            f"delivered in {delivered_at:.2f}s, converged in {converged_at:.2f}s; "
+            f"posts={stats['posts']} rejected(503)={stats['rejected']} "
+            f"gap-fill requests={master.gap_fills} ({master.served} entries served)"
+        )
+        print(f"reads={stats['reads']} non-contiguous reads={stats['violations']} final log complete: {ok}")
+        if not ok or stats["violations"]:
+            sys.exit(1)
+    finally:
+        proc.terminate()
+        proc.wait()
+        master.stop()
+
+
+if __name__ == "__main__":
+    main()
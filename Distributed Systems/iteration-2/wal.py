@@ -0,0 +1,183 @@
+# wal.py
+import os
+import json
+import mmap
+import struct
+import zlib
+import threading
+
+# Record: <u32 payload length><u32 crc32 of payload><payload (JSON, utf-8)>
+_HEADER = struct.Struct("<II")
+_SEGMENT_FMT = "wal-{:08d}.log"
+
+
+def _encode(entry):
+    payload = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class WriteAheadLog:
+    """
+    Segmented append-only log of length-prefixed records.
+
+    append()/append_many() return once the records are on disk; write() + sync() split that in
+    two, so a caller can order writes under its own lock and wait for the disk outside it. With fsync enabled,
+    concurrent appenders are group-committed: whoever finds no fsync in progress becomes
+    the leader and fsyncs everything written so far, while the others keep writing into
+    the buffer and are released by a single fsync instead of one each.
+
+    Once a snapshot covers every id in a closed segment, drop_segments() deletes it.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_count = 0
+        self._cond = threading.Condition()
+        self._written = 0  # append calls whose records were written to the file buffer
+        self._synced = 0  # append calls whose records are known to be on disk
+        self._syncing = False
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._list_segments()
+        self._max_ids = {}  # segment path -> highest id written to it (known after replay/append)
+        self._file = None
+
+    def _list_segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("wal-") and n.endswith(".log"))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def replay(self):
+        """
+        Yield all entries stored on disk in append order. Segments are read through mmap.
+        A torn or corrupt record at the end of the last segment is truncated away.
+        Must be called before the first append.
+        """
+        for n, path in enumerate(self._segments):
+            size = os.path.getsize(path)
+            good = 0
+            if size:
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = 0
+                    while pos + _HEADER.size <= size:
+                        length, crc = _HEADER.unpack_from(mm, pos)
+                        end = pos + _HEADER.size + length
+                        if end > size:
+                            break
+                        payload = mm[pos + _HEADER.size:end]
+                        if zlib.crc32(payload) != crc:
+                            break
+                        entry = json.loads(payload)
+                        self._max_ids[path] = max(self._max_ids.get(path, 0), entry["id"])
+                        yield entry
+                        pos = good = end
+            if good < size:
+                if n != len(self._segments) - 1:
+                    raise IOError(f"corrupt record in {path} at offset {good}")
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+
+    def _open_segment(self):
+        number = int(os.path.basename(self._segments[-1])[4:-4]) + 1 if self._segments else 1
+        path = os.path.join(self.directory, _SEGMENT_FMT.format(number))
+        self._segments.append(path)
+        self._file = open(path, "ab")
+
+    def _rotate_if_needed(self):
+        if self._file is None:
+            if self._segments and os.path.getsize(self._segments[-1]) < self.segment_bytes:
+                self._file = open(self._segments[-1], "ab")
+            else:
+                self._open_segment()
+        elif self._file.tell() >= self.segment_bytes:
+            # Let an in-flight group fsync on the old segment finish first
+            while self._syncing:
+                self._cond.wait()
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+                self.fsync_count += 1
+            self._synced = self._written
+            self._file.close()
+            self._open_segment()
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        if not entries:
+            return
+        self.sync(self.write(entries))
+
+    def write(self, entries):
+        """
+        Write the records to the file buffer (no fsync). Returns a ticket for sync().
+        """
+        data = b"".join(_encode(e) for e in entries)
+        max_id = max(e["id"] for e in entries)
+        with self._cond:
+            self._rotate_if_needed()
+            self._file.write(data)
+            path = self._segments[-1]
+            self._max_ids[path] = max(self._max_ids.get(path, 0), max_id)
+            self._written += 1
+            if not self.fsync:
+                self._file.flush()
+                self._synced = self._written
+            return self._written
+
+    def sync(self, ticket):
+        """
+        Wait until the records of `ticket` (and everything written before) are on disk.
+        """
+        with self._cond:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # Become the group commit leader for everything written so far
+                self._syncing = True
+                target = self._written
+                f = self._file
+                f.flush()
+                synced = False
+                self._cond.release()
+                try:
+                    os.fsync(f.fileno())
+                    synced = True
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    if synced:
+                        self.fsync_count += 1
+                        self._synced = max(self._synced, target)
+                    self._cond.notify_all()
+
+    def drop_segments(self, upto_id):
+        """
+        Delete closed segments whose records all have id <= upto_id (covered by a snapshot).
+        Returns the number of deleted segments.
+        """
+        with self._cond:
+            # The newest segment is (or will be reopened as) the one being appended to
+            current = self._segments[-1] if self._segments else None
+            doomed = [
+                p for p in self._segments
+                if p != current and p in self._max_ids and self._max_ids[p] <= upto_id
+            ]
+            for path in doomed:
+                os.remove(path)
+                self._segments.remove(path)
+                del self._max_ids[path]
+        return len(doomed)
+
+    def close(self):
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if self._file is not None:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
@@ -0,0 +1,38 @@
+# wire.py
+"""
+Binary framing for master -> secondary replication (POST /replicate and /replicate_batch with
+Content-Type: application/x-repl-entries). Columns as in columnar.py, uncompressed:
+
+    header: magic, version, entry count
+    columns
+
+JSON stays the format of the client-facing API; secondaries accept both for replication.
+"""
+import struct
+
+from columnar import decode_columns, encode_columns
+
+CONTENT_TYPE = "application/x-repl-entries"
+
+_HEADER = struct.Struct("<4sHI")
+_MAGIC = b"RLWE"
+_VERSION = 1
+
+
+def encode_entries(entries):
+    """
+    Frame a list of {"id", "message", "timestamp"} dicts (a single entry is a list of one).
+    """
+    return _HEADER.pack(_MAGIC, _VERSION, len(entries)) + encode_columns(entries)
+
+
+def decode_entries(data):
+    """
+    Entries of a frame, in the order they were encoded. Raises ValueError on a malformed frame.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated frame")
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("not a replication frame")
+    return decode_columns(data, count, _HEADER.size)
@@ -5,6 +5,7 @@ import logging
 from flask import Flask, request, jsonify
 import requests
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [MASTER] %(levelname)s: %(message)s")
@@ -17,7 +18,17 @@ secondaries = {}
 secondaries_lock = threading.Lock()
 
 # Configs
-REPLICATE_TIMEOUT_SEC = float(os.environ.get("REPLICATE_TIMEOUT_SEC", "0"))
+# Overall deadline for replicating one message to all secondaries (same as docker-compose.yml)
+REPLICATE_TIMEOUT_SEC = float(os.environ.get("REPLICATE_TIMEOUT_SEC", "60"))
+# Threads (and pooled keep-alive connections) shared by all replication requests
+REPLICATE_MAX_WORKERS = int(os.environ.get("REPLICATE_MAX_WORKERS", "32"))
+
+# Replication fans out to all secondaries in parallel over one connection pool
+replicate_pool = ThreadPoolExecutor(max_workers=REPLICATE_MAX_WORKERS, thread_name_prefix="replicate")
+session = requests.Session()
+adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=REPLICATE_MAX_WORKERS)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
 
 @app.route("/register", methods=["POST"])
 def register_secondary():
@@ -34,13 +45,37 @@ def register_secondary():
         secondaries[sid] = url
     app.logger.info(f"Registered secondary {sid} -> {url}")
     return jsonify({"status": "registered"}), 200
-    
+
+
+def replicate_to(sid, url, entry, deadline):
+    """
+    POST the entry to one secondary, with whatever is left of the overall deadline as timeout.
+    """
+    replicate_url = f"{url.rstrip('/')}/replicate"
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return {"status": "error", "error": "replication deadline exceeded"}
+    try:
+        app.logger.info(f"Replicating to {sid} at {replicate_url}")
+        r = session.post(replicate_url, json=entry, timeout=remaining)
+        if r.status_code == 200:
+            app.logger.info(f"Received ACK from {sid}")
+            return {"status": "ack"}
+        app.logger.error(f"Non-200 from {sid}: {r.status_code} {r.text}")
+        # consider this a failure but proceed.
+        return {"status": "error", "code": r.status_code, "body": r.text}
+    except requests.RequestException as e:
+        app.logger.error(f"Failed to replicate to {sid}: {e}")
+        # In real system, we'd retry or mark it down.
+        return {"status": "error", "error": str(e)}
+
 @app.route("/", methods=["POST"])
 def append_message():
     """
     Client -> POST /append  JSON: {"message": "..."}
     Master appends to master_log, then replicates to all known secondaries.
-    It waits for ACKs from all secondaries (blocking replication).
+    It waits for ACKs from all secondaries (blocking replication); replication requests
+    are sent in parallel, so the wait is the slowest secondary, bounded by REPLICATE_TIMEOUT_SEC.
     """
     data = request.get_json() or {}
     message = data.get("message")
@@ -55,24 +90,18 @@ def append_message():
     with secondaries_lock:
         targets = dict(secondaries)
 
-    # Replicate to each secondary, blocking until ACK or timeout
+    # Replicate to all secondaries concurrently, blocking until all ACK or the deadline passes
+    deadline = time.monotonic() + REPLICATE_TIMEOUT_SEC
+    futures = {sid: replicate_pool.submit(replicate_to, sid, url, entry, deadline) for sid, url in targets.items()}
+    wait(futures.values(), timeout=REPLICATE_TIMEOUT_SEC)
     results = {}
-    for sid, url in targets.items():
-        replicate_url = f"{url.rstrip('/')}/replicate"
-        try:
-            app.logger.info(f"Replicating to {sid} at {replicate_url}")
-            r = requests.post(replicate_url, json=entry, timeout=REPLICATE_TIMEOUT_SEC)
-            if r.status_code == 200:
-                results[sid] = {"status": "ack"}
-                app.logger.info(f"Received ACK from {sid}")
-            else:
-                results[sid] = {"status": "error", "code": r.status_code, "body": r.text}
-                app.logger.error(f"Non-200 from {sid}: {r.status_code} {r.text}")
-                # consider this a failure but proceed.
-        except requests.RequestException as e:
-            results[sid] = {"status": "error", "error": str(e)}
-            app.logger.error(f"Failed to replicate to {sid}: {e}")
-            # In real system, we'd retry or mark it down.
+    for sid, future in futures.items():
+        if future.done():
+            results[sid] = future.result()
+        else:
+            # Still queued for a pool thread or waiting on the secondary
+            results[sid] = {"status": "error", "error": "replication deadline exceeded"}
+            app.logger.error(f"No ACK from {sid} within {REPLICATE_TIMEOUT_SEC}s")
 
     # Blocking semantics: only return success when all acked.
     not_acked = [s for s, res in results.items() if res.get("status") != "ack"]